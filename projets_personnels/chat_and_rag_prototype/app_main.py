@@ -8,22 +8,39 @@ import os
 import re
 import base64
 import traceback
-import statistics
-
-try:
-    import fitz  # PyMuPDF
-except ImportError:
-    fitz = None
+from concurrent.futures import ThreadPoolExecutor
+
+from ollama_client import get_client
+from stream_sink import StreamSink
+from corpus import Corpus, CorpusDocument, source_key
+from context_packer import estimate_tokens
+from document_index import DocumentIndexBuilder, content_hash
+from ingestion import ingest_document
+from keyword_cache import KeywordCache
+from query_terms import VocabularyMatcher, corpus_term_groups
+from retrieval import (RAG_PROMPT_TEMPLATE, context_token_budget, document_candidates, lexical_segments,
+                       pack_context, sort_candidates, unique_snippets)
+from term_matcher import TermMatcher
+from vector_index import EMBEDDING_MODEL, embed_query, embeddings_available, load_or_build_vector_index
 
 # --- Configuration du dossier de base ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# --- Constantes pour le RAG ---
-CONTEXT_WINDOW_WORDS = 250 
-MAX_SNIPPETS = 10
-MAX_SEGMENT_WORD_DISTANCE = 500 
+DOCUMENT_FILE_TYPES = ('Documents (*.pdf;*.txt;*.md)',)
+
+# --- Constantes pour le RAG (celles de la recherche d'extraits sont dans retrieval.py) ---
+# Pour les questions courtes, termes clés tirés du vocabulaire du document au lieu du LLM.
+FAST_KEYWORDS = False
 
-JACCARD_SIMILARITY_THRESHOLD = 0.7
+# 'lexical' (termes clés extraits par le LLM), 'semantic' (embeddings) ou 'hybrid' (les deux).
+# L'interface peut le remplacer par requête via `model_options['retrieval_mode']`.
+RAG_RETRIEVAL_MODE = 'lexical'
+RETRIEVAL_MODES = ('lexical', 'semantic', 'hybrid')
+# Calcul des embeddings en arrière-plan dès le chargement d'un document.
+EMBED_ON_LOAD = True
+
+# Nombre de documents du corpus interrogés en parallèle.
+CORPUS_WORKERS = 4
 
 KEYWORD_EXTRACTION_PROMPT_TEMPLATE = """
 Tu es un expert en analyse sémantique. Ton rôle est d'identifier les concepts clés dans la question d'un utilisateur et leurs variations lexicales.
@@ -57,24 +74,17 @@ Question de l'utilisateur: "{question}"
 Ta réponse:
 """
 
-RAG_PROMPT_TEMPLATE = """
-Tu es un assistant IA spécialisé dans l'analyse de documents.
-Réponds à la question de l'utilisateur en te basant EXCLUSIVEMENT sur le contexte suivant.
-Ne mentionne pas que tu utilises un contexte, réponds directement. Si la réponse ne se trouve pas dans le contexte, dis clairement "L'information n'a pas été trouvée dans le document fourni.".
-
---- CONTEXTE EXTRAIT DU DOCUMENT ---
-{context}
---- FIN DU CONTEXTE ---
-
-Question de l'utilisateur : {question}
-"""
-
 
 class Api:
     def __init__(self):
-        self.document_text = ""
-        self.document_words = []
+        self.corpus = Corpus(on_reload=self._start_vector_indexing)
         self.prompt_file_path = os.path.join(BASE_DIR, 'system_prompt.txt')
+        self.ollama = get_client()
+        try:
+            self.keyword_cache = KeywordCache()
+        except Exception as e:
+            print(f"[RAG] Cache des termes clés indisponible : {e}")
+            self.keyword_cache = None
 
     def get_initial_system_prompt(self):
         try:
@@ -93,26 +103,20 @@ class Api:
     def _escape_js_string(self, text):
         return text.replace('\\', '\\\\').replace("'", "\\'").replace('"', '\\"').replace('`', '\\`').replace('$', '\\$')
 
-    def _clean_text(self, text):
-        text = re.sub(r'-\s*\n', '', text)
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
-
-    def _highlight_terms(self, text, term_groups):
-        all_terms = {term for group in term_groups for term in group}
-        sorted_terms = sorted(list(all_terms), key=len, reverse=True)
-        highlighted_text = text
-        for term in sorted_terms:
-            pattern = r'\b(' + re.escape(term) + r')\b'
-            replacement = r'<mark>\1</mark>'
-            highlighted_text = re.sub(pattern, replacement, highlighted_text, flags=re.IGNORECASE)
-        return highlighted_text
+    def _read_file_data(self, file_data):
+        """(chemin, None) si l'interface fournit un chemin, sinon (None, contenu décodé de la data URL)"""
+        path = file_data.get('path')
+        if path:
+            return path, None
+        _, encoded = file_data['data'].split(",", 1)
+        return None, base64.b64decode(encoded)
+
+    def _report_ingestion_progress(self, done, total):
+        webview.windows[0].evaluate_js(f"window.api.updateIngestionProgress({done}, {total})")
 
     def get_installed_models(self):
         try:
-            response = requests.get("http://localhost:11434/api/tags")
-            response.raise_for_status()
-            return sorted([model['name'] for model in response.json()['models']])
+            return sorted(self.ollama.list_models())
         except requests.exceptions.RequestException:
             return ["OLLAMA_OFFLINE"]
         except Exception:
@@ -126,16 +130,14 @@ class Api:
         try:
             options = { "temperature": float(model_options.get("temperature", 0.7)), "num_predict": int(model_options.get("num_predict", -1)), "num_ctx": int(model_options.get("num_ctx", 4096)) }
             api_messages = [{"role": "user", "content": custom_prompt}] if custom_prompt else [{"role": "system", "content": system_prompt_text or "You are a helpful AI assistant."}] + list(message_history)
-            payload = { "model": model_name, "messages": api_messages, "stream": True, "options": options }
-
-            with requests.post("http://localhost:11434/api/chat", json=payload, stream=True) as response:
-                response.raise_for_status()
-                for line in response.iter_lines():
-                    if line:
-                        chunk = json.loads(line.decode('utf-8'))
-                        content_part = chunk['message']['content']
-                        if not content_part.startswith('<context>'):
-                            window.evaluate_js(f"window.api.appendToResponse(`{self._escape_js_string(content_part)}`)")
+
+            def emit(text):
+                window.evaluate_js(f"window.api.appendToResponse(`{self._escape_js_string(text)}`)")
+
+            with StreamSink(emit) as sink:
+                for content_part in self.ollama.stream_chat(model_name, api_messages, options=options):
+                    if not content_part.startswith('<context>'):
+                        sink.write(content_part)
             
             window.evaluate_js("window.api.finalizeResponse()")
 
@@ -146,40 +148,101 @@ class Api:
             error_msg = f'Une erreur inattendue est survenue : {e}'
             window.evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
 
+    def choose_document(self):
+        """Sélecteur de fichiers natif : renvoie le chemin choisi, ou None"""
+        paths = webview.windows[0].create_file_dialog(webview.OPEN_DIALOG, file_types=DOCUMENT_FILE_TYPES)
+        return paths[0] if paths else None
+
     def load_document(self, file_data):
+        """Ajoute un document au corpus ; renvoie la liste des documents chargés"""
         try:
-            file_name, data_url = file_data['name'], file_data['data']
-            _, encoded = data_url.split(",", 1)
-            decoded_bytes = base64.b64decode(encoded)
-            raw_text = ""
-            if file_name.lower().endswith('.pdf'):
-                if not fitz: raise ImportError("PyMuPDF n'est pas installé.")
-                with fitz.open(stream=decoded_bytes, filetype="pdf") as doc:
-                    raw_text = "".join(page.get_text() for page in doc)
-            elif file_name.lower().endswith(('.txt', '.md')):
-                raw_text = decoded_bytes.decode('utf-8')
-            else:
-                raise ValueError("Type de fichier non supporté.")
-            
-            print("[RAG] Nettoyage du texte extrait...")
-            self.document_text = self._clean_text(raw_text)
-            self.document_words = self.document_text.split(' ')
-            print(f"[RAG] Document chargé et nettoyé. ({len(self.document_words)} mots)")
+            path, data = self._read_file_data(file_data)
+            file_name = file_data.get('name') or os.path.basename(path)
+
+            # Un fichier déjà ouvert n'est ni réextrait ni réindexé.
+            source = source_key(path, data)
+            document = self.corpus.load_source(source, file_name)
+            if document is None:
+                print("[RAG] Extraction, nettoyage et indexation du document...")
+                builder = DocumentIndexBuilder()
+                document_text = ingest_document(file_name, path=path, data=data, on_text=builder.feed,
+                                                progress=self._report_ingestion_progress)
+                del data
+                document = CorpusDocument(file_name, document_text, builder.finish(content_hash(document_text)))
+                self.corpus.remember_source(source, document)
+                print(f"[RAG] Document chargé et nettoyé. ({document.word_count} mots)")
+            self.corpus.add(document)
+            self._start_vector_indexing(document)
             
-            return len(self.document_text)
+            return self.corpus.describe()
         except Exception as e:
             raise webview.errors.JavascriptException(self._escape_js_string(f"Erreur lors du traitement du document : {e}"))
+
+    def list_documents(self):
+        return self.corpus.describe()
+
+    def remove_document(self, doc_id):
+        self.corpus.remove(doc_id)
+        return self.corpus.describe()
     
+    def _start_vector_indexing(self, document):
+        document.vector_index = None
+        document.vector_thread = None
+        if not EMBED_ON_LOAD or not embeddings_available():
+            return
+        thread = threading.Thread(target=self._vector_worker, args=(document,), daemon=True)
+        document.vector_thread = thread
+        thread.start()
+
+    def _vector_worker(self, document):
+        try:
+            document.vector_index = load_or_build_vector_index(document.text, self.ollama, EMBEDDING_MODEL,
+                                                               doc_hash=document.doc_id)
+        except Exception as e:
+            print(f"[RAG] Impossible de calculer les embeddings de {document.name} avec {EMBEDDING_MODEL} : {e}")
+
+    def _get_vector_index(self, document):
+        """Index vectoriel d'un document, en attendant la fin de son calcul si besoin"""
+        thread = document.vector_thread
+        if thread is not None and thread.is_alive():
+            print(f"[RAG] Attente de la fin du calcul des embeddings de {document.name}...")
+            thread.join()
+        return document.vector_index
+
+    def _get_key_term_groups(self, question, model_name, doc_ids):
+        """Termes clés de la question : vocabulaire des documents, cache, puis LLM"""
+        if FAST_KEYWORDS:
+            vocabularies = []
+            for doc_id in doc_ids:
+                document = self.corpus.get(doc_id)
+                if document is None:
+                    continue
+                if document.vocabulary is None:
+                    document.vocabulary = VocabularyMatcher(document.index, document.text)
+                vocabularies.append(document.vocabulary)
+            term_groups = corpus_term_groups(question, vocabularies)
+            if term_groups:
+                print(f"[RAG] Termes clés tirés du vocabulaire des documents: {term_groups}")
+                return term_groups
+
+        if self.keyword_cache is not None:
+            term_groups = self.keyword_cache.get(question, model_name)
+            if term_groups:
+                print(f"[RAG] Termes clés relus depuis le cache: {term_groups}")
+                return term_groups
+
+        term_groups = self._get_structured_keywords_from_llm(question, model_name)
+        if term_groups and self.keyword_cache is not None:
+            self.keyword_cache.put(question, model_name, term_groups)
+        return term_groups
+
     def _get_structured_keywords_from_llm(self, question, model_name):
         try:
             prompt_content = KEYWORD_EXTRACTION_PROMPT_TEMPLATE.format(question=question)
-            payload = {"model": model_name, "messages": [{"role": "user", "content": prompt_content}], "stream": False, "options": {"temperature": 0.0}}
+            messages = [{"role": "user", "content": prompt_content}]
             
             print(f"[RAG] Extraction des termes clés avec le modèle {model_name}...")
-            response = requests.post("http://localhost:11434/api/chat", json=payload, timeout=45)
-            response.raise_for_status()
-            
-            response_text = response.json()['message']['content'].strip()
+            response_text = self.ollama.chat(model_name, messages, options={"temperature": 0.0}, timeout=45).strip()
             print(f"[RAG] Réponse brute du LLM: {repr(response_text)}")
             
             match = re.search(r'\{.*\}', response_text, re.DOTALL)
@@ -197,136 +260,109 @@ class Api:
             traceback.print_exc()
             return None
 
+    def _document_candidates(self, doc_id, mode, key_term_groups, query_vector):
+        """Extraits candidats d'un document, classés selon le mode de recherche"""
+        document = self.corpus.get(doc_id)
+        if document is None:
+            return []
+
+        best_segments = lexical_segments(document, key_term_groups) if key_term_groups else []
+        vector_index = similarities = None
+        if mode != 'lexical':
+            vector_index = self._get_vector_index(document)
+            if vector_index is not None:
+                similarities = vector_index.similarities(query_vector)
+            else:
+                print(f"[RAG] Pas d'embeddings pour {document.name}.")
+        return document_candidates(document, mode, best_segments, len(key_term_groups), vector_index, similarities)
+
     def rag_query(self, question, model_name, model_options):
         threading.Thread(target=self._rag_worker, args=(question, model_name, model_options)).start()
 
     def _rag_worker(self, question, model_name, model_options):
+        try:
+            self._run_rag_query(question, model_name, model_options)
+        except Exception as e:
+            # Sans ce message, l'interface resterait en attente de la réponse.
+            traceback.print_exc()
+            error_msg = f"Erreur lors de la recherche dans les documents : {e}"
+            webview.windows[0].evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
+
+    def _run_rag_query(self, question, model_name, model_options):
         window = webview.windows[0]
         
-        if not self.document_words:
+        doc_ids = self.corpus.doc_ids()
+        if not doc_ids:
             window.evaluate_js("window.api.showError('Aucun document chargé.')")
             return
 
-        print(f"[RAG] Début de la requête RAG pour: {question}")
-        
-        key_term_groups = self._get_structured_keywords_from_llm(question, model_name)
-        if not key_term_groups:
-            error_msg = "Le LLM n'a pas pu déterminer les termes de recherche."
-            window.evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
-            return
-            
-        print("[RAG] Indexation des positions des termes clés...")
-        text_lower = self.document_text.lower()
-        term_locations = []
-        for group_id, group in enumerate(key_term_groups):
-            for term in group:
-                term_lower = term.lower()
+        mode = model_options.get('retrieval_mode') or RAG_RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            mode = RAG_RETRIEVAL_MODE
+        print(f"[RAG] Début de la requête RAG ({mode}, {len(doc_ids)} document(s)) pour: {question}")
+
+        query_vector = None
+        if mode != 'lexical':
+            if embeddings_available():
                 try:
-                    for match in re.finditer(r'\b' + re.escape(term_lower) + r'\b', text_lower):
-                        word_pos_approx = text_lower[:match.start()].count(' ')
-                        term_locations.append({'pos': match.start(), 'group_id': group_id, 'word_pos': word_pos_approx})
-                except re.error:
-                    print(f"[RAG] Erreur de regex avec le terme: {term_lower}")
-        
-        if not term_locations:
-            error_msg = "Aucun des termes clés n'a été trouvé dans le document."
+                    query_vector = embed_query(self.ollama, EMBEDDING_MODEL, question)
+                except Exception as e:
+                    print(f"[RAG] Impossible de calculer l'embedding de la question : {e}")
+            if query_vector is None:
+                if mode == 'semantic':
+                    error_msg = f"La recherche sémantique n'est pas disponible (NumPy et le modèle {EMBEDDING_MODEL} sont nécessaires)."
+                    window.evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
+                    return
+                print("[RAG] Recherche sémantique indisponible, recherche lexicale seule.")
+                mode = 'lexical'
+
+        key_term_groups = []
+        if mode != 'semantic':
+            key_term_groups = self._get_key_term_groups(question, model_name, doc_ids) or []
+            if not key_term_groups and mode == 'lexical':
+                error_msg = "Le LLM n'a pas pu déterminer les termes de recherche."
+                window.evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
+                return
+        matcher = TermMatcher(key_term_groups)
+
+        print("[RAG] Recherche des meilleurs segments dans les documents...")
+        with ThreadPoolExecutor(max_workers=min(CORPUS_WORKERS, len(doc_ids))) as pool:
+            per_document = list(pool.map(
+                lambda doc_id: self._document_candidates(doc_id, mode, key_term_groups, query_vector),
+                doc_ids))
+        candidates = [candidate for document_candidates in per_document for candidate in document_candidates]
+        if not candidates:
+            if mode == 'semantic':
+                error_msg = f"Aucun document n'a d'embeddings calculés avec le modèle {EMBEDDING_MODEL}."
+            else:
+                error_msg = "Aucun des termes clés n'a été trouvé dans les documents."
             window.evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
             return
-        
-        term_locations.sort(key=lambda x: x['pos'])
-        print(f"[RAG] {len(term_locations)} occurrences de termes trouvées et triées.")
-
-        print("[RAG] Génération optimisée des segments candidats...")
-        best_segments = []
-        for i in range(len(term_locations)):
-            start_term = term_locations[i]
-            groups_in_segment = {start_term['group_id']}
-            
-            for j in range(i, len(term_locations)):
-                current_term = term_locations[j]
-
-                if current_term['word_pos'] - start_term['word_pos'] > MAX_SEGMENT_WORD_DISTANCE:
-                    break
-
-                groups_in_segment.add(current_term['group_id'])
-                
-                score = len(groups_in_segment)
-                start_pos_char = start_term['pos']
-                end_pos_char = current_term['pos']
-                density = end_pos_char - start_pos_char + 1
-
-                positions_in_segment = [loc['pos'] for loc in term_locations[i:j+1]]
-                std_dev = statistics.stdev(positions_in_segment) if len(positions_in_segment) > 1 else 0.0
-
-                best_segments.append({
-                    'start': start_pos_char,
-                    'end': end_pos_char,
-                    'score': score,
-                    'density': density,
-                    'standard_deviation': std_dev
-                })
-        
-        print(f"[RAG] {len(best_segments)} segments candidats générés.")
-        
-        print("[RAG] Tri des segments...")
-        best_segments.sort(key=lambda x: (x['score'], -x['density'], -x['standard_deviation']), reverse=True)
+        sort_candidates(candidates)
 
         print("[RAG] Sélection et déduplication des meilleurs extraits...")
-        unique_results = []
-        for segment in best_segments:
-            char_window = CONTEXT_WINDOW_WORDS * 5 
-            start_context_char = max(0, segment['start'] - char_window)
-            end_context_char = min(len(self.document_text), segment['end'] + char_window)
-            
-            snippet_text = self.document_text[start_context_char:end_context_char]
-            
-            first_space = snippet_text.find(' ')
-            last_space = snippet_text.rfind(' ')
-            if first_space != -1 and start_context_char > 0: snippet_text = snippet_text[first_space+1:]
-            if last_space != -1 and end_context_char < len(self.document_text): snippet_text = snippet_text[:last_space]
-            
-            if not snippet_text:
-                continue
-
-            is_too_similar = False
-            words_new = set(snippet_text.lower().split())
-
-            for existing_item in unique_results:
-                words_existing = set(existing_item['snippet'].lower().split())
-                
-                intersection_len = len(words_new.intersection(words_existing))
-                union_len = len(words_new.union(words_existing))
-                
-                if union_len == 0:
-                    similarity = 1.0
-                else:
-                    similarity = intersection_len / union_len
-
-                if similarity > JACCARD_SIMILARITY_THRESHOLD:
-                    is_too_similar = True
-                    break 
-
-            if not is_too_similar:
-                method = f"Score {segment['score']}/{len(key_term_groups)} (densité: {segment['density']}, écart-type: {segment['standard_deviation']:.2f})"
-                unique_results.append({'snippet': snippet_text, 'method': method})
-                if len(unique_results) >= MAX_SNIPPETS:
-                    break
-        
+        unique_results = unique_snippets(candidates)
         print(f"[RAG] {len(unique_results)} extraits uniques et pertinents trouvés après déduplication.")
 
+        budget = context_token_budget(question, model_options)
+        document_names = [document['name'] for document in self.corpus.describe()]
+        blocks, block_overhead = pack_context(unique_results, budget, document_names)
+        packed_tokens = sum(estimate_tokens(block.text) + block_overhead for block in blocks)
+        print(f"[RAG] {len(blocks)} blocs retenus (~{packed_tokens} tokens sur un budget de {budget}).")
+
         context_for_ui_parts = []
         retrieved_context_for_llm = []
 
         print("\n[RAG] --- DÉBUT DU CONTENU DES EXTRAITS SÉLECTIONNÉS ---")
-        for i, item in enumerate(unique_results):
-            clean_snippet = item['snippet']
-            highlighted_snippet = self._highlight_terms(clean_snippet, key_term_groups)
+        for i, block in enumerate(blocks):
+            clean_snippet = block.text
+            highlighted_snippet = matcher.highlight(clean_snippet)
             
-            print(f"\n--- EXTRAIT {i+1} (Méthode: {item['method']}) ---")
+            print(f"\n--- EXTRAIT {i+1} ({block.document.name}, méthode: {block.method}) ---")
             print(clean_snippet)
 
-            context_for_ui_parts.append(f"--- Extrait {i+1} ({item['method']}) ---\n{highlighted_snippet}")
-            retrieved_context_for_llm.append(clean_snippet)
+            context_for_ui_parts.append(f"--- Extrait {i+1} · {block.document.name} ({block.method}) ---\n{highlighted_snippet}")
+            retrieved_context_for_llm.append(f"[Document : {block.document.name}]\n{clean_snippet}")
         print("\n[RAG] --- FIN DU CONTENU DES EXTRAITS SÉLECTIONNÉS ---\n")
         
         if not retrieved_context_for_llm:
@@ -334,7 +370,7 @@ class Api:
              window.evaluate_js(f"window.api.showError('{self._escape_js_string(error_msg)}')")
              return
 
-        full_context_block = f"<context>{'\n\n'.join(context_for_ui_parts)}</context>"
+        full_context_block = "<context>" + "\n\n".join(context_for_ui_parts) + "</context>"
         window.evaluate_js(f"window.api.appendToResponse(`{self._escape_js_string(full_context_block)}`)")
 
         final_prompt = RAG_PROMPT_TEMPLATE.format(context="\n\n---\n\n".join(retrieved_context_for_llm), question=question)
@@ -342,23 +378,8 @@ class Api:
     
     def extract_text_from_file(self, file_data):
         try:
-            file_name, data_url = file_data['name'], file_data['data']
-            _, encoded = data_url.split(",", 1)
-            decoded_bytes = base64.b64decode(encoded)
-            raw_text = ""
-
-            if file_name.lower().endswith('.pdf'):
-                if not fitz:
-                    raise ImportError("PyMuPDF doit être installé pour lire les fichiers PDF.")
-                with fitz.open(stream=decoded_bytes, filetype="pdf") as doc:
-                    raw_text = "".join(page.get_text() for page in doc)
-            elif file_name.lower().endswith(('.txt', '.md')):
-                raw_text = decoded_bytes.decode('utf-8')
-            else:
-                raise ValueError("Type de fichier non supporté (.txt, .md, .pdf uniquement).")
-            
-            return self._clean_text(raw_text)
-
+            path, data = self._read_file_data(file_data)
+            return ingest_document(file_data.get('name') or os.path.basename(path), path=path, data=data)
         except Exception as e:
             raise webview.errors.JavascriptException(self._escape_js_string(f"Erreur lors de l'extraction du texte : {e}"))
 
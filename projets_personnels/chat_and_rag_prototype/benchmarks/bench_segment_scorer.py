@@ -0,0 +1,100 @@
+"""
+Banc d'essai du classement des segments candidats du RAG.
+
+Compare, sur des documents synthétiques de plus en plus riches en
+occurrences de termes clés, l'ancienne double boucle de `_rag_worker`
+(`statistics.stdev` sur chaque tranche, tri de tous les candidats) au
+`segment_scorer.top_segments` à fenêtre glissante, et vérifie que les
+meilleurs segments sortent dans le même ordre.
+
+    python benchmarks/bench_segment_scorer.py
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import MAX_SEGMENT_WORD_DISTANCE  # noqa: E402
+from segment_scorer import MAX_CANDIDATE_SEGMENTS, top_segments  # noqa: E402
+
+# L'ancienne version est cubique : au-delà, elle prend plusieurs minutes.
+LEGACY_MAX_HITS = 3000
+
+
+def legacy_segments(term_locations, max_word_distance):
+    """Génération et tri des candidats tels qu'ils étaient faits dans `_rag_worker`"""
+    best_segments = []
+    for i in range(len(term_locations)):
+        start_term = term_locations[i]
+        groups_in_segment = {start_term['group_id']}
+        for j in range(i, len(term_locations)):
+            current_term = term_locations[j]
+            if current_term['word_pos'] - start_term['word_pos'] > max_word_distance:
+                break
+            groups_in_segment.add(current_term['group_id'])
+            positions_in_segment = [loc['pos'] for loc in term_locations[i:j + 1]]
+            std_dev = statistics.stdev(positions_in_segment) if len(positions_in_segment) > 1 else 0.0
+            best_segments.append({
+                'start': start_term['pos'],
+                'end': current_term['pos'],
+                'score': len(groups_in_segment),
+                'density': current_term['pos'] - start_term['pos'] + 1,
+                'standard_deviation': std_dev,
+            })
+    best_segments.sort(key=lambda x: (x['score'], -x['density'], -x['standard_deviation']), reverse=True)
+    return best_segments
+
+
+def synthetic_locations(num_words, num_hits, num_groups, seed=0):
+    """Occurrences réparties au hasard dans un document de `num_words` mots d'environ 6 caractères"""
+    rng = random.Random(seed)
+    word_positions = sorted(rng.sample(range(num_words), num_hits))
+    return [
+        {'pos': word_pos * 6 + rng.randrange(3), 'group_id': rng.randrange(num_groups), 'word_pos': word_pos}
+        for word_pos in word_positions
+    ]
+
+
+def same_ranking(expected, actual, tolerance=1e-6):
+    for a, b in zip(expected, actual):
+        if (a['start'], a['end'], a['score'], a['density']) != (b['start'], b['end'], b['score'], b['density']):
+            return False
+        if abs(a['standard_deviation'] - b['standard_deviation']) > tolerance:
+            return False
+    return True
+
+
+def main():
+    cases = [
+        (50_000, 500, 3),
+        (100_000, 1_000, 3),
+        (200_000, 3_000, 4),
+        (20_000, 3_000, 4),
+        (1_000_000, 10_000, 4),
+        (1_000_000, 50_000, 5),
+    ]
+    print(f"{'mots':>10} {'occurrences':>12} {'groupes':>8} {'ancien (s)':>11} {'nouveau (s)':>12}  ordre")
+    for num_words, num_hits, num_groups in cases:
+        locations = synthetic_locations(num_words, num_hits, num_groups)
+
+        start = time.perf_counter()
+        segments = top_segments(locations, MAX_SEGMENT_WORD_DISTANCE)
+        new_time = time.perf_counter() - start
+
+        if num_hits <= LEGACY_MAX_HITS:
+            start = time.perf_counter()
+            expected = legacy_segments(locations, MAX_SEGMENT_WORD_DISTANCE)[:MAX_CANDIDATE_SEGMENTS]
+            legacy_time = f"{time.perf_counter() - start:11.3f}"
+            verdict = "identique" if same_ranking(expected, segments) else "DIFFÉRENT"
+        else:
+            legacy_time = f"{'-':>11}"
+            verdict = "-"
+        print(f"{num_words:>10} {num_hits:>12} {num_groups:>8} {legacy_time} {new_time:12.3f}  {verdict}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Banc d'essai de la recherche lexicale du RAG, sans Ollama.
+
+Pour des documents synthétiques de taille croissante (et les PDF fournis
+dans `NebuAI_WebUI/uploads` si PyMuPDF est installé), enchaîne les étapes
+de `retrieval` comme `_rag_worker`, avec des termes clés fixés à l'avance à
+la place de l'appel au LLM, et mesure pour chacune le temps et le pic de
+mémoire :
+
+- indexation : nettoyage et index inversé (comme `load_document`) ;
+- candidats : occurrences des termes et meilleurs segments ;
+- tri : clés de rang et tri des candidats ;
+- déduplication : bornes des extraits et filtre des quasi-doublons ;
+- assemblage : remplissage du budget de contexte ;
+- surlignage : balises `<mark>` sur les blocs retenus.
+
+Les documents synthétiques contiennent, à des positions aléatoires, une
+phrase « aiguille » par question du jeu étiqueté, noyée parmi des phrases
+qui ne citent qu'un seul des termes recherchés. Le rappel est la part des
+questions dont l'aiguille figure dans le contexte assemblé.
+
+    python benchmarks/rag_benchmark.py
+    python benchmarks/rag_benchmark.py --sizes 10000 100000 --save resultats.json
+    python benchmarks/rag_benchmark.py --baseline resultats.json
+
+Avec `--baseline`, le script échoue si le rappel baisse ou si une étape
+devient plus lente que `--tolerance` fois sa durée de référence.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CorpusDocument  # noqa: E402
+from document_index import DocumentIndexBuilder, content_hash  # noqa: E402
+from ingestion import fitz, ingest_document  # noqa: E402
+from retrieval import (context_token_budget, document_candidates, lexical_segments, pack_context,  # noqa: E402
+                       sort_candidates, unique_snippets)
+from term_matcher import TermMatcher  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+STAGES = ("indexation", "candidats", "tri", "déduplication", "assemblage", "surlignage")
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           'NebuAI_WebUI', 'uploads')
+
+LABELED_QUESTIONS = [
+    {
+        "question": "Que dit Zénodote de la musique ?",
+        "term_groups": [["Zénodote"], ["musique", "musical", "musicale"]],
+        "needle": "Zénodote soutenait que la musique adoucit les passions de l'âme.",
+    },
+    {
+        "question": "À quoi sert l'astrolabe pour les navigateurs ?",
+        "term_groups": [["astrolabe", "astrolabes"], ["navigateur", "navigateurs", "navigation"]],
+        "needle": "Les navigateurs mesuraient la hauteur des étoiles grâce à l'astrolabe.",
+    },
+    {
+        "question": "Pourquoi les stoïciens méprisent-ils la richesse ?",
+        "term_groups": [["stoïcien", "stoïciens", "stoïcisme"], ["richesse", "richesses"]],
+        "needle": "Pour les stoïciens, la richesse est indifférente au bonheur du sage.",
+    },
+    {
+        "question": "Comment la cire scelle-t-elle les amphores ?",
+        "term_groups": [["cire"], ["amphore", "amphores"], ["sceller", "scellées", "scellait"]],
+        "needle": "On scellait les amphores avec un bouchon enduit de cire chaude.",
+    },
+    {
+        "question": "Où se dressait le phare d'Alexandrie ?",
+        "term_groups": [["phare"], ["Alexandrie"]],
+        "needle": "Le phare d'Alexandrie se dressait sur l'île de Pharos.",
+    },
+]
+
+# Questions sans étiquette pour les PDF fournis : seules les durées sont mesurées.
+PDF_QUESTIONS = [
+    {"question": "La mesure chez Platon", "term_groups": [["mesure", "mesures"], ["Platon"]]},
+    {"question": "Querying documents with LLMs", "term_groups": [["LLM", "LLMs"], ["document", "documents"]]},
+]
+
+_SYLLABLES = ("la", "ro", "mi", "sta", "pen", "cor", "du", "vel", "ta", "bri", "mon", "sé", "gue", "lin", "fa")
+
+
+def synthetic_document(num_words, seed=0):
+    """Texte de `num_words` mots environ et, pour chaque question étiquetée, la position de son aiguille"""
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4))) for _ in range(5000)]
+    filler_terms = [term for item in LABELED_QUESTIONS for group in item["term_groups"] for term in group]
+
+    words = []
+    while len(words) < num_words:
+        sentence = rng.choices(vocabulary, k=rng.randint(6, 18))
+        # Environ une phrase sur cinquante cite un seul des termes recherchés.
+        if rng.random() < 0.02:
+            sentence.insert(rng.randrange(len(sentence)), rng.choice(filler_terms))
+        sentence[0] = sentence[0].capitalize()
+        words.extend(sentence)
+        words[-1] += '.'
+
+    needle_word_positions = sorted(rng.sample(range(len(words)), len(LABELED_QUESTIONS)))
+    # Insertion depuis la fin pour que les positions restantes restent valables.
+    for word_pos, item in zip(reversed(needle_word_positions), reversed(LABELED_QUESTIONS)):
+        words.insert(word_pos, item["needle"])
+    text = ' '.join(words)
+    needles = [(text.index(item["needle"]), text.index(item["needle"]) + len(item["needle"])) for item in LABELED_QUESTIONS]
+    return text, needles
+
+
+class StageTimer:
+    """Durée et pic de mémoire de chaque étape, cumulés sur plusieurs requêtes"""
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.durations = {stage: 0.0 for stage in STAGES}
+        self.peaks = {stage: 0 for stage in STAGES}
+
+    def run(self, stage, function, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = function(*args)
+        self.durations[stage] += time.perf_counter() - start
+        if self.trace_memory:
+            self.peaks[stage] = max(self.peaks[stage], tracemalloc.get_traced_memory()[1] - base)
+        return result
+
+
+def load(name, data):
+    builder = DocumentIndexBuilder()
+    text = ingest_document(name, data=data, on_text=builder.feed)
+    return CorpusDocument(name, text, builder.finish(content_hash(text)))
+
+
+def candidates(document, term_groups):
+    return lexical_segments(document, term_groups)
+
+
+def ranked(document, segments, num_groups):
+    return sort_candidates(document_candidates(document, 'lexical', segments, num_groups))
+
+
+def packed(unique, question, name):
+    # Budget par défaut de `_rag_worker` (num_ctx de 4096, sans num_predict).
+    blocks, _ = pack_context(unique, context_token_budget(question, {}), [name])
+    return blocks
+
+
+def highlighted(blocks, matcher):
+    return [matcher.highlight(block.text) for block in blocks]
+
+
+def run_case(name, data, questions, needles, trace_memory):
+    timer = StageTimer(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    document = timer.run("indexation", load, name, data)
+    hits = 0
+    for i, item in enumerate(questions):
+        term_groups = item["term_groups"]
+        matcher = TermMatcher(term_groups)
+        segments = timer.run("candidats", candidates, document, term_groups)
+        items = timer.run("tri", ranked, document, segments, len(term_groups))
+        unique = timer.run("déduplication", unique_snippets, items)
+        blocks = timer.run("assemblage", packed, unique, item["question"], name)
+        timer.run("surlignage", highlighted, blocks, matcher)
+        if needles is not None:
+            needle_start, needle_end = needles[i]
+            hits += any(block.start <= needle_start and needle_end <= block.end for block in blocks)
+    if trace_memory:
+        tracemalloc.stop()
+    recall = hits / len(questions) if needles is not None else None
+    return document, timer, recall
+
+
+def benchmark(name, data, questions, needles):
+    # Deux passages : tracemalloc ralentit fortement l'exécution et fausserait les durées.
+    document, timer, recall = run_case(name, data, questions, needles, trace_memory=False)
+    _, memory_timer, _ = run_case(name, data, questions, needles, trace_memory=True)
+    return {
+        "document": name,
+        "words": document.word_count,
+        "questions": len(questions),
+        "recall": recall,
+        "durations": timer.durations,
+        "peaks": memory_timer.peaks,
+    }
+
+
+def print_result(result):
+    recall = "-" if result["recall"] is None else f"{result['recall']:.0%}"
+    print(f"\n{result['document']} : {result['words']} mots, {result['questions']} questions, rappel {recall}")
+    print(f"  {'étape':<15} {'durée (ms)':>12} {'pic mémoire (Mo)':>18}")
+    for stage in STAGES:
+        print(f"  {stage:<15} {result['durations'][stage] * 1000:12.1f} {result['peaks'][stage] / 2**20:18.1f}")
+
+
+def compare(results, baseline, tolerance):
+    """Régressions par rapport à une exécution de référence"""
+    reference = {result["document"]: result for result in baseline}
+    problems = []
+    for result in results:
+        previous = reference.get(result["document"])
+        if previous is None:
+            continue
+        if result["recall"] is not None and previous["recall"] is not None and result["recall"] < previous["recall"]:
+            problems.append(f"{result['document']} : rappel {previous['recall']:.0%} -> {result['recall']:.0%}")
+        for stage in STAGES:
+            before, after = previous["durations"][stage], result["durations"][stage]
+            # Les étapes de quelques millisecondes sont trop bruitées pour être comparées.
+            if before > 0.005 and after > before * tolerance:
+                problems.append(f"{result['document']} : {stage} {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="tailles des documents synthétiques, en mots")
+    parser.add_argument('--no-pdf', action='store_true', help="ignorer les PDF fournis")
+    parser.add_argument('--save', help="enregistrer les résultats dans ce fichier JSON")
+    parser.add_argument('--baseline', help="résultats de référence à comparer")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="ralentissement toléré par rapport à la référence")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        text, needles = synthetic_document(size)
+        results.append(benchmark(f"synthetique-{size}.txt", text.encode('utf-8'), LABELED_QUESTIONS, needles))
+        print_result(results[-1])
+
+    if not args.no_pdf:
+        pdf_paths = sorted(glob.glob(os.path.join(UPLOADS_DIR, '*.pdf')))
+        if fitz is None:
+            print("\nPyMuPDF n'est pas installé : PDF fournis ignorés.")
+        for path in pdf_paths if fitz else []:
+            with open(path, 'rb') as f:
+                results.append(benchmark(os.path.basename(path), f.read(), PDF_QUESTIONS, None))
+            print_result(results[-1])
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nRégressions :")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print("\nAucune régression par rapport à la référence.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Assemblage des extraits du RAG dans le budget de contexte du modèle.
+
+Les extraits arrivent du meilleur au moins bon. Le nombre de tokens est
+estimé à partir du nombre de caractères (`CHARS_PER_TOKEN`, prudent pour du
+français). Un extrait qui chevauche un bloc déjà retenu du même document,
+ou qui en est très proche, l'élargit au lieu d'en répéter le texte ; sinon
+il forme un nouveau bloc s'il tient encore dans le budget. Le meilleur
+extrait est toujours gardé : s'il est à lui seul trop long, il est recentré
+sur son segment et raccourci.
+"""
+
+import math
+from typing import Any, Dict, List, Sequence
+
+CHARS_PER_TOKEN = 3.2
+# Deux fenêtres séparées de moins de ce nombre de caractères sont fusionnées.
+MERGE_GAP_CHARS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    return chars_to_tokens(len(text))
+
+
+def chars_to_tokens(length: int) -> int:
+    return math.ceil(length / CHARS_PER_TOKEN)
+
+
+class PackedBlock:
+    """Passage continu d'un document retenu pour le contexte"""
+
+    def __init__(self, document, start: int, end: int, method: str):
+        self.document = document
+        self.start = start
+        self.end = end
+        self.methods = [method]
+
+    @property
+    def text(self) -> str:
+        return self.document.text[self.start:self.end]
+
+    @property
+    def method(self) -> str:
+        if len(self.methods) == 1:
+            return self.methods[0]
+        return f"{self.methods[0]}, fusionné avec {len(self.methods) - 1} extrait(s) voisin(s)"
+
+    def touches(self, document, start: int, end: int) -> bool:
+        return document is self.document and start <= self.end + MERGE_GAP_CHARS and self.start <= end + MERGE_GAP_CHARS
+
+
+def pack_snippets(snippets: Sequence[Dict[str, Any]], budget_tokens: int, max_blocks: int,
+                  block_overhead_tokens: int = 0) -> List[PackedBlock]:
+    """
+    Blocs à placer dans le contexte, du meilleur au moins bon.
+
+    Chaque extrait est un dict avec `document` (un `CorpusDocument`), `start` et
+    `end` (bornes de l'extrait), `core_start` et `core_end` (segment qui l'a fait
+    retenir) et `method`. `block_overhead_tokens` compte l'en-tête et le
+    séparateur ajoutés à chaque bloc.
+    """
+    blocks: List[PackedBlock] = []
+
+    def used_tokens() -> int:
+        return sum(chars_to_tokens(block.end - block.start) + block_overhead_tokens for block in blocks)
+
+    for snippet in snippets:
+        document, start, end = snippet['document'], snippet['start'], snippet['end']
+        target = next((block for block in blocks if block.touches(document, start, end)), None)
+        if target is not None:
+            new_start, new_end = min(target.start, start), max(target.end, end)
+            extra = chars_to_tokens(new_end - new_start) - chars_to_tokens(target.end - target.start)
+            if extra > 0 and used_tokens() + extra > budget_tokens:
+                continue
+            target.start, target.end = new_start, new_end
+            target.methods.append(snippet['method'])
+            # Le bloc élargi peut maintenant toucher un autre bloc du même document.
+            for other in [block for block in blocks if block is not target and block.touches(document, target.start, target.end)]:
+                target.start, target.end = min(target.start, other.start), max(target.end, other.end)
+                target.methods.extend(other.methods)
+                blocks.remove(other)
+            continue
+
+        if len(blocks) >= max_blocks:
+            continue
+        cost = chars_to_tokens(end - start) + block_overhead_tokens
+        if used_tokens() + cost <= budget_tokens:
+            blocks.append(PackedBlock(document, start, end, snippet['method']))
+        elif not blocks:
+            # Le meilleur extrait doit figurer dans le contexte : on le réduit autour de son segment.
+            max_chars = max(0, int((budget_tokens - block_overhead_tokens) * CHARS_PER_TOKEN))
+            center = (snippet['core_start'] + snippet['core_end']) // 2
+            start = max(0, min(center - max_chars // 2, len(document.text) - max_chars))
+            start, end = document.snippet_bounds(start, start + max_chars, 0)
+            if end > start:
+                blocks.append(PackedBlock(document, start, end, f"{snippet['method']}, raccourci"))
+    return blocks
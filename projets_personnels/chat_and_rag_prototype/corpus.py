@@ -0,0 +1,217 @@
+"""
+Corpus de documents chargés pour le RAG.
+
+Plusieurs documents restent indexés en même temps. Le corpus garde en
+mémoire les plus récemment utilisés tant que leur taille estimée (texte et
+index) ne dépasse pas `max_memory` ; les autres sont déchargés : leur texte
+est écrit dans `cache/corpus/`, leur index l'est déjà dans `cache/index/`.
+Un document déchargé est rechargé depuis le disque à sa prochaine
+utilisation, sans réextraction ni réindexation.
+
+Le corpus retient aussi, pour chaque fichier source (chemin, taille et date
+de modification, ou contenu s'il est transmis par l'interface), le document
+qui en a été tiré : rouvrir le même fichier relit son texte et son index
+depuis le disque au lieu de l'extraire et de l'indexer à nouveau.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from document_index import BASE_DIR, DocumentIndex, index_path, store_index
+
+CORPUS_DIR = os.path.join(BASE_DIR, 'cache', 'corpus')
+CORPUS_MAX_MEMORY = 512 * 1024 * 1024
+SOURCES_FILE = 'sources.json'
+
+
+def source_key(path: Optional[str] = None, data: Optional[bytes] = None) -> str:
+    """Clé d'un fichier source : chemin, taille et date de modification, ou empreinte du contenu"""
+    if path is not None:
+        stat = os.stat(path)
+        source = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')
+    else:
+        source = data
+    return hashlib.sha256(source).hexdigest()
+
+
+class CorpusDocument:
+    """Texte nettoyé d'un document, son index, et ses données de recherche calculées à la demande"""
+
+    def __init__(self, name: str, text: str, index: DocumentIndex):
+        self.doc_id = index.doc_hash
+        self.name = name
+        self.text = text
+        self.index = index
+        self.vector_index = None
+        self.vector_thread: Optional[threading.Thread] = None
+        self.vocabulary = None
+
+    @property
+    def word_count(self) -> int:
+        return self.text.count(' ') + 1 if self.text else 0
+
+    def memory_size(self) -> int:
+        """Taille approximative en mémoire, en octets"""
+        index = self.index
+        arrays = [index.token_terms, index.token_starts, index.token_ends, index.token_words]
+        size = sys.getsizeof(self.text)
+        size += sum(a.itemsize * len(a) for a in arrays)
+        size += index.token_count * index.token_terms.itemsize  # listes d'occurrences
+        size += len(index.term_ids) * 150  # vocabulaire : clés, entiers, tableaux vides
+        return size
+
+    def snippet_bounds(self, start: int, end: int, margin: int) -> Tuple[int, int]:
+        """Bornes de [start - margin, end + margin], resserrées aux espaces pour ne pas tronquer de mot"""
+        start_context_char = max(0, start - margin)
+        end_context_char = min(len(self.text), end + margin)
+
+        if start_context_char > 0:
+            first_space = self.text.find(' ', start_context_char, end_context_char)
+            if first_space != -1: start_context_char = first_space + 1
+        if end_context_char < len(self.text):
+            last_space = self.text.rfind(' ', start_context_char, end_context_char)
+            if last_space != -1: end_context_char = last_space
+        return start_context_char, max(start_context_char, end_context_char)
+
+
+class Corpus:
+    """Documents du corpus dans l'ordre de chargement, les moins récemment utilisés déchargés sur disque"""
+
+    def __init__(self, max_memory: int = CORPUS_MAX_MEMORY, corpus_dir: str = CORPUS_DIR,
+                 on_reload: Optional[Callable[[CorpusDocument], None]] = None):
+        self.max_memory = max_memory
+        self.corpus_dir = corpus_dir
+        self.on_reload = on_reload
+        self._names: Dict[str, str] = {}
+        self._sizes: Dict[str, int] = {}
+        # Documents en mémoire, du moins au plus récemment utilisé.
+        self._resident: 'OrderedDict[str, CorpusDocument]' = OrderedDict()
+        self._sources: Optional[Dict[str, str]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def doc_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._names)
+
+    def describe(self) -> List[Dict[str, object]]:
+        """Documents du corpus pour l'interface"""
+        with self._lock:
+            return [{"id": doc_id, "name": name, "chars": self._sizes[doc_id], "in_memory": doc_id in self._resident}
+                    for doc_id, name in self._names.items()]
+
+    def add(self, document: CorpusDocument):
+        with self._lock:
+            self._names[document.doc_id] = document.name
+            self._sizes[document.doc_id] = len(document.text)
+            self._resident[document.doc_id] = document
+            self._resident.move_to_end(document.doc_id)
+            self._evict()
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._names.pop(doc_id, None)
+            self._sizes.pop(doc_id, None)
+            self._resident.pop(doc_id, None)
+
+    def get(self, doc_id: str) -> Optional[CorpusDocument]:
+        """Document du corpus, rechargé depuis le disque s'il avait été déchargé"""
+        with self._lock:
+            if doc_id not in self._names:
+                return None
+            document = self._resident.get(doc_id)
+            if document is not None:
+                self._resident.move_to_end(doc_id)
+                return document
+            document = self._reload(doc_id)
+            self._resident[doc_id] = document
+            self._evict()
+        if self.on_reload:
+            self.on_reload(document)
+        return document
+
+    def load_source(self, source: str, name: str) -> Optional[CorpusDocument]:
+        """Document déjà tiré de ce fichier source, relu depuis le disque, ou None"""
+        with self._lock:
+            doc_id = self._source_map().get(source)
+            if doc_id is None:
+                return None
+            document = self._resident.get(doc_id)
+            if document is not None:
+                return CorpusDocument(name, document.text, document.index)
+            try:
+                document = self._read_document(doc_id, name)
+            except OSError:
+                return None
+        print(f"[RAG] Document relu depuis le cache : {name}")
+        return document
+
+    def remember_source(self, source: str, document: CorpusDocument):
+        """Enregistre sur disque le texte et l'index du document tiré de ce fichier source"""
+        with self._lock:
+            self._spill(document)
+            sources = self._source_map()
+            sources[source] = document.doc_id
+            path = os.path.join(self.corpus_dir, SOURCES_FILE)
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(sources, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"[RAG] Impossible d'enregistrer la source du document : {e}")
+
+    def _source_map(self) -> Dict[str, str]:
+        if self._sources is None:
+            try:
+                with open(os.path.join(self.corpus_dir, SOURCES_FILE), 'r', encoding='utf-8') as f:
+                    self._sources = json.load(f)
+            except (OSError, ValueError):
+                self._sources = {}
+        return self._sources
+
+    def _text_path(self, doc_id: str) -> str:
+        return os.path.join(self.corpus_dir, f"{doc_id}.txt")
+
+    def _evict(self):
+        # Le document le plus récent reste en mémoire, même s'il dépasse à lui seul la limite.
+        total = sum(document.memory_size() for document in self._resident.values())
+        while total > self.max_memory and len(self._resident) > 1:
+            doc_id, document = self._resident.popitem(last=False)
+            total -= document.memory_size()
+            self._spill(document)
+            print(f"[RAG] Document déchargé sur disque : {document.name}")
+
+    def _spill(self, document: CorpusDocument):
+        path = self._text_path(document.doc_id)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.corpus_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(document.text)
+        os.replace(tmp_path, path)
+        if not os.path.exists(index_path(document.doc_id)):
+            store_index(document.index)
+
+    def _reload(self, doc_id: str) -> CorpusDocument:
+        document = self._read_document(doc_id, self._names[doc_id])
+        print(f"[RAG] Document rechargé depuis le disque : {document.name}")
+        return document
+
+    def _read_document(self, doc_id: str, name: str) -> CorpusDocument:
+        with open(self._text_path(doc_id), 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        # L'index n'est reconstruit que s'il manque ou n'est plus lisible.
+        index = DocumentIndex.load(index_path(doc_id), doc_id)
+        if index is None:
+            index = DocumentIndex.build(text, doc_id)
+            store_index(index)
+        return CorpusDocument(name, text, index)
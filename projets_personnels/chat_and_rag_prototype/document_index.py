@@ -0,0 +1,221 @@
+"""
+Index inversé des documents chargés pour le RAG.
+
+Le texte nettoyé est découpé une seule fois en tokens (suites de caractères
+alphanumériques). Chaque terme, replié en minuscules et sans accents, pointe
+vers la liste triée de ses occurrences ; pour chaque token, l'index conserve
+sa position en caractères et en mots (mots séparés par des espaces, comme
+`document_words`). Chercher un terme, ou une expression de plusieurs mots,
+revient alors à lire ces listes au lieu de parcourir le document.
+
+L'index peut aussi être construit au fil de l'eau, à mesure que les pages
+sont extraites (`DocumentIndexBuilder`). Il est sauvegardé dans
+`cache/index/` sous l'empreinte SHA-256 du texte ; le corpus le relit quand
+un fichier déjà ouvert est rechargé (`Corpus.load_source`), sans réextraire
+ni réindexer le document.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.path.join(BASE_DIR, 'cache', 'index')
+
+INDEX_FORMAT_VERSION = 1
+
+_TOKEN_RE = re.compile(r'\w+')
+_TRAILING_TOKEN_RE = re.compile(r'\w+$')
+
+
+class _FoldTable(dict):
+    """Table pour `str.translate` : chaque caractère replié en un seul caractère"""
+
+    def __missing__(self, code):
+        char = chr(code)
+        lower = char.lower()
+        folded = ''.join(c for c in unicodedata.normalize('NFD', lower) if not unicodedata.combining(c))
+        if len(folded) == 1:
+            value = folded
+        else:
+            value = lower if len(lower) == 1 else char
+        self[code] = value
+        return value
+
+
+_FOLD_TABLE = _FoldTable()
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents, de même longueur que `text` : les positions restent valides"""
+    return text.translate(_FOLD_TABLE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes repliés d'un texte, dans l'ordre"""
+    return _TOKEN_RE.findall(fold(text))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class DocumentIndex:
+    """Occurrences de chaque terme replié d'un document"""
+
+    def __init__(self, doc_hash: str, term_ids: Dict[str, int], postings: List[array],
+                 token_terms: array, token_starts: array, token_ends: array, token_words: array):
+        self.doc_hash = doc_hash
+        self.term_ids = term_ids
+        self.postings = postings
+        self.token_terms = token_terms
+        self.token_starts = token_starts
+        self.token_ends = token_ends
+        self.token_words = token_words
+
+    @property
+    def token_count(self) -> int:
+        return len(self.token_starts)
+
+    @classmethod
+    def build(cls, text: str, doc_hash: Optional[str] = None) -> 'DocumentIndex':
+        builder = DocumentIndexBuilder()
+        builder.feed(text)
+        return builder.finish(doc_hash or content_hash(text))
+
+    def find(self, term: str) -> List[Tuple[int, int, int]]:
+        """Occurrences d'un terme ou d'une expression : (début, fin en caractères, position en mots)"""
+        ids = [self.term_ids.get(token) for token in tokenize(term)]
+        if not ids or None in ids:
+            return []
+
+        length = len(ids)
+        if length == 1:
+            return [(self.token_starts[i], self.token_ends[i], self.token_words[i]) for i in self.postings[ids[0]]]
+
+        # Expression : on parcourt la liste la plus courte et on vérifie les tokens voisins.
+        pivot = min(range(length), key=lambda k: len(self.postings[ids[k]]))
+        matches = []
+        last_token = len(self.token_terms) - length
+        for position in self.postings[ids[pivot]]:
+            first = position - pivot
+            if first < 0 or first > last_token:
+                continue
+            if all(self.token_terms[first + k] == ids[k] for k in range(length)):
+                matches.append((self.token_starts[first], self.token_ends[first + length - 1], self.token_words[first]))
+        return matches
+
+    def locate(self, term_groups: Sequence[Sequence[str]]) -> List[Dict[str, Any]]:
+        """Occurrences des termes de chaque groupe, triées par position, au format de `segment_scorer.top_segments`"""
+        term_locations = []
+        seen_locations = set()
+        for group_id, group in enumerate(term_groups):
+            for term in group:
+                # Les variantes qui ne diffèrent que par la casse ou les accents ont les mêmes occurrences.
+                for char_start, _, word_pos in self.find(term):
+                    if (char_start, group_id) not in seen_locations:
+                        seen_locations.add((char_start, group_id))
+                        term_locations.append({'pos': char_start, 'group_id': group_id, 'word_pos': word_pos})
+        term_locations.sort(key=lambda x: x['pos'])
+        return term_locations
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = {
+            "version": INDEX_FORMAT_VERSION,
+            "doc_hash": self.doc_hash,
+            "terms": list(self.term_ids),
+            "postings": self.postings,
+            "token_terms": self.token_terms,
+            "token_starts": self.token_starts,
+            "token_ends": self.token_ends,
+            "token_words": self.token_words,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, doc_hash: str) -> Optional['DocumentIndex']:
+        """Index sauvegardé, ou `None` s'il est absent, illisible ou d'un autre format"""
+        try:
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        if payload.get("version") != INDEX_FORMAT_VERSION or payload.get("doc_hash") != doc_hash:
+            return None
+        term_ids = {term: term_id for term_id, term in enumerate(payload["terms"])}
+        return cls(doc_hash, term_ids, payload["postings"], payload["token_terms"],
+                   payload["token_starts"], payload["token_ends"], payload["token_words"])
+
+
+class DocumentIndexBuilder:
+    """Construit un `DocumentIndex` à partir des morceaux successifs d'un texte"""
+
+    def __init__(self):
+        self.term_ids: Dict[str, int] = {}
+        self.postings: List[array] = []
+        self.token_terms, self.token_starts, self.token_ends, self.token_words = array('I'), array('I'), array('I'), array('I')
+        # Fin du texte reçu pas encore indexée : un token peut continuer dans le morceau suivant.
+        self._pending = ''
+        self._offset = 0
+        self._word_pos = 0
+
+    def feed(self, text: str, final: bool = False):
+        buffer = self._pending + text
+        folded = fold(buffer)
+        cut = len(folded)
+        if not final:
+            trailing = _TRAILING_TOKEN_RE.search(folded)
+            if trailing:
+                cut = trailing.start()
+
+        term_ids, postings = self.term_ids, self.postings
+        token_terms, token_starts, token_ends, token_words = self.token_terms, self.token_starts, self.token_ends, self.token_words
+        offset = self._offset
+        word_pos = self._word_pos
+        last_start = 0
+        for match in _TOKEN_RE.finditer(folded, 0, cut):
+            start = match.start()
+            # Même numérotation que `document_text.split(' ')`, calculée au fil de l'eau.
+            word_pos += folded.count(' ', last_start, start)
+            last_start = start
+
+            term = match.group()
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(postings)
+                postings.append(array('I'))
+            postings[term_id].append(len(token_starts))
+            token_terms.append(term_id)
+            token_starts.append(offset + start)
+            token_ends.append(offset + match.end())
+            token_words.append(word_pos)
+
+        self._word_pos = word_pos + folded.count(' ', last_start, cut)
+        self._pending = buffer[cut:]
+        self._offset = offset + cut
+
+    def finish(self, doc_hash: str) -> DocumentIndex:
+        self.feed('', final=True)
+        return DocumentIndex(doc_hash, self.term_ids, self.postings,
+                             self.token_terms, self.token_starts, self.token_ends, self.token_words)
+
+
+def index_path(doc_hash: str, index_dir: str = INDEX_DIR) -> str:
+    return os.path.join(index_dir, f"{doc_hash}.idx")
+
+
+def store_index(index: DocumentIndex, index_dir: str = INDEX_DIR):
+    """Sauvegarde un index qui vient d'être construit"""
+    try:
+        index.save(index_path(index.doc_hash, index_dir))
+    except OSError as e:
+        print(f"[RAG] Impossible de sauvegarder l'index : {e}")
+    print(f"[RAG] Index construit ({index.token_count} tokens, {len(index.term_ids)} termes).")
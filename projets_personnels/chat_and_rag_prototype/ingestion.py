@@ -0,0 +1,180 @@
+"""
+Ingestion des documents du RAG.
+
+Le fichier est lu depuis son chemin quand l'interface peut le fournir, ce
+qui évite de faire transiter tout le document en base64 par le pont JS.
+Les pages d'un PDF sont extraites en parallèle par un pool de processus,
+par tranches de `PAGES_PER_TASK` pages, puis remises dans l'ordre. Chaque
+page est nettoyée dès son arrivée et le texte nettoyé est transmis au fil
+de l'eau à `on_text` (l'index du document, par exemple) : le texte brut
+complet n'est jamais gardé en mémoire.
+"""
+
+import codecs
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Optional
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.md')
+
+PAGES_PER_TASK = 16
+# En dessous, lancer des processus coûte plus cher que l'extraction elle-même.
+PARALLEL_MIN_PAGES = 48
+INGESTION_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+TEXT_READ_SIZE = 1 << 20
+
+_HYPHEN_BREAK_RE = re.compile(r'-\s*\n')
+_SPACES_RE = re.compile(r'\s+')
+
+
+class TextCleaner:
+    """
+    Nettoyage incrémental : césures de fin de ligne supprimées, blancs réduits à une espace.
+
+    Le résultat de `feed` sur des morceaux successifs, suivi de `finish`, est
+    identique au nettoyage du texte complet. La fin de chaque morceau (blancs,
+    éventuel tiret de césure) est gardée jusqu'au morceau suivant, car une
+    césure peut être coupée entre deux pages.
+    """
+
+    def __init__(self):
+        self._carry = ''
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        combined = self._carry + text
+        cut = len(combined.rstrip())
+        while cut and combined[cut - 1] == '-':
+            cut = len(combined[:cut - 1].rstrip())
+        self._carry = combined[cut:]
+        return self._clean(combined[:cut])
+
+    def finish(self) -> str:
+        text = self._clean(self._carry).rstrip()
+        self._carry = ''
+        return text
+
+    def _clean(self, text: str) -> str:
+        text = _SPACES_RE.sub(' ', _HYPHEN_BREAK_RE.sub('', text))
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+def clean_text(text: str) -> str:
+    cleaner = TextCleaner()
+    return cleaner.feed(text) + cleaner.finish()
+
+
+def _extract_page_range(path: str, first: int, last: int) -> List[str]:
+    """Texte des pages [first, last[ ; exécuté dans un processus du pool"""
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(first, last)]
+
+
+def iter_pdf_pages(path: str, workers: int = INGESTION_WORKERS,
+                   progress: Optional[Callable[[int, int], None]] = None) -> Iterator[str]:
+    """Texte de chaque page, dans l'ordre ; extraction parallèle pour les gros documents"""
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or workers <= 1:
+            for i in range(page_count):
+                yield doc[i].get_text()
+                if progress:
+                    progress(i + 1, page_count)
+            return
+
+    ranges = [(first, min(first + PAGES_PER_TASK, page_count)) for first in range(0, page_count, PAGES_PER_TASK)]
+    ready = {}
+    next_range = 0
+    done = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futures = {pool.submit(_extract_page_range, path, first, last): i for i, (first, last) in enumerate(ranges)}
+        for future in as_completed(futures):
+            pages = future.result()
+            ready[futures[future]] = pages
+            done += len(pages)
+            if progress:
+                progress(done, page_count)
+            # Les tranches arrivent dans le désordre : on rend celles qui suivent la dernière rendue.
+            while next_range in ready:
+                yield from ready.pop(next_range)
+                next_range += 1
+
+
+def _iter_text_chunks(path: Optional[str], data: Optional[bytes],
+                      progress: Optional[Callable[[int, int], None]] = None) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    if path is not None:
+        total = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            done = 0
+            while True:
+                block = f.read(TEXT_READ_SIZE)
+                if not block:
+                    break
+                done += len(block)
+                yield decoder.decode(block)
+                if progress:
+                    progress(done, total)
+    else:
+        view = memoryview(data)
+        for start in range(0, len(view), TEXT_READ_SIZE):
+            yield decoder.decode(view[start:start + TEXT_READ_SIZE])
+            if progress:
+                progress(min(start + TEXT_READ_SIZE, len(view)), len(view))
+    yield decoder.decode(b'', final=True)
+
+
+def ingest_document(file_name: str, path: Optional[str] = None, data: Optional[bytes] = None,
+                    on_text: Optional[Callable[[str], None]] = None,
+                    progress: Optional[Callable[[int, int], None]] = None,
+                    workers: int = INGESTION_WORKERS) -> str:
+    """
+    Texte nettoyé d'un document, lu depuis `path` ou depuis son contenu `data`.
+
+    `on_text` reçoit chaque morceau de texte nettoyé dès qu'il est prêt ;
+    `progress(fait, total)` est appelé en pages pour un PDF, en octets sinon.
+    """
+    extension = os.path.splitext(file_name.lower())[1]
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError("Type de fichier non supporté (.txt, .md, .pdf uniquement).")
+    if path is None and data is None:
+        raise ValueError("Aucun contenu de fichier fourni.")
+
+    temp_path = None
+    if extension == '.pdf':
+        if not fitz:
+            raise ImportError("PyMuPDF doit être installé pour lire les fichiers PDF.")
+        if path is None:
+            # Les processus du pool rouvrent le PDF depuis un fichier.
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(data)
+                temp_path = path = f.name
+            data = None
+        raw_chunks = iter_pdf_pages(path, workers, progress)
+    else:
+        raw_chunks = _iter_text_chunks(path, data, progress)
+
+    cleaner = TextCleaner()
+    parts = []
+    try:
+        for raw in raw_chunks:
+            parts.append(cleaner.feed(raw))
+            if on_text and parts[-1]:
+                on_text(parts[-1])
+        parts.append(cleaner.finish())
+        if on_text and parts[-1]:
+            on_text(parts[-1])
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+    return ''.join(parts)
@@ -0,0 +1,91 @@
+"""
+Cache persistant des termes clés extraits par le LLM.
+
+L'extraction se fait à température 0 : pour une même question et un même
+modèle, la réponse ne change pas. Les groupes de termes sont donc gardés
+dans une base SQLite (`cache/keywords.sqlite`), sous la question normalisée
+(casse, blancs et ponctuation finale ignorés) et le nom du modèle.
+
+Une entrée expire `ttl` secondes après son calcul ; au-delà de
+`max_entries`, les entrées les moins récemment utilisées sont supprimées.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+from document_index import BASE_DIR
+
+KEYWORD_CACHE_PATH = os.path.join(BASE_DIR, 'cache', 'keywords.sqlite')
+KEYWORD_CACHE_TTL = 30 * 24 * 3600
+KEYWORD_CACHE_MAX_ENTRIES = 2000
+
+
+def normalize_question(question: str) -> str:
+    question = unicodedata.normalize('NFC', question).casefold()
+    question = re.sub(r'\s+', ' ', question).strip()
+    return question.rstrip(' ?!.…')
+
+
+class KeywordCache:
+    """Groupes de termes clés par (question normalisée, modèle), avec expiration et éviction LRU"""
+
+    def __init__(self, path: str = KEYWORD_CACHE_PATH, ttl: float = KEYWORD_CACHE_TTL,
+                 max_entries: int = KEYWORD_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Les requêtes RAG arrivent sur des threads différents.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS keywords (
+                    question TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    term_groups TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (question, model)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS keywords_last_used ON keywords (last_used)")
+
+    def get(self, question: str, model: str) -> Optional[List[List[str]]]:
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT term_groups, created_at FROM keywords WHERE question = ? AND model = ?",
+                (key, model)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM keywords WHERE question = ? AND model = ?", (key, model))
+                return None
+            self._conn.execute("UPDATE keywords SET last_used = ? WHERE question = ? AND model = ?",
+                               (now, key, model))
+        return json.loads(row[0])
+
+    def put(self, question: str, model: str, term_groups: List[List[str]]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO keywords (question, model, term_groups, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (normalize_question(question), model, json.dumps(term_groups, ensure_ascii=False), now, now))
+            self._conn.execute("DELETE FROM keywords WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM keywords WHERE rowid NOT IN "
+                "(SELECT rowid FROM keywords ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM keywords")
@@ -0,0 +1,97 @@
+"""
+Termes clés tirés du vocabulaire du document, sans appel au LLM.
+
+Pour une question courte, chaque mot porteur de sens (hors mots vides)
+forme un groupe de termes : les termes de l'index qui ont la même racine,
+obtenue par un désuffixage léger du français (pluriels, féminins, suffixes
+courants comme -isme, -ique, -ien). C'est moins fin que l'extraction par le
+LLM, mais immédiat.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+from document_index import DocumentIndex, tokenize
+
+FAST_KEYWORDS_MAX_TERMS = 4
+MAX_VARIANTS_PER_GROUP = 20
+
+MIN_STEM_LENGTH = 4
+
+FRENCH_STOPWORDS = frozenset("""
+    a ai aie aient aies ait as au aucun aucune aupres aussi autre autres aux avait avec avez avoir avons
+    bien c ca ce ceci cela celle celles celui cependant ces cet cette ceux chaque chez comme comment
+    d dans de des deja depuis dire dit doit donc dont du elle elles en encore entre est et etaient etait
+    ete etre eu eux fait faire fut il ils j je jusqu l la le les leur leurs lui m ma mais me meme mes
+    moi mon n ne ni non nos notre nous on ont ou par parce pas peu peut plus pour pourquoi qu quand
+    que quel quelle quelles quels qui quoi s sa sans se selon ses si son sont sous sur t ta te tes
+    toi ton tous tout toute toutes tres tu un une vers voila vos votre vous y
+    rapport relation relations lien liens definition quoi explique expliquer parle parler
+""".split())
+
+_SUFFIXES = sorted("""
+    issements issement ations ation ements ement iennes ienne iens ien ismes isme istes iste
+    iques ique euses euse eux aux ales ale al ees ee es e s x
+""".split(), key=len, reverse=True)
+
+
+def french_stem(term: str) -> str:
+    """Racine approximative d'un terme replié (minuscules, sans accents)"""
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= MIN_STEM_LENGTH:
+            return term[:-len(suffix)]
+    return term
+
+
+class VocabularyMatcher:
+    """Termes d'un document regroupés par racine"""
+
+    def __init__(self, index: DocumentIndex, text: str):
+        self.index = index
+        self.text = text
+        self._by_stem: Dict[str, List[int]] = {}
+        for term, term_id in index.term_ids.items():
+            if not term.isdigit():
+                self._by_stem.setdefault(french_stem(term), []).append(term_id)
+
+    def _surface_form(self, term_id: int) -> str:
+        """Terme tel qu'il apparaît (accents compris) à sa première occurrence"""
+        first = self.index.postings[term_id][0]
+        return self.text[self.index.token_starts[first]:self.index.token_ends[first]].lower()
+
+    def variants(self, term: str) -> List[str]:
+        """Termes du document de même racine, les plus fréquents d'abord"""
+        term_ids = self._by_stem.get(french_stem(term), [])
+        term_ids = sorted(term_ids, key=lambda term_id: len(self.index.postings[term_id]), reverse=True)
+        return [self._surface_form(term_id) for term_id in term_ids[:MAX_VARIANTS_PER_GROUP]]
+
+    def term_groups(self, question: str, max_terms: int = FAST_KEYWORDS_MAX_TERMS) -> Optional[List[List[str]]]:
+        return corpus_term_groups(question, [self], max_terms)
+
+
+def content_words(question: str) -> List[str]:
+    """Mots porteurs de sens de la question, repliés, sans doublon"""
+    words = []
+    for word in tokenize(question):
+        if len(word) > 2 and word not in FRENCH_STOPWORDS and word not in words:
+            words.append(word)
+    return words
+
+
+def corpus_term_groups(question: str, vocabularies: Sequence[VocabularyMatcher],
+                       max_terms: int = FAST_KEYWORDS_MAX_TERMS) -> Optional[List[List[str]]]:
+    """
+    Groupes de termes pour une question courte, variantes de tous les documents
+    réunies, ou `None` si la question a trop de mots porteurs de sens ou
+    qu'aucun n'apparaît dans les documents.
+    """
+    words = content_words(question)
+    if not words or len(words) > max_terms:
+        return None
+    groups = []
+    for word in words:
+        group = []
+        for vocabulary in vocabularies:
+            group.extend(variant for variant in vocabulary.variants(word) if variant not in group)
+        if group:
+            groups.append(group[:MAX_VARIANTS_PER_GROUP])
+    return groups or None
@@ -0,0 +1,130 @@
+"""
+Étapes de la recherche d'extraits du RAG, partagées par `app_main` et les
+bancs d'essai.
+
+Chaque document fournit des candidats (segments lexicaux, passages proches
+de la question par embeddings, ou les deux) dont la clé `rank` est
+comparable d'un document à l'autre pour un même mode. Les candidats triés
+sont élargis en extraits, débarrassés des quasi-doublons, puis assemblés
+dans le budget de contexte du modèle.
+"""
+
+from context_packer import estimate_tokens, pack_snippets
+from segment_scorer import top_segments
+from snippet_dedup import SnippetDeduplicator
+from vector_index import hybrid_rank
+
+CONTEXT_WINDOW_WORDS = 250
+MAX_SNIPPETS = 10
+MAX_SEGMENT_WORD_DISTANCE = 500
+
+JACCARD_SIMILARITY_THRESHOLD = 0.7
+
+# Budget de tokens des extraits : par défaut num_ctx, moins la réponse attendue et le gabarit du prompt.
+RAG_CONTEXT_TOKEN_BUDGET = None
+RAG_ANSWER_TOKEN_RESERVE = 1024
+MIN_CONTEXT_TOKEN_BUDGET = 256
+# Extraits uniques proposés à l'assemblage, pour remplir le budget si les meilleurs sont courts.
+MAX_PACKING_CANDIDATES = MAX_SNIPPETS * 3
+
+HYBRID_SEMANTIC_WEIGHT = 0.5
+SEMANTIC_CANDIDATE_CHUNKS = 50
+
+RAG_PROMPT_TEMPLATE = """
+Tu es un assistant IA spécialisé dans l'analyse de documents.
+Réponds à la question de l'utilisateur en te basant EXCLUSIVEMENT sur le contexte suivant.
+Ne mentionne pas que tu utilises un contexte, réponds directement. Si la réponse ne se trouve pas dans le contexte, dis clairement "L'information n'a pas été trouvée dans le document fourni.".
+
+--- CONTEXTE EXTRAIT DU DOCUMENT ---
+{context}
+--- FIN DU CONTEXTE ---
+
+Question de l'utilisateur : {question}
+"""
+
+
+def lexical_segments(document, key_term_groups):
+    """Meilleurs segments d'un document pour les groupes de termes clés"""
+    term_locations = document.index.locate(key_term_groups)
+    if not term_locations:
+        return []
+
+    best_segments = top_segments(term_locations, MAX_SEGMENT_WORD_DISTANCE)
+    print(f"[RAG] {document.name} : {len(term_locations)} occurrences de termes, {len(best_segments)} segments candidats.")
+    return best_segments
+
+
+def document_candidates(document, mode, best_segments, num_groups, vector_index=None, similarities=None):
+    """
+    Extraits candidats d'un document à partir de ses segments lexicaux et,
+    hors mode lexical, des similarités de ses passages avec la question.
+    """
+    char_window = CONTEXT_WINDOW_WORDS * 5
+    candidates = []
+    if mode == 'lexical' or (mode == 'hybrid' and similarities is None):
+        # En mode hybride sans embeddings, la similarité compte pour zéro.
+        weight = 1.0 if mode == 'lexical' else 1 - HYBRID_SEMANTIC_WEIGHT
+        for segment in best_segments:
+            method = f"Score {segment['score']}/{num_groups} (densité: {segment['density']}, écart-type: {segment['standard_deviation']:.2f})"
+            rank = (weight * segment['score'] / num_groups, -segment['density'], -segment['standard_deviation'])
+            candidates.append({'rank': rank, 'document': document, 'start': segment['start'],
+                               'end': segment['end'], 'margin': char_window, 'method': method})
+    elif mode == 'semantic':
+        if vector_index is not None:
+            for chunk, similarity in vector_index.top_k(similarities, SEMANTIC_CANDIDATE_CHUNKS):
+                start, end = vector_index.spans[chunk]
+                candidates.append({'rank': (similarity,), 'document': document, 'start': start, 'end': end,
+                                   'margin': 0, 'method': f"Similarité {similarity:.2f}"})
+    else:
+        for candidate in hybrid_rank(best_segments, num_groups, vector_index, similarities,
+                                     HYBRID_SEMANTIC_WEIGHT, SEMANTIC_CANDIDATE_CHUNKS):
+            method = f"Score hybride {candidate['hybrid']:.2f} (lexical: {candidate['lexical']:.2f}, similarité: {candidate['semantic']:.2f})"
+            # Un passage a déjà la taille d'un extrait, un segment lexical est élargi.
+            margin = 0 if 'chunk' in candidate else char_window
+            candidates.append({'rank': (candidate['hybrid'],), 'document': document, 'start': candidate['start'],
+                               'end': candidate['end'], 'margin': margin, 'method': method})
+    return candidates
+
+
+def sort_candidates(candidates):
+    # Tri stable : à égalité, l'ordre du corpus puis celui de chaque document est conservé.
+    candidates.sort(key=lambda candidate: candidate['rank'], reverse=True)
+    return candidates
+
+
+def unique_snippets(candidates):
+    """Extraits des meilleurs candidats, sans les quasi-doublons, au plus `MAX_PACKING_CANDIDATES`"""
+    unique_results = []
+    deduplicator = SnippetDeduplicator(JACCARD_SIMILARITY_THRESHOLD)
+    for candidate in candidates:
+        document = candidate['document']
+        start, end = document.snippet_bounds(candidate['start'], candidate['end'], candidate['margin'])
+        snippet_text = document.text[start:end]
+        if not snippet_text:
+            continue
+
+        if deduplicator.add(snippet_text):
+            unique_results.append({'document': document, 'start': start, 'end': end,
+                                   'core_start': candidate['start'], 'core_end': candidate['end'],
+                                   'method': candidate['method']})
+            if len(unique_results) >= MAX_PACKING_CANDIDATES:
+                break
+    return unique_results
+
+
+def context_token_budget(question, model_options):
+    """Tokens disponibles pour les extraits dans le prompt RAG"""
+    if RAG_CONTEXT_TOKEN_BUDGET:
+        return RAG_CONTEXT_TOKEN_BUDGET
+    num_ctx = int(model_options.get("num_ctx", 4096))
+    num_predict = int(model_options.get("num_predict", -1))
+    answer_reserve = num_predict if num_predict > 0 else RAG_ANSWER_TOKEN_RESERVE
+    template_tokens = estimate_tokens(RAG_PROMPT_TEMPLATE.format(context="", question=question))
+    return max(MIN_CONTEXT_TOKEN_BUDGET, num_ctx - answer_reserve - template_tokens)
+
+
+def pack_context(unique_results, budget, document_names):
+    """(blocs retenus, tokens de l'en-tête de chaque bloc), l'en-tête étant compté pour le nom le plus long"""
+    longest_name = max(document_names, key=len, default="")
+    block_overhead = estimate_tokens(f"\n\n---\n\n[Document : {longest_name}]\n")
+    return pack_snippets(unique_results, budget, MAX_SNIPPETS, block_overhead), block_overhead
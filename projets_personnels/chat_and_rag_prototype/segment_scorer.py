@@ -0,0 +1,106 @@
+"""
+Sélection des meilleurs segments candidats du RAG.
+
+Un segment va d'une occurrence de terme clé à une occurrence ultérieure
+située à moins de `max_word_distance` mots. Il est classé par nombre de
+groupes de termes couverts, puis par étendue en caractères (la plus courte
+d'abord), puis par écart-type des positions (le plus faible d'abord).
+
+Pour chaque début de segment, la fin avance d'une occurrence à la fois en
+tenant à jour le compte des groupes et les sommes des positions et de leurs
+carrés : chaque segment est évalué en temps constant. Seuls les `k` meilleurs
+sont gardés dans un tas borné. Une première passe à deux pointeurs calcule le
+score maximal atteignable depuis chaque début, ce qui permet d'abandonner
+les débuts et les fins qui ne peuvent plus entrer dans le tas.
+"""
+
+import heapq
+import math
+from typing import Any, Dict, List, Sequence
+
+MAX_CANDIDATE_SEGMENTS = 2000
+
+
+def _window_scores(groups: Sequence[int], words: Sequence[int], max_word_distance: int) -> List[int]:
+    """Nombre de groupes distincts dans la fenêtre maximale qui commence à chaque occurrence"""
+    n = len(groups)
+    counts: Dict[int, int] = {}
+    scores = [0] * n
+    end = 0
+    for start in range(n):
+        while end < n and words[end] - words[start] <= max_word_distance:
+            counts[groups[end]] = counts.get(groups[end], 0) + 1
+            end += 1
+        scores[start] = len(counts)
+        remaining = counts[groups[start]] - 1
+        if remaining:
+            counts[groups[start]] = remaining
+        else:
+            del counts[groups[start]]
+    return scores
+
+
+def top_segments(term_locations: List[Dict[str, Any]], max_word_distance: int,
+                 k: int = MAX_CANDIDATE_SEGMENTS) -> List[Dict[str, Any]]:
+    """
+    Les `k` meilleurs segments, du meilleur au moins bon.
+
+    `term_locations` doit être trié par position (`pos`) ; à égalité de clé,
+    le segment qui commence (puis finit) le plus tôt passe devant, comme avec
+    un tri stable des candidats générés dans l'ordre.
+    """
+    positions = [loc['pos'] for loc in term_locations]
+    groups = [loc['group_id'] for loc in term_locations]
+    words = [loc['word_pos'] for loc in term_locations]
+    n = len(positions)
+    reachable = _window_scores(groups, words, max_word_distance)
+
+    # Tas minimal : la racine est le moins bon segment conservé.
+    heap: List[tuple] = []
+    for i in range(n):
+        if len(heap) >= k and reachable[i] < heap[0][0]:
+            continue
+
+        start_pos = positions[i]
+        start_word = words[i]
+        seen = set()
+        total = 0.0
+        total_sq = 0.0
+        for j in range(i, n):
+            if words[j] - start_word > max_word_distance:
+                break
+            seen.add(groups[j])
+            # Positions relatives au début : l'écart-type ne change pas et les sommes restent petites.
+            offset = positions[j] - start_pos
+            total += offset
+            total_sq += offset * offset
+            count = j - i + 1
+            score = len(seen)
+            density = offset + 1
+
+            if len(heap) >= k:
+                worst_score, worst_density = heap[0][0], -heap[0][1]
+                if score == reachable[i] and (score < worst_score or (score == worst_score and density > worst_density)):
+                    # Le score ne peut plus augmenter et l'étendue ne fait que croître.
+                    break
+                if score < worst_score:
+                    continue
+
+            if count > 1:
+                variance = (total_sq - total * total / count) / (count - 1)
+                std_dev = math.sqrt(variance) if variance > 0 else 0.0
+            else:
+                std_dev = 0.0
+            key = (score, -density, -std_dev, -i, -j)
+            if len(heap) < k:
+                heapq.heappush(heap, key)
+            elif key > heap[0]:
+                heapq.heapreplace(heap, key)
+
+    heap.sort(reverse=True)
+    return [
+        {'start': positions[-neg_i], 'end': positions[-neg_j], 'score': score,
+         'density': -neg_density, 'standard_deviation': -neg_std}
+        for score, neg_density, neg_std, neg_i, neg_j in heap
+    ]
+
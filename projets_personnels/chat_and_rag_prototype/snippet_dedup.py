@@ -0,0 +1,107 @@
+"""
+Filtre des extraits quasi dupliqués pour le RAG.
+
+Deux extraits sont considérés comme doublons quand la similarité de Jaccard
+de leurs ensembles de mots dépasse `threshold`. Les ensembles de mots des
+extraits retenus sont calculés une seule fois et gardés en cache.
+
+Tant que peu d'extraits sont retenus, chaque candidat est comparé à tous.
+Au-delà de `exact_scan_limit`, chaque extrait reçoit une signature MinHash
+découpée en bandes (LSH). Seuls les extraits qui partagent au moins une bande
+avec le candidat sont comparés exactement : le coût d'un test ne dépend plus
+du nombre d'extraits retenus. Le nombre de lignes par bande est choisi pour
+détecter au moins `min_recall` des paires situées au seuil.
+"""
+
+import random
+from typing import Dict, List, Optional, Set, Tuple
+
+DEDUP_NUM_PERM = 64
+DEDUP_MIN_RECALL = 0.95
+DEDUP_EXACT_SCAN_LIMIT = 32
+
+_HASH_MASK = (1 << 64) - 1
+
+
+def choose_bands(num_perm: int, threshold: float, min_recall: float = DEDUP_MIN_RECALL) -> Tuple[int, int]:
+    """(bandes, lignes par bande) le plus sélectif qui détecte encore `min_recall` des paires au seuil"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= min_recall:
+            best = (bands, rows)
+    return best
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 1.0
+
+
+class SnippetDeduplicator:
+    """Retient les extraits qui ne sont pas trop similaires à un extrait déjà retenu"""
+
+    def __init__(self, threshold: float, num_perm: int = DEDUP_NUM_PERM,
+                 exact_scan_limit: int = DEDUP_EXACT_SCAN_LIMIT, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.exact_scan_limit = exact_scan_limit
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(64) for _ in range(num_perm)]
+        self._token_sets: List[Set[str]] = []
+        self._buckets: Optional[List[Dict[tuple, List[int]]]] = None
+        self._seen_texts: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._token_sets)
+
+    def add(self, text: str) -> bool:
+        """Retient l'extrait s'il n'est pas un doublon ; renvoie `True` s'il a été retenu"""
+        # Un texte identique à un extrait déjà examiné a la même issue (similarité 1).
+        if self.threshold < 1 and text in self._seen_texts:
+            return False
+        self._seen_texts.add(text)
+
+        tokens = set(text.lower().split())
+        if self._buckets is None:
+            candidates = range(len(self._token_sets))
+            signature = None
+        else:
+            signature = self._signature(tokens)
+            candidates = self._candidates(signature)
+
+        for index in candidates:
+            if jaccard(tokens, self._token_sets[index]) > self.threshold:
+                return False
+
+        self._token_sets.append(tokens)
+        if self._buckets is not None:
+            self._register(len(self._token_sets) - 1, signature)
+        elif len(self._token_sets) >= self.exact_scan_limit:
+            self._buckets = [{} for _ in range(self.bands)]
+            for index, token_set in enumerate(self._token_sets):
+                self._register(index, self._signature(token_set))
+        return True
+
+    def _signature(self, tokens: Set[str]) -> List[int]:
+        # Une permutation par masque XOR sur le hachage 64 bits de chaque mot.
+        hashes = [hash(token) & _HASH_MASK for token in tokens] or [0]
+        return [min(map(mask.__xor__, hashes)) for mask in self._masks]
+
+    def _band_keys(self, signature: List[int]):
+        rows = self.rows
+        for band in range(self.bands):
+            yield band, tuple(signature[band * rows:(band + 1) * rows])
+
+    def _candidates(self, signature: List[int]) -> Set[int]:
+        candidates: Set[int] = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        return candidates
+
+    def _register(self, index: int, signature: List[int]):
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(index)
@@ -0,0 +1,49 @@
+"""
+Recherche simultanée de tous les termes clés d'une requête.
+
+Les variantes de tous les groupes sont compilées une seule fois en une
+alternative régulière, la plus longue d'abord, appliquée au texte replié
+(minuscules sans accents, même longueur que l'original). Un seul passage
+sur le texte trouve alors toutes les occurrences, sans qu'une balise déjà
+insérée puisse être reprise par un terme suivant.
+"""
+
+import re
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from document_index import fold
+
+
+class TermMatcher:
+    """Occurrences des termes d'une liste de groupes, en un seul passage"""
+
+    def __init__(self, term_groups: Sequence[Sequence[str]]):
+        self.groups_by_term: Dict[str, List[int]] = {}
+        for group_id, group in enumerate(term_groups):
+            for term in group:
+                folded = ' '.join(fold(term).split())
+                if folded:
+                    group_ids = self.groups_by_term.setdefault(folded, [])
+                    if group_id not in group_ids:
+                        group_ids.append(group_id)
+        terms = sorted(self.groups_by_term, key=len, reverse=True)
+        alternation = '|'.join(map(re.escape, terms))
+        self._pattern = re.compile(r'\b(?:' + alternation + r')\b') if terms else None
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, List[int]]]:
+        """(début, fin, groupes du terme) de chaque occurrence, dans l'ordre du texte"""
+        if self._pattern is None:
+            return
+        for match in self._pattern.finditer(fold(text)):
+            yield match.start(), match.end(), self.groups_by_term[match.group()]
+
+    def highlight(self, text: str) -> str:
+        """Texte avec chaque occurrence entourée de `<mark>`"""
+        parts = []
+        last = 0
+        for start, end, _ in self.finditer(text):
+            parts.append(text[last:start])
+            parts.append(f'<mark>{text[start:end]}</mark>')
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
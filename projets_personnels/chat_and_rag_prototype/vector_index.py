@@ -0,0 +1,214 @@
+"""
+Index vectoriel local pour la recherche sémantique du RAG.
+
+Le document nettoyé est découpé en passages de `CHUNK_WORDS` mots qui se
+recouvrent de `CHUNK_OVERLAP_WORDS` mots. Les passages sont envoyés par lots
+à l'endpoint d'embeddings d'Ollama ; les vecteurs, normalisés, sont écrits
+au fil de l'eau dans une matrice NumPy float32 sur disque, relue ensuite en
+mémoire mappée. La similarité cosinus avec la question se réduit alors à un
+produit matrice-vecteur, et les K meilleurs passages sont obtenus par
+`argpartition` sans trier toute la matrice.
+
+Les embeddings sont mis en cache dans `cache/embeddings/` sous l'empreinte
+du texte et le nom du modèle : recharger un document ne les recalcule pas.
+
+NumPy est optionnel : sans lui, seule la recherche lexicale est disponible.
+"""
+
+import bisect
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from document_index import BASE_DIR, content_hash
+
+EMBEDDINGS_DIR = os.path.join(BASE_DIR, 'cache', 'embeddings')
+
+EMBEDDING_MODEL = 'nomic-embed-text'
+CHUNK_WORDS = 200
+CHUNK_OVERLAP_WORDS = 50
+EMBED_BATCH_SIZE = 32
+
+EMBEDDINGS_FORMAT_VERSION = 1
+
+_WORD_RE = re.compile(r'\S+')
+
+
+def embeddings_available() -> bool:
+    return np is not None
+
+
+def chunk_spans(text: str, chunk_words: int = CHUNK_WORDS,
+                overlap_words: int = CHUNK_OVERLAP_WORDS) -> List[Tuple[int, int]]:
+    """Passages de `chunk_words` mots qui se recouvrent : (début, fin en caractères)"""
+    words = [match.span() for match in _WORD_RE.finditer(text)]
+    step = max(1, chunk_words - overlap_words)
+    spans = []
+    for first in range(0, len(words), step):
+        last = min(first + chunk_words, len(words)) - 1
+        spans.append((words[first][0], words[last][1]))
+        if last == len(words) - 1:
+            break
+    return spans
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed_query(client, model: str, question: str):
+    """Vecteur normalisé de la question"""
+    vector = np.asarray(client.embed(model, [question])[0], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """Embeddings normalisés des passages d'un document"""
+
+    def __init__(self, model: str, spans: List[Tuple[int, int]], matrix):
+        self.model = model
+        self.spans = spans
+        self.matrix = matrix
+        self._starts = [start for start, _ in spans]
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def similarities(self, query_vector):
+        """Similarité cosinus de la question avec chaque passage"""
+        if not self.spans:
+            # Document vide : la matrice n'a pas la dimension des embeddings.
+            return np.zeros(0, dtype=np.float32)
+        return self.matrix @ query_vector
+
+    def top_k(self, similarities, k: int) -> List[Tuple[int, float]]:
+        """Les `k` passages les plus proches : (numéro du passage, similarité), du meilleur au moins bon"""
+        k = min(k, len(similarities))
+        if k <= 0:
+            return []
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best], kind='stable')]
+        return [(int(i), float(similarities[i])) for i in best]
+
+    def span_similarity(self, similarities, start: int, end: int) -> float:
+        """Meilleure similarité parmi les passages qui recouvrent [start, end]"""
+        # Les passages ont la même taille : leurs fins sont triées comme leurs débuts.
+        i = bisect.bisect_right(self._starts, end) - 1
+        best = 0.0
+        while i >= 0 and self.spans[i][1] >= start:
+            best = max(best, float(similarities[i]))
+            i -= 1
+        return best
+
+    @classmethod
+    def build(cls, text: str, client, model: str, path: str,
+              chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS,
+              batch_size: int = EMBED_BATCH_SIZE) -> 'VectorIndex':
+        spans = chunk_spans(text, chunk_words, overlap_words)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        matrix = None
+        for first in range(0, len(spans), batch_size):
+            batch = [text[start:end] for start, end in spans[first:first + batch_size]]
+            vectors = _normalize_rows(np.asarray(client.embed(model, batch), dtype=np.float32))
+            if matrix is None:
+                # La dimension n'est connue qu'au premier lot.
+                matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                                   shape=(len(spans), vectors.shape[1]))
+            matrix[first:first + len(batch)] = vectors
+            print(f"[RAG] Embeddings : {min(first + batch_size, len(spans))}/{len(spans)} passages.")
+        if matrix is None:
+            return cls(model, spans, np.zeros((0, 0), dtype=np.float32))
+
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, path)
+        meta = {
+            "version": EMBEDDINGS_FORMAT_VERSION,
+            "model": model,
+            "chunk_words": chunk_words,
+            "overlap_words": overlap_words,
+            "spans": spans,
+        }
+        with open(_meta_path(path), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return cls(model, spans, np.load(path, mmap_mode='r'))
+
+    @classmethod
+    def load(cls, path: str, model: str, chunk_words: int = CHUNK_WORDS,
+             overlap_words: int = CHUNK_OVERLAP_WORDS) -> Optional['VectorIndex']:
+        """Embeddings sauvegardés, ou `None` s'ils sont absents, illisibles ou calculés autrement"""
+        try:
+            with open(_meta_path(path), 'r', encoding='utf-8') as f:
+                meta: Dict[str, Any] = json.load(f)
+            matrix = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        expected = (EMBEDDINGS_FORMAT_VERSION, model, chunk_words, overlap_words)
+        if (meta.get("version"), meta.get("model"), meta.get("chunk_words"), meta.get("overlap_words")) != expected:
+            return None
+        spans = [tuple(span) for span in meta["spans"]]
+        if matrix.ndim != 2 or matrix.shape[0] != len(spans):
+            return None
+        return cls(model, spans, matrix)
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + '.json'
+
+
+def embeddings_path(doc_hash: str, model: str, embeddings_dir: str = EMBEDDINGS_DIR) -> str:
+    safe_model = re.sub(r'[^\w.-]', '_', model)
+    return os.path.join(embeddings_dir, f"{doc_hash}_{safe_model}.npy")
+
+
+def load_or_build_vector_index(text: str, client, model: str = EMBEDDING_MODEL,
+                               doc_hash: Optional[str] = None,
+                               embeddings_dir: str = EMBEDDINGS_DIR) -> VectorIndex:
+    """Index vectoriel du texte, relu depuis le cache disque s'il a déjà été calculé"""
+    if np is None:
+        raise RuntimeError("NumPy n'est pas installé.")
+    path = embeddings_path(doc_hash or content_hash(text), model, embeddings_dir)
+    index = VectorIndex.load(path, model)
+    if index is not None:
+        print(f"[RAG] Embeddings relus depuis le cache ({len(index)} passages).")
+        return index
+
+    index = VectorIndex.build(text, client, model, path)
+    print(f"[RAG] Embeddings calculés ({len(index)} passages, modèle {model}).")
+    return index
+
+
+def hybrid_rank(segments: Sequence[Dict[str, Any]], num_groups: int, index: VectorIndex, similarities,
+                semantic_weight: float, extra_chunks: int) -> List[Dict[str, Any]]:
+    """
+    Fusionne les segments lexicaux et les passages les plus proches de la question.
+
+    Chaque candidat reçoit `semantic_weight * similarité + (1 - semantic_weight) * score lexical`,
+    le score lexical étant la part des groupes de termes couverts. Les `extra_chunks`
+    meilleurs passages entrent aussi comme candidats (score lexical nul), ce qui
+    retrouve les paraphrases que les termes exacts manquent.
+    """
+    candidates = []
+    for segment in segments:
+        lexical = segment['score'] / num_groups if num_groups else 0.0
+        semantic = index.span_similarity(similarities, segment['start'], segment['end'])
+        candidates.append({**segment, 'lexical': lexical, 'semantic': semantic})
+    for chunk, semantic in index.top_k(similarities, extra_chunks):
+        start, end = index.spans[chunk]
+        candidates.append({'start': start, 'end': end, 'chunk': chunk, 'lexical': 0.0, 'semantic': semantic})
+
+    for candidate in candidates:
+        candidate['hybrid'] = semantic_weight * candidate['semantic'] + (1 - semantic_weight) * candidate['lexical']
+    # Tri stable : à égalité, l'ordre lexical est conservé.
+    candidates.sort(key=lambda c: c['hybrid'], reverse=True)
+    return candidates
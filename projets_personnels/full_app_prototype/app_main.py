@@ -1,13 +1,18 @@
 import webview
-import threading
+import asyncio
 import requests
 import json
 import os
-import time
 import maestro
-import re
-from collections import deque
 from node_registry import NODE_REGISTRY
+from scheduler import AsyncWorkflowScheduler
+from ollama_client import get_client
+from stream_sink import StreamSink
+from result_cache import NodeResultCache
+from run_memory import WorkflowRunMemory, compute_fingerprints
+from workflow_plan import DEFAULT_PROMPT, PromptTemplate, WorkflowPlanCache
+from run_manager import RunCancelled, RunManager
+from async_engine import AsyncOllamaClient, get_engine, get_ui_bridge
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 WORKFLOWS_DIR = os.path.join(BASE_DIR, 'workflows')
@@ -21,6 +26,13 @@ os.makedirs(MAESTRO_DIR, exist_ok=True)
 class Api:
     def __init__(self):
         self.node_registry = NODE_REGISTRY
+        self.async_scheduler = AsyncWorkflowScheduler()
+        self.ollama = get_client()
+        self.async_ollama = AsyncOllamaClient()
+        self.result_cache = NodeResultCache()
+        self.run_memory = WorkflowRunMemory()
+        self.plan_cache = WorkflowPlanCache()
+        self.runs = RunManager()
     
     def get_node_options(self):
         return self.node_registry.generate_interface_options()
@@ -75,7 +87,42 @@ class Api:
     def get_maestro_node_documentation(self):
         return self.node_registry.generate_maestro_documentation()
 
-    def _execute_node(self, node, inputs, global_model):
+    def _node_model(self, node, global_model):
+        """Modèle effectivement interrogé par un nœud, ou None s'il n'appelle aucun LLM."""
+        node_type = node.get('type')
+        if node_type == 'workflow/llm_model':
+            model_in_node = node.get('properties', {}).get('model')
+            if model_in_node and model_in_node != "{{SELECTED_MODEL}}":
+                return model_in_node
+            return global_model
+        if node_type == 'workflow/iterative_llm':
+            return global_model
+        return None
+
+    def _render_prompt(self, props, inputs, template=None):
+        if template is None:
+            template = PromptTemplate(props.get('prompt', DEFAULT_PROMPT))
+        return template.render(inputs)
+
+    async def _cached_llm_call_async(self, node_type, history, model):
+        """Appel LLM mis en cache sur (type de nœud, modèle, prompt)."""
+        cache_key = NodeResultCache.make_key(node_type, model, history[-1]['content'])
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached, True
+        try:
+            result = await self.async_ollama.chat(model, history)
+        except Exception as e:
+            print(f"Erreur lors de l'appel à Ollama : {e}")
+            return f"Erreur (bloquant): {e}", False
+        self.result_cache.put(cache_key, result)
+        return result, False
+
+    def _has_error_output(self, outputs):
+        return any(str(value).startswith("Erreur (bloquant)") for value in outputs.values())
+
+    async def _execute_node(self, node, inputs, global_model, template=None):
+        """Exécution d'un nœud sans affichage des étapes, pour le chat et les séquences."""
         node_type = node['type']
         props = node.get('properties', {})
         outputs = {}
@@ -88,36 +135,23 @@ class Api:
             outputs[0] = props.get('value', '')
         
         elif node_type == 'workflow/llm_model':
-            custom_prompt_template = props.get('prompt', '{{in_1}}')
-            final_prompt = custom_prompt_template
-
-            for i in range(4):
-                placeholder = f"{{{{in_{i+1}}}}}"
-                input_text = str(inputs.get(i, ''))
-                final_prompt = final_prompt.replace(placeholder, input_text)
-            
-            final_prompt = re.sub(r'\{\{in_\d\}\}', '', final_prompt)
-
-            model_in_node = props.get('model')
-            if model_in_node and model_in_node != "{{SELECTED_MODEL}}":
-                model_to_use = model_in_node
-            else:
-                model_to_use = global_model
+            final_prompt = self._render_prompt(props, inputs, template)
+            model_to_use = self._node_model(node, global_model)
 
             history = [{'role': 'user', 'content': final_prompt}]
-            outputs[0] = self._ollama_worker_blocking(history, model_to_use)
+            outputs[0], _ = await self._cached_llm_call_async(node_type, history, model_to_use)
 
         elif node_type == 'workflow/iterative_llm':
             current_text = inputs.get(0, '')
             iterations = int(props.get('iterations', 1))
             for i in range(iterations):
                 history = [{'role': 'user', 'content': current_text}]
-                current_text = self._ollama_worker_blocking(history, global_model)
+                current_text, _ = await self._cached_llm_call_async(node_type, history, global_model)
             outputs[0] = current_text
 
         return outputs
 
-    def _execute_node_stream(self, node, inputs, global_model, window, is_maestro_run):
+    async def _execute_node_async(self, node, inputs, global_model, ui, is_maestro_run, step_id=None, template=None, run=None):
         node_type = node['type']
         props = node.get('properties', {})
         outputs = {}
@@ -128,72 +162,90 @@ class Api:
         def escape_js(text):
             return json.dumps(str(text))
 
+        step_js = escape_js(step_id if step_id is not None else node.get('id', node_title))
+
         if not is_maestro_run and node_type != 'workflow/text_output':
-            window.evaluate_js(f"window.api.showWorkflowStepResult({escape_js(node_title)}, '')")
+            ui.call(f"window.api.showWorkflowStepResult({step_js}, {escape_js(node_title)}, '')")
 
         if node_type == 'workflow/text_input':
             outputs[0] = props.get('value', '')
             if not is_maestro_run:
-                window.evaluate_js(f"window.api.updateLastStepResult({escape_js(outputs[0])})")
+                ui.call(f"window.api.updateStepResult({step_js}, {escape_js(outputs[0])})")
         
         elif node_type == 'workflow/llm_model':
-            custom_prompt_template = props.get('prompt', '{{in_1}}')
-            final_prompt = custom_prompt_template
+            final_prompt = self._render_prompt(props, inputs, template)
+            model_to_use = self._node_model(node, global_model)
 
-            for i in range(4):
-                placeholder = f"{{{{in_{i+1}}}}}"
-                input_text = str(inputs.get(i, ''))
-                final_prompt = final_prompt.replace(placeholder, input_text)
-            
-            final_prompt = re.sub(r'\{\{in_\d\}\}', '', final_prompt)
-            
-            model_in_node = props.get('model')
-            
-            if model_in_node and model_in_node != "{{SELECTED_MODEL}}":
-                model_to_use = model_in_node
-            else:
-                model_to_use = global_model
+            cache_key = NodeResultCache.make_key(node_type, model_to_use, final_prompt)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                if not is_maestro_run:
+                    ui.call(f"window.api.updateStepResult({step_js}, {escape_js(cached)}, 'cache')")
+                outputs[0] = cached
+                return outputs
 
             full_response_text = ""
-            url = "http://localhost:11434/api/chat"
             history = [{'role': 'user', 'content': final_prompt}]
-            payload = {"model": model_to_use, "messages": history, "stream": True}
-
-            with requests.post(url, json=payload, stream=True) as response:
-                response.raise_for_status()
-                for line in response.iter_lines():
-                    if line:
-                        chunk = json.loads(line.decode('utf-8'))
-                        content_part = chunk['message']['content']
-                        full_response_text += content_part
-                        if not is_maestro_run:
-                            window.evaluate_js(f"window.api.appendToWorkflowResponse({escape_js(content_part)})")
-            
+
+            def emit(text):
+                if not is_maestro_run:
+                    ui.call(f"window.api.appendToWorkflowResponse({escape_js(text)}, {step_js})")
+
+            with StreamSink(emit) as sink:
+                async for content_part in self.async_ollama.stream_chat(model_to_use, history):
+                    full_response_text += content_part
+                    sink.write(content_part)
+
+            self.result_cache.put(cache_key, full_response_text)
             outputs[0] = full_response_text
 
         elif node_type == 'workflow/iterative_llm':
             current_text = inputs.get(0, '')
             iterations = int(props.get('iterations', 1))
             for i in range(iterations):
+                if run is not None:
+                    await run.acheckpoint()
                 history = [{'role': 'user', 'content': current_text}]
-                current_text = self._ollama_worker_blocking(history, global_model)
+                current_text, from_cache = await self._cached_llm_call_async(node_type, history, global_model)
                 if not is_maestro_run:
+                    source = 'cache' if from_cache else ''
                     step_text = f"--- Itération {i+1}/{iterations} ---\n{current_text}"
-                    window.evaluate_js(f"window.api.updateLastStepResult({escape_js(step_text)})")
-                    time.sleep(0.5)
+                    ui.call(f"window.api.updateStepResult({step_js}, {escape_js(step_text)}, {escape_js(source)})")
+                    if not from_cache:
+                        await asyncio.sleep(0.5)
             outputs[0] = current_text
 
-        if node_type == 'workflow/text_output' and not is_maestro_run:
-             window.evaluate_js("window.api.hideLastStep()")
-
         return outputs
 
-    def _run_workflow_stream_worker(self, filename, user_prompt, global_model):
-        window = webview.windows[0]
+    async def _run_workflow_logic(self, plan, global_model, initial_input=None):
+        """Exécution d'un workflow compilé sur la boucle du moteur, utilisée par le chat et les séquences."""
+        nodes = plan.nodes_for_input(initial_input)
+
+        async def execute(node_id, node_outputs):
+            node = nodes[node_id]
+            if node['type'] == 'workflow/text_output':
+                return {}
+            input_values = plan.gather_inputs(node_id, node_outputs)
+            return await self._execute_node(node, input_values, global_model, template=plan.templates.get(node_id))
+
+        node_outputs = await self.async_scheduler.run(plan.execution_order, plan.adj, execute, lambda node_id: self._node_model(nodes[node_id], global_model))
+
+        final_outputs = []
+        for node_id, node in nodes.items():
+            if node['type'] == 'workflow/text_output':
+                input_values = plan.gather_inputs(node_id, node_outputs)
+                final_outputs.extend(str(value) for value in input_values.values())
+
+        if not final_outputs:
+            return "Aucun résultat final produit par les nœuds de sortie."
+        return "\n\n---\n\n".join(final_outputs)
+
+    async def _run_workflow_async(self, filename, user_prompt, global_model, run=None):
+        ui = get_ui_bridge(webview.windows[0])
         
         is_maestro_run = False
         try:
-            is_maestro_run = window.evaluate_js("document.getElementById('maestro-view').classList.contains('active')")
+            is_maestro_run = await ui.evaluate("document.getElementById('maestro-view').classList.contains('active')")
         except Exception:
             pass
 
@@ -201,63 +253,57 @@ class Api:
 
         try:
             if not is_maestro_run:
-                window.evaluate_js(f"window.{api_target}.startWorkflowMessage()")
-            
-            workflow_data = self.load_workflow(filename)
-            
-            nodes = {str(node['id']): node for node in workflow_data['nodes']}
-            links = workflow_data.get('links', [])
+                ui.call(f"window.{api_target}.startWorkflowMessage()")
             
-            adj = {node_id: [] for node_id in nodes}
-            in_degree = {node_id: 0 for node_id in nodes}
-            
-            for link in links:
-                if len(link) >= 5:
-                    source_id = str(link[1])
-                    target_id = str(link[3])
-                    if source_id in adj and target_id in in_degree:
-                        adj[source_id].append(target_id)
-                        in_degree[target_id] += 1
-
-            queue = deque([node_id for node_id in nodes if in_degree[node_id] == 0])
-            execution_order = []
-            
-            while queue:
-                u = queue.popleft()
-                execution_order.append(u)
-                for v in adj.get(u, []):
-                    in_degree[v] -= 1
-                    if in_degree[v] == 0:
-                        queue.append(v)
-
-            if len(execution_order) != len(nodes):
-                raise Exception("Le workflow contient un cycle ou des nœuds déconnectés.")
-
-            node_inputs_map = {node_id: {} for node_id in nodes}
-            for link in links:
-                if len(link) >= 5:
-                    source_id, source_slot, target_id, target_slot = str(link[1]), link[2], str(link[3]), link[4]
-                    if target_id in node_inputs_map:
-                        node_inputs_map[target_id][target_slot] = (source_id, source_slot)
-
-            if user_prompt is not None:
-                for node_id, node in nodes.items():
-                    if node['type'] == 'workflow/text_input':
-                        node.setdefault('properties', {})['value'] = user_prompt
-
-            node_outputs = {}
-            for node_id in execution_order:
+            plan = self.load_workflow_plan(filename)
+            nodes = plan.nodes_for_input(user_prompt)
+            execution_order = plan.execution_order
+            node_inputs_map = plan.inputs
+            if run is not None:
+                run.set_total(len(execution_order))
+
+            model_of = lambda node_id: self._node_model(nodes[node_id], global_model)
+            fingerprints = compute_fingerprints(execution_order, nodes, node_inputs_map, model_of)
+            reusable_count = self.run_memory.begin(filename, fingerprints)
+            if reusable_count:
+                print(f"{reusable_count} nœud(s) inchangé(s) depuis la dernière exécution de '{filename}'.")
+
+            async def execute(node_id, node_outputs):
                 node = nodes[node_id]
-                input_values = {}
-                for target_slot, (origin_id, origin_slot) in node_inputs_map.get(node_id, {}).items():
-                    if origin_id in node_outputs and origin_slot in node_outputs[origin_id]:
-                        input_values[target_slot] = node_outputs[origin_id][origin_slot]
+                if run is None:
+                    return await execute_node(node_id, node, node_outputs)
+                await run.acheckpoint()
+                run.node_started(node_id, node.get('title', node['type']))
+                try:
+                    return await execute_node(node_id, node, node_outputs)
+                finally:
+                    run.node_finished(node_id)
+
+            async def execute_node(node_id, node, node_outputs):
+                input_values = plan.gather_inputs(node_id, node_outputs)
                 
-                if is_maestro_run and node['type'] == 'workflow/text_output':
-                    pass
-                else:
-                    outputs = self._execute_node_stream(node, input_values, global_model, window, is_maestro_run)
-                    node_outputs[node_id] = outputs
+                if node['type'] == 'workflow/text_output':
+                    if not is_maestro_run:
+                        for origin_id, _ in node_inputs_map.get(node_id, {}).values():
+                            ui.call(f"window.api.hideStep({json.dumps(origin_id)})")
+                    return {}
+
+                if model_of(node_id) is not None:
+                    previous_outputs = self.run_memory.lookup(filename, node_id, fingerprints[node_id])
+                    if previous_outputs is not None:
+                        if not is_maestro_run:
+                            step_js = json.dumps(node_id)
+                            node_title = node.get('title', node['type'])
+                            ui.call(f"window.api.showWorkflowStepResult({step_js}, {json.dumps(node_title)}, '')")
+                            ui.call(f"window.api.updateStepResult({step_js}, {json.dumps(str(previous_outputs.get(0, '')))}, 'reuse')")
+                        return previous_outputs
+
+                outputs = await self._execute_node_async(node, input_values, global_model, ui, is_maestro_run, step_id=node_id, template=plan.templates.get(node_id), run=run)
+                if not self._has_error_output(outputs):
+                    self.run_memory.record(filename, node_id, fingerprints[node_id], outputs)
+                return outputs
+
+            node_outputs = await self.async_scheduler.run(execution_order, plan.adj, execute, model_of)
 
             final_outputs = []
             final_outputs_with_titles = []
@@ -278,9 +324,9 @@ class Api:
                 else:
                     final_text = "Aucun résultat final produit par les nœuds de sortie."
                 escaped_final_text = json.dumps(final_text)
-                window.evaluate_js(f"window.api.finalizeWorkflowResponseWithData({escaped_final_text})")
+                ui.call(f"window.api.finalizeWorkflowResponseWithData({escaped_final_text})")
             else:
-                window.evaluate_js(f"window.{api_target}.showBeautifierLoading('Optimisation et présentation des résultats...')")
+                ui.call(f"window.{api_target}.showBeautifierLoading('Optimisation et présentation des résultats...')")
                 
                 raw_outputs_str = ""
                 for i, item in enumerate(final_outputs_with_titles):
@@ -304,85 +350,93 @@ class Api:
                 )
 
                 history = [{'role': 'user', 'content': beautifier_prompt}]
-                beautified_result = self._ollama_worker_blocking(history, global_model)
+                beautified_result = await self._ollama_worker_async(history, global_model)
                 
                 escaped_final_text = json.dumps(beautified_result)
-                window.evaluate_js(f"window.{api_target}.displayFinalBeautifiedResult({escaped_final_text})")
+                ui.call(f"window.{api_target}.displayFinalBeautifiedResult({escaped_final_text})")
+
 
+        except (asyncio.CancelledError, RunCancelled):
+            print(f"Exécution du workflow '{filename}' annulée.")
+            callback = 'displayCancelled' if is_maestro_run else 'cancelWorkflowResponse'
+            ui.call(f"window.{api_target}.{callback}()")
+            raise
 
         except Exception as e:
             import traceback
             error_message = f"Erreur lors de l'exécution du workflow '{filename}': {e}"
             print(f"DEBUG: {error_message}\n{traceback.format_exc()}")
             escaped_error = json.dumps(error_message)
-            window.evaluate_js(f"window.{api_target}.displayError({escaped_error})")
+            ui.call(f"window.{api_target}.displayError({escaped_error})")
 
     def run_workflow_from_chat(self, filename, user_prompt, global_model):
         try:
-            workflow_data = self.load_workflow(filename)
-            return self._run_workflow_logic(workflow_data, global_model, initial_input=user_prompt)
+            plan = self.load_workflow_plan(filename)
+            return get_engine().run(self._run_workflow_logic(plan, global_model, initial_input=user_prompt))
         except Exception as e:
             return f"Erreur lors de l'exécution du workflow '{filename}': {e}"
 
     def run_workflow_from_chat_stream(self, filename, user_prompt, global_model):
-        thread = threading.Thread(target=self._run_workflow_stream_worker, args=(filename, user_prompt, global_model))
-        thread.start()
+        return self.runs.start_async(self._run_workflow_async, filename, user_prompt, global_model,
+                                     kind='workflow', label=filename)
 
     def run_sequence_from_chat(self, filename, user_prompt, global_model):
         try:
             sequence_files = self.load_sequence(filename)
-            last_output = user_prompt
-            for i, wf_filename in enumerate(sequence_files):
-                workflow_data = self.load_workflow(wf_filename)
-                last_output = self._run_workflow_logic(workflow_data, global_model, initial_input=last_output)
-            return last_output
+            return get_engine().run(self._run_sequence(sequence_files, user_prompt, global_model))
         except Exception as e:
             return f"Erreur lors de l'exécution de la séquence '{filename}': {e}"
     
+    async def _run_sequence(self, sequence_files, user_prompt, global_model):
+        last_output = user_prompt
+        for wf_filename in sequence_files:
+            plan = self.load_workflow_plan(wf_filename)
+            last_output = await self._run_workflow_logic(plan, global_model, initial_input=last_output)
+        return last_output
+    
     def invoke_maestro(self, user_prompt, global_model, complexity):
-        thread = threading.Thread(target=maestro.create_and_run_workflow, args=(self, user_prompt, global_model, complexity))
-        thread.start()
+        return self.runs.start_async(maestro.create_and_run_workflow, self, user_prompt, global_model, complexity,
+                                     kind='maestro', label=user_prompt[:60])
+
+    def cancel_run(self, run_id):
+        return self.runs.cancel(run_id)
+
+    def pause_run(self, run_id):
+        return self.runs.pause(run_id)
+
+    def resume_run(self, run_id):
+        return self.runs.resume(run_id)
+
+    def get_run_status(self, run_id):
+        return self.runs.status(run_id)
 
     def get_installed_models(self):
         try:
-            response = requests.get("http://localhost:11434/api/tags")
-            response.raise_for_status()
-            models_data = response.json()
-            return [model['name'] for model in models_data.get('models', [])]
+            return self.ollama.list_models()
         except requests.exceptions.RequestException:
             return ["OLLAMA_OFFLINE"]
 
     def send_message_to_ollama(self, history, model):
-        thread = threading.Thread(target=self._ollama_worker_stream, args=(history, model))
-        thread.start()
+        get_engine().submit(self._ollama_stream_async(history, model))
 
-    def _ollama_worker_stream(self, history, model):
-        window = webview.windows[0]
+    async def _ollama_stream_async(self, history, model):
+        ui = get_ui_bridge(webview.windows[0])
         try:
-            url = "http://localhost:11434/api/chat"
-            payload = {"model": model, "messages": history, "stream": True}
-            with requests.post(url, json=payload, stream=True) as response:
-                response.raise_for_status()
-                for line in response.iter_lines():
-                    if line:
-                        chunk = json.loads(line.decode('utf-8'))
-                        content_part = chunk['message']['content']
-                        escaped_chunk = json.dumps(content_part)
-                        window.evaluate_js(f"window.api.appendToResponse({escaped_chunk})")
-            window.evaluate_js("window.api.finalizeResponse()")
+            def emit(text):
+                ui.call(f"window.api.appendToResponse({json.dumps(text)})")
+
+            with StreamSink(emit) as sink:
+                async for content_part in self.async_ollama.stream_chat(model, history):
+                    sink.write(content_part)
+            ui.call("window.api.finalizeResponse()")
         except Exception as e:
             error_message = f"Erreur de communication avec Ollama: {e}"
             escaped_error = json.dumps(error_message)
-            window.evaluate_js(f"window.api.showError({escaped_error})")
+            ui.call(f"window.api.showError({escaped_error})")
     
-    def _ollama_worker_blocking(self, history, model):
+    async def _ollama_worker_async(self, history, model, options=None, **extra):
         try:
-            url = "http://localhost:11434/api/chat"
-            payload = {"model": model, "messages": history, "stream": False}
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            response_data = response.json()
-            return response_data['message']['content']
+            return await self.async_ollama.chat(model, history, options, **extra)
         except Exception as e:
             return f"Erreur (bloquant): {e}"
 
@@ -396,6 +450,7 @@ class Api:
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2)
+            self.plan_cache.invalidate(filepath)
             return f"Workflow '{filename}' sauvegardé."
         except Exception as e:
             return f"Erreur lors de la sauvegarde: {e}"
@@ -409,15 +464,21 @@ class Api:
             print(f"Erreur list_workflows: {e}")
             return []
 
-    def load_workflow(self, filename):
+    def _workflow_path(self, filename):
         standard_path = os.path.join(WORKFLOWS_DIR, filename)
         maestro_path = os.path.join(MAESTRO_DIR, filename)
         
-        filepath = standard_path if os.path.exists(standard_path) else maestro_path
+        return standard_path if os.path.exists(standard_path) else maestro_path
+
+    def load_workflow(self, filename):
+        filepath = self._workflow_path(filename)
         
         with open(filepath, 'r', encoding='utf-8') as f:
             return json.load(f)
 
+    def load_workflow_plan(self, filename):
+        return self.plan_cache.get(self._workflow_path(filename), repair_cycles=False)
+
     def save_sequence(self, filename, data):
         if not filename.endswith('.json'):
             filename += '.json'
@@ -4,6 +4,7 @@ let currentStreamContent = '';
 let workflowGraph, workflowCanvas;
 let currentNodeBeingConfigured = null;
 let currentWorkflowMessageElement = null;
+let currentWorkflowRunId = null;
 let nodeRegistry = {};
 let nodeCategories = {};
 
@@ -64,6 +65,9 @@ function updateModelSelector(models) {
 function enableControls() {
     const messageInput = document.getElementById('message-input');
     const sendButton = document.getElementById('send-button');
+    const stopButton = document.getElementById('stop-button');
+    currentWorkflowRunId = null;
+    stopButton.classList.remove('active');
     messageInput.disabled = false;
     modelSelector.disabled = false;
     messageInput.focus();
@@ -1,10 +1,16 @@
 function initializeChat() {
     const newChatButton = document.getElementById('new-chat-button');
     const sendButton = document.getElementById('send-button');
+    const stopButton = document.getElementById('stop-button');
     const messageInput = document.getElementById('message-input');
 
     newChatButton.addEventListener('click', startNewChat);
     sendButton.addEventListener('click', sendMessage);
+    stopButton.addEventListener('click', () => {
+        if (!currentWorkflowRunId) return;
+        stopButton.disabled = true;
+        window.pywebview.api.cancel_run(currentWorkflowRunId);
+    });
     messageInput.addEventListener('keydown', (e) => { if (e.key === 'Enter' && !e.shiftKey) { e.preventDefault(); sendMessage(); } });
     messageInput.addEventListener('input', () => {
         messageInput.style.height = 'auto';
@@ -37,7 +43,14 @@ async function sendMessage() {
     modelSelector.disabled = true;
 
     if (selectedWorkflow) {
-        window.pywebview.api.run_workflow_from_chat_stream(selectedWorkflow, messageText, selectedModel);
+        const runId = await window.pywebview.api.run_workflow_from_chat_stream(selectedWorkflow, messageText, selectedModel);
+        // Le run a pu se terminer (et réactiver les contrôles) avant le retour de son identifiant.
+        if (messageInput.disabled) {
+            const stopButton = document.getElementById('stop-button');
+            currentWorkflowRunId = runId;
+            stopButton.disabled = false;
+            stopButton.classList.add('active');
+        }
         return;
     } else if (selectedSequence) {
         const resultElement = appendMessageToUI('', 'workflow-bot');
@@ -105,6 +118,18 @@ function appendErrorMessage(text) {
     chatContainer.appendChild(errorDiv);
 }
 
+const STEP_SOURCE_BADGES = {
+    cache: '<span class="workflow-step-badge" title="Résultat servi par le cache"><i class="fa-solid fa-bolt"></i> cache</span>',
+    reuse: '<span class="workflow-step-badge" title="Nœud inchangé depuis la dernière exécution"><i class="fa-solid fa-recycle"></i> inchangé</span>',
+};
+
+function findWorkflowStep(stepId, selector = '') {
+    const steps = currentWorkflowMessageElement.querySelectorAll('.workflow-step');
+    const step = Array.from(steps).find(el => el.dataset.stepId === String(stepId));
+    if (!step) return null;
+    return selector ? step.querySelector(selector) : step;
+}
+
 function initializeExecutionSelectors() {
     const workflowSelector = document.getElementById('workflow-selector');
     const sequenceSelector = document.getElementById('sequence-selector');
@@ -171,13 +196,24 @@ window.api = {
     startWorkflowMessage: () => {
         currentWorkflowMessageElement = appendMessageToUI('', 'workflow-bot');
     },
-    showWorkflowStepResult: (title, initialContent) => {
+    cancelWorkflowResponse: () => {
+        if (currentWorkflowMessageElement) {
+            const notice = document.createElement('div');
+            notice.className = 'workflow-step-cancelled';
+            notice.innerHTML = '<i class="fa-solid fa-stop"></i> Exécution annulée.';
+            currentWorkflowMessageElement.appendChild(notice);
+        }
+        currentWorkflowMessageElement = null;
+        enableControls();
+    },
+    showWorkflowStepResult: (stepId, title, initialContent) => {
         const chatContainer = document.getElementById('chat-container');
         if (document.getElementById('maestro-view').classList.contains('active')) return;
         if (!currentWorkflowMessageElement) return;
         
         const stepDiv = document.createElement('div');
         stepDiv.className = 'workflow-step';
+        stepDiv.dataset.stepId = stepId;
         const titleDiv = document.createElement('div');
         titleDiv.className = 'workflow-step-title';
         titleDiv.textContent = title;
@@ -195,35 +231,41 @@ window.api = {
         }
         chatContainer.scrollTop = chatContainer.scrollHeight;
     },
-    updateLastStepResult: (content) => {
+    updateStepResult: (stepId, content, source = '') => {
         const chatContainer = document.getElementById('chat-container');
         if (document.getElementById('maestro-view').classList.contains('active')) return;
         if (!currentWorkflowMessageElement) return;
-        const lastStep = currentWorkflowMessageElement.querySelector('.workflow-step:last-child .workflow-step-content');
-        if (lastStep) {
-            processFinalContent(lastStep, content);
+        const step = findWorkflowStep(stepId, '.workflow-step-content');
+        if (step) {
+            const titleEl = findWorkflowStep(stepId, '.workflow-step-title');
+            const badge = titleEl && titleEl.querySelector('.workflow-step-badge');
+            if (badge) badge.remove();
+            if (titleEl && STEP_SOURCE_BADGES[source]) {
+                titleEl.insertAdjacentHTML('beforeend', STEP_SOURCE_BADGES[source]);
+            }
+            processFinalContent(step, content);
             chatContainer.scrollTop = chatContainer.scrollHeight;
         }
     },
-    appendToWorkflowResponse: (chunk) => {
+    appendToWorkflowResponse: (chunk, stepId) => {
         const chatContainer = document.getElementById('chat-container');
         if (document.getElementById('maestro-view').classList.contains('active')) return;
         if (!currentWorkflowMessageElement) return;
-        const lastStep = currentWorkflowMessageElement.querySelector('.workflow-step:last-child .workflow-step-content');
-        if (lastStep) {
-            if (lastStep.querySelector('.thinking-indicator')) {
-                lastStep.innerHTML = '';
+        const step = findWorkflowStep(stepId, '.workflow-step-content');
+        if (step) {
+            if (step.querySelector('.thinking-indicator')) {
+                step.innerHTML = '';
             }
-            lastStep.textContent += chunk;
+            step.textContent += chunk;
             chatContainer.scrollTop = chatContainer.scrollHeight;
         }
     },
-    hideLastStep: () => {
+    hideStep: (stepId) => {
         if (document.getElementById('maestro-view').classList.contains('active')) return;
         if (!currentWorkflowMessageElement) return;
-        const lastStep = currentWorkflowMessageElement.querySelector('.workflow-step:last-child');
-        if (lastStep) {
-            lastStep.style.display = 'none';
+        const step = findWorkflowStep(stepId);
+        if (step) {
+            step.style.display = 'none';
         }
     },
     finalizeWorkflowResponseWithData: (rawContent) => {
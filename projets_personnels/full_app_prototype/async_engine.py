@@ -0,0 +1,257 @@
+"""
+Moteur d'exécution asynchrone des workflows et de Maestro.
+
+Toutes les exécutions partagent une seule boucle asyncio, qui tourne dans un
+thread dédié : un flux de génération en cours coûte une coroutine et non plus
+un thread système.
+
+Deux composants complètent la boucle :
+- `AsyncOllamaClient` parle à Ollama via httpx lorsqu'il est installé, avec
+  les mêmes reprises que `OllamaClient` (backoff exponentiel sur les réponses
+  503, le temps que le modèle se charge). Sinon, il se replie sur le client
+  `requests` poolé, exécuté dans le pool de threads de la boucle.
+- `UiBridge` transmet les appels `window.evaluate_js` de pywebview à un thread
+  unique, dans l'ordre. Les coroutines ne bloquent ainsi jamais la boucle sur
+  l'aller-retour avec la webview.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from ollama_client import (
+    BACKOFF_FACTOR, KEEP_ALIVE, MAX_RETRIES, OLLAMA_BASE_URL, POOL_SIZE, TIMEOUTS,
+    OllamaError, get_client,
+)
+
+
+class EngineLoop:
+    """Boucle asyncio exécutée en permanence dans un thread d'arrière-plan"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='async-engine', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Planifie une coroutine depuis n'importe quel thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Exécute une coroutine et attend son résultat (à appeler hors de la boucle)"""
+        return self.submit(coro).result(timeout)
+
+
+_engine: Optional[EngineLoop] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> EngineLoop:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = EngineLoop()
+        return _engine
+
+
+class UiBridge:
+    """Sérialise les appels `evaluate_js` d'une fenêtre dans un thread dédié"""
+
+    def __init__(self, window):
+        self.window = window
+        self._queue: "queue.Queue[Tuple[str, concurrent.futures.Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._consume, name='ui-bridge', daemon=True)
+        self._thread.start()
+
+    def call(self, script: str) -> concurrent.futures.Future:
+        """Met l'appel en file sans attendre son exécution"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((script, future))
+        return future
+
+    async def evaluate(self, script: str) -> Any:
+        """Exécute le script et renvoie sa valeur, sans bloquer la boucle"""
+        return await asyncio.wrap_future(self.call(script))
+
+    def _consume(self):
+        while True:
+            script, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.window.evaluate_js(script))
+            except Exception as e:
+                future.set_exception(e)
+
+
+_bridges: Dict[int, UiBridge] = {}
+_bridges_lock = threading.Lock()
+
+
+def get_ui_bridge(window) -> UiBridge:
+    with _bridges_lock:
+        bridge = _bridges.get(id(window))
+        if bridge is None or bridge.window is not window:
+            bridge = _bridges[id(window)] = UiBridge(window)
+        return bridge
+
+
+class _ResponseScope:
+    """`cancel_scope` du client synchrone : ferme la réponse quand le consommateur abandonne"""
+
+    def __init__(self):
+        self._response = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def attach(self, response):
+        with self._lock:
+            if not self._closed:
+                self._response = response
+                return
+        response.close()
+        raise OllamaError("Flux abandonné par le consommateur")
+
+    def detach(self, response):
+        with self._lock:
+            self._response = None
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+
+_STREAM_DONE = object()
+
+
+class AsyncOllamaClient:
+    """Équivalent asynchrone de `OllamaClient` pour `/api/chat`"""
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, keep_alive: Optional[str] = KEEP_ALIVE,
+                 timeouts: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.keep_alive = keep_alive
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        self._http = None
+
+    @property
+    def uses_httpx(self) -> bool:
+        return httpx is not None
+
+    def _http_client(self):
+        # Créé à la première utilisation, donc dans la boucle du moteur.
+        if self._http is None:
+            limits = httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+            transport = httpx.AsyncHTTPTransport(retries=MAX_RETRIES, limits=limits)
+            self._http = httpx.AsyncClient(base_url=self.base_url, transport=transport)
+        return self._http
+
+    async def _post(self, payload: Dict[str, Any], timeout_key: str, stream: bool = False):
+        """POST sur `/api/chat`, répété avec backoff tant qu'Ollama répond 503 (modèle en cours de chargement)"""
+        client = self._http_client()
+        for attempt in range(MAX_RETRIES + 1):
+            request = client.build_request('POST', '/api/chat', json=payload, timeout=self._timeout(timeout_key))
+            response = await client.send(request, stream=stream)
+            if response.status_code != 503 or attempt == MAX_RETRIES:
+                return response
+            await response.aclose()
+            await asyncio.sleep(BACKOFF_FACTOR * 2 ** attempt)
+
+    def _timeout(self, key: str):
+        connect, read = self.timeouts[key]
+        return httpx.Timeout(read, connect=connect)
+
+    def _payload(self, model: str, messages: List[Dict[str, str]], stream: bool,
+                 options: Optional[Dict[str, Any]], extra: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {"model": model, "messages": messages, "stream": stream, **extra}
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None and 'keep_alive' not in payload:
+            payload['keep_alive'] = self.keep_alive
+        return payload
+
+    async def chat(self, model: str, messages: List[Dict[str, str]],
+                   options: Optional[Dict[str, Any]] = None, **extra: Any) -> str:
+        """Appel non streamé de `/api/chat`, retourne le contenu du message"""
+        if httpx is None:
+            # Via le flux, pour que l'annulation de la tâche interrompe aussi la génération.
+            parts = [part async for part in self.stream_chat(model, messages, options, **extra)]
+            return "".join(parts)
+        response = await self._post(self._payload(model, messages, False, options, extra), 'chat')
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise OllamaError(data['error'])
+        return data['message']['content']
+
+    async def stream_chat(self, model: str, messages: List[Dict[str, str]],
+                          options: Optional[Dict[str, Any]] = None, **extra: Any) -> AsyncIterator[str]:
+        """Appel streamé de `/api/chat` ; annuler la tâche consommatrice ferme la connexion"""
+        if httpx is None:
+            async for part in self._stream_via_thread(model, messages, options, extra):
+                yield part
+            return
+        payload = self._payload(model, messages, True, options, extra)
+        response = await self._post(payload, 'chat_stream', stream=True)
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if 'error' in chunk:
+                    raise OllamaError(chunk['error'])
+                content_part = chunk.get('message', {}).get('content', '')
+                if content_part:
+                    yield content_part
+        finally:
+            await response.aclose()
+
+    async def _stream_via_thread(self, model, messages, options, extra) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        parts: asyncio.Queue = asyncio.Queue()
+        scope = _ResponseScope()
+        sync_client = get_client()
+
+        def pump():
+            try:
+                for part in sync_client.stream_chat(model, messages, options=options, cancel_scope=scope, **extra):
+                    loop.call_soon_threadsafe(parts.put_nowait, part)
+                loop.call_soon_threadsafe(parts.put_nowait, _STREAM_DONE)
+            except BaseException as e:
+                loop.call_soon_threadsafe(parts.put_nowait, e)
+
+        loop.run_in_executor(None, pump)
+        try:
+            while True:
+                item = await parts.get()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            scope.close()
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
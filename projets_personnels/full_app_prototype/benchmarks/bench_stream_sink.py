@@ -0,0 +1,94 @@
+"""
+Mesure du débit de tokens à travers le pont Python -> webview.
+
+Un flux de tokens factice est envoyé à un faux `evaluate_js` qui reproduit le
+coût d'un appel réel (échappement JSON + aller-retour synchrone simulé), une
+première fois token par token, puis à travers un `StreamSink`.
+
+Usage :
+    python benchmarks/bench_stream_sink.py --tokens 5000 --bridge-latency-ms 2
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_sink import StreamSink, FLUSH_INTERVAL, FLUSH_MAX_CHARS
+
+
+class FakeWindow:
+    """Imite `window.evaluate_js` : échappement JSON puis latence bloquante fixe"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.received_chars = 0
+
+    def evaluate_js(self, script):
+        self.calls += 1
+        self.received_chars += len(script)
+        deadline = time.perf_counter() + self.latency
+        while time.perf_counter() < deadline:
+            pass
+
+
+def fake_token_stream(count, tokens_per_second):
+    """Produit des tokens courts, éventuellement au rythme d'un modèle réel"""
+    words = ["Le", " modèle", " génère", " une", " réponse", " token", " par", " token", ",", " \"vite\"", ".\n"]
+    delay = 1.0 / tokens_per_second if tokens_per_second else 0.0
+    for i in range(count):
+        if delay:
+            time.sleep(delay)
+        yield words[i % len(words)]
+
+
+def run_direct(window, tokens, tokens_per_second):
+    start = time.perf_counter()
+    for token in fake_token_stream(tokens, tokens_per_second):
+        window.evaluate_js(f"window.api.appendToResponse({json.dumps(token)})")
+    return time.perf_counter() - start
+
+
+def run_coalesced(window, tokens, tokens_per_second, interval, max_chars):
+    start = time.perf_counter()
+    emit = lambda text: window.evaluate_js(f"window.api.appendToResponse({json.dumps(text)})")
+    with StreamSink(emit, interval=interval, max_chars=max_chars) as sink:
+        for token in fake_token_stream(tokens, tokens_per_second):
+            sink.write(token)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=5000)
+    parser.add_argument('--bridge-latency-ms', type=float, default=2.0,
+                        help="Coût simulé d'un appel evaluate_js (ms)")
+    parser.add_argument('--tokens-per-second', type=float, default=0,
+                        help="Rythme de production du modèle factice (0 = aussi vite que possible)")
+    parser.add_argument('--interval-ms', type=float, default=FLUSH_INTERVAL * 1000)
+    parser.add_argument('--max-chars', type=int, default=FLUSH_MAX_CHARS)
+    args = parser.parse_args()
+
+    latency = args.bridge_latency_ms / 1000
+
+    direct_window = FakeWindow(latency)
+    direct_time = run_direct(direct_window, args.tokens, args.tokens_per_second)
+
+    coalesced_window = FakeWindow(latency)
+    coalesced_time = run_coalesced(coalesced_window, args.tokens, args.tokens_per_second,
+                                   args.interval_ms / 1000, args.max_chars)
+
+    print(f"{args.tokens} tokens, latence du pont simulée : {args.bridge_latency_ms} ms")
+    print(f"{'mode':<12}{'durée (s)':>12}{'tokens/s':>12}{'appels JS':>12}")
+    for name, elapsed, window in (("direct", direct_time, direct_window),
+                                  ("regroupé", coalesced_time, coalesced_window)):
+        print(f"{name:<12}{elapsed:>12.3f}{args.tokens / elapsed:>12.0f}{window.calls:>12}")
+    print(f"Accélération : x{direct_time / coalesced_time:.1f}")
+
+
+if __name__ == '__main__':
+    main()
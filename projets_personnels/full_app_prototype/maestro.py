@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import time
@@ -7,10 +8,20 @@ import re
 import traceback
 import requests
 from node_registry import NODE_REGISTRY
+from plan_schema import workflow_json_schema
+from run_manager import RunCancelled
+from async_engine import get_ui_bridge
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MAESTRO_DIR = os.path.join(BASE_DIR, 'workflows', 'maestro_generated')
 
+# Nombre de plans générés en parallèle à chaque tentative ; le premier valide l'emporte.
+PLAN_CANDIDATES = 1
+# Température de chaque candidat (None : réglage par défaut du modèle).
+PLAN_CANDIDATE_TEMPERATURES = (None, 0.3, 0.7, 1.0)
+# Contraint la génération au schéma JSON des workflows (paramètre `format` d'Ollama).
+PLAN_CONSTRAINED_DECODING = True
+
 def load_system_prompt():
     """Charge le system prompt depuis un fichier externe avec documentation dynamique."""
     prompt_file = os.path.join(BASE_DIR, 'maestro_system_prompt.txt')
@@ -217,13 +228,77 @@ def try_parse_json(json_str):
     
     return None
 
-def create_and_run_workflow(api_instance, user_prompt, global_model, complexity):
+async def _generate_plan_candidate(api_instance, history, global_model, temperature=None):
+    """Génère, corrige et valide un plan ; renvoie (workflow ou None, erreurs de validation, réponse brute)"""
+    options = {'temperature': temperature} if temperature is not None else None
+    extra = {'format': workflow_json_schema()} if PLAN_CONSTRAINED_DECODING else {}
+    raw_response = await api_instance._ollama_worker_async(history, global_model, options=options, **extra)
+    try:
+        # Avec le décodage contraint, la réponse est directement un JSON valide.
+        workflow_data = json.loads(raw_response)
+    except json.JSONDecodeError:
+        workflow_data = None
+    if isinstance(workflow_data, dict):
+        return _finalize_plan_candidate(workflow_data, raw_response)
+
+    print("Réponse hors schéma, extraction du JSON depuis le texte.")
+    json_string = extract_json_from_response(raw_response)
+    if not json_string:
+        return None, None, raw_response
+    try:
+        workflow_data = json.loads(json_string)
+    except json.JSONDecodeError as e:
+        print(f"Plan candidat illisible (température {temperature}) : {e}")
+        return None, None, raw_response
+    return _finalize_plan_candidate(workflow_data, raw_response)
+
+
+def _finalize_plan_candidate(workflow_data, raw_response):
+    workflow_data = auto_correct_and_ensure_links(workflow_data)
+    workflow_data = enhance_workflow_with_registry_data(workflow_data)
+    return workflow_data, validate_generated_workflow(workflow_data), raw_response
+
+
+async def generate_plan(api_instance, history, global_model, candidates=PLAN_CANDIDATES):
+    """
+    Lance `candidates` générations concurrentes du plan, à des températures différentes.
+    Le premier plan sans erreur de validation l'emporte et les autres générations sont
+    annulées ; à défaut, le premier plan lisible est retenu.
+    """
+    if candidates <= 1:
+        return await _generate_plan_candidate(api_instance, history, global_model)
+
+    temperatures = [PLAN_CANDIDATE_TEMPERATURES[i % len(PLAN_CANDIDATE_TEMPERATURES)] for i in range(candidates)]
+    pending = {
+        asyncio.ensure_future(_generate_plan_candidate(api_instance, history, global_model, temperature))
+        for temperature in temperatures
+    }
+    fallback = (None, None, "")
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                workflow_data, validation_errors, raw_response = task.result()
+                if workflow_data is not None and not validation_errors:
+                    return workflow_data, validation_errors, raw_response
+                if fallback[0] is None:
+                    fallback = (workflow_data, validation_errors, raw_response)
+        return fallback
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def create_and_run_workflow(api_instance, user_prompt, global_model, complexity, run=None,
+                                  candidates=PLAN_CANDIDATES):
     """
     Fonction principale de Maestro : génère, sauvegarde et exécute un workflow.
     """
-    window = webview.windows[0]
+    ui = get_ui_bridge(webview.windows[0])
     try:
-        window.evaluate_js("window.maestro_api.updateStatus('<i>Composition du workflow en cours...</i>')")
+        ui.call("window.maestro_api.updateStatus('<i>Composition du workflow en cours...</i>')")
         system_prompt = load_system_prompt()
         
         complexity_instruction = ""
@@ -240,22 +315,15 @@ def create_and_run_workflow(api_instance, user_prompt, global_model, complexity)
             {'role': 'user', 'content': final_user_prompt}
         ]
         
-        raw_response = api_instance._ollama_worker_blocking(history, global_model)
+        workflow_data, validation_errors, raw_response = await generate_plan(api_instance, history, global_model, candidates)
         
-        window.evaluate_js("window.maestro_api.updateStatus('<i>Validation et réparation du workflow...</i>')")
-        json_string = extract_json_from_response(raw_response)
+        ui.call("window.maestro_api.updateStatus('<i>Validation et réparation du workflow...</i>')")
         
-        if not json_string:
+        if workflow_data is None:
             error_msg = "Maestro n'a pas pu générer un JSON de workflow valide. Réponse reçue :\n\n" + raw_response
-            window.evaluate_js(f"window.maestro_api.displayError({escape_js_string(error_msg)})")
+            ui.call(f"window.maestro_api.displayError({escape_js_string(error_msg)})")
             return
 
-        workflow_data = json.loads(json_string)
-        
-        workflow_data = auto_correct_and_ensure_links(workflow_data)
-        
-        workflow_data = enhance_workflow_with_registry_data(workflow_data)
-        validation_errors = validate_generated_workflow(workflow_data)
         if validation_errors:
             print(f"AVERTISSEMENT MAESTRO: Workflow généré avec des erreurs de validation: {validation_errors}")
 
@@ -265,10 +333,17 @@ def create_and_run_workflow(api_instance, user_prompt, global_model, complexity)
         
         api_instance.save_workflow(filename, workflow_data)
         
-        window.evaluate_js("window.maestro_api.updateStatus('<i>Exécution du workflow composé...</i>')")
-        api_instance._run_workflow_stream_worker(filename, user_prompt, global_model)
+        ui.call("window.maestro_api.updateStatus('<i>Exécution du workflow composé...</i>')")
+
+    except (RunCancelled, asyncio.CancelledError):
+        ui.call("window.maestro_api.displayCancelled()")
+        raise
 
     except Exception as e:
         error_message = f"Une erreur critique est survenue dans Maestro : {e}"
         print(traceback.format_exc())
-        window.evaluate_js(f"window.maestro_api.displayError({escape_js_string(error_message)})")
\ No newline at end of file
+        ui.call(f"window.maestro_api.displayError({escape_js_string(error_message)})")
+        return
+
+    # Hors du bloc try : l'exécution signale elle-même ses erreurs et son annulation.
+    await api_instance._run_workflow_async(filename, user_prompt, global_model, run=run)
@@ -0,0 +1,214 @@
+"""
+Contraintes de décodage pour la génération des plans Maestro.
+
+Le schéma JSON d'un workflow est dérivé du registre des nœuds : chaque nœud
+est l'un des types enregistrés, avec ses propriétés, et chaque lien est un
+tableau `[id, source, slot, cible, slot, "string"]`. Il est envoyé à Ollama
+via le paramètre `format`, si bien que le modèle ne peut produire qu'un JSON
+structurellement valide.
+
+`workflow_gbnf_grammar` traduit ce même schéma en grammaire GBNF, dans le
+format de `GBNF_grammar_prompting`, pour les backends llama.cpp qui acceptent
+une grammaire plutôt qu'un schéma :
+
+    python plan_schema.py > maestro_workflow.gbnf
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from node_registry import NODE_REGISTRY, NodeDefinition, NodeRegistry
+
+_PROPERTY_TYPES = {
+    "string": {"type": "string"},
+    "int": {"type": "integer"},
+    "float": {"type": "number"},
+    "bool": {"type": "boolean"},
+}
+
+_POINT = {"type": "array", "prefixItems": [{"type": "number"}, {"type": "number"}], "minItems": 2, "maxItems": 2}
+
+_LINK = {
+    "type": "array",
+    "prefixItems": [
+        {"type": "integer"}, {"type": "integer"}, {"type": "integer"},
+        {"type": "integer"}, {"type": "integer"}, {"const": "string"},
+    ],
+    "minItems": 6,
+    "maxItems": 6,
+}
+
+
+def _slot_schema(slot_names: List[str], link_key: str, link_schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "name": {"enum": slot_names},
+            "type": {"const": "string"},
+            link_key: link_schema,
+        },
+        "required": ["name", "type"],
+    }
+
+
+def _node_schema(node_def: NodeDefinition) -> Dict[str, Any]:
+    properties = {
+        prop.name: dict(_PROPERTY_TYPES.get(prop.type, {"type": "string"}))
+        for prop in node_def.properties
+    }
+    schema = {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "type": {"const": node_def.node_type},
+            "title": {"type": "string"},
+            "pos": _POINT,
+            "properties": {
+                "type": "object",
+                "properties": properties,
+                # Toutes exigées : le modèle doit expliciter la configuration de chaque nœud.
+                "required": [prop.name for prop in node_def.properties],
+            },
+        },
+        "required": ["id", "type", "title", "pos", "properties"],
+    }
+    if node_def.inputs:
+        schema["properties"]["inputs"] = {
+            "type": "array",
+            "items": _slot_schema([slot.name for slot in node_def.inputs], "link",
+                                  {"type": ["integer", "null"]}),
+            "maxItems": len(node_def.inputs),
+        }
+        schema["required"].append("inputs")
+    if node_def.outputs:
+        schema["properties"]["outputs"] = {
+            "type": "array",
+            "items": _slot_schema([slot.name for slot in node_def.outputs], "links",
+                                  {"type": "array", "items": {"type": "integer"}}),
+            "minItems": len(node_def.outputs),
+            "maxItems": len(node_def.outputs),
+        }
+        schema["required"].append("outputs")
+    return schema
+
+
+def workflow_json_schema(registry: NodeRegistry = NODE_REGISTRY) -> Dict[str, Any]:
+    """Schéma JSON d'un workflow généré par Maestro, pour le paramètre `format` d'Ollama"""
+    return {
+        "type": "object",
+        "properties": {
+            "last_node_id": {"type": "integer"},
+            "last_link_id": {"type": "integer"},
+            "nodes": {
+                "type": "array",
+                "items": {"anyOf": [_node_schema(node_def) for node_def in registry.get_all_nodes().values()]},
+                "minItems": 1,
+            },
+            "links": {"type": "array", "items": _LINK},
+        },
+        "required": ["last_node_id", "last_link_id", "nodes", "links"],
+    }
+
+
+_GBNF_PRIMITIVES = {
+    "ws": '[ \\t\\n]*',
+    "string": '"\\"" ( [^"\\\\\\x00-\\x1f] | "\\\\" ["\\\\/bfnrt] | "\\\\u" [0-9a-fA-F]{4} )* "\\"" ws',
+    "integer": '"-"? ( "0" | [1-9] [0-9]* ) ws',
+    "number": '"-"? ( "0" | [1-9] [0-9]* ) ( "." [0-9]+ )? ( [eE] [-+]? [0-9]+ )? ws',
+    "boolean": '( "true" | "false" ) ws',
+    "null": '"null" ws',
+}
+
+
+class _GbnfBuilder:
+    """Traduit le sous-ensemble de JSON Schema utilisé ci-dessus en règles GBNF"""
+
+    def __init__(self):
+        self.rules: Dict[str, str] = {}
+
+    def add(self, name: str, body: str) -> str:
+        name = re.sub(r'[^a-zA-Z0-9-]+', '-', name).strip('-')
+        candidate, suffix = name, 1
+        while candidate in self.rules and self.rules[candidate] != body:
+            suffix += 1
+            candidate = f"{name}-{suffix}"
+        self.rules[candidate] = body
+        return candidate
+
+    @staticmethod
+    def literal(value: Any) -> str:
+        return json.dumps(json.dumps(value, ensure_ascii=False), ensure_ascii=False) + " ws"
+
+    def visit(self, schema: Dict[str, Any], name: str) -> str:
+        if "const" in schema:
+            return self.add(name, self.literal(schema["const"]))
+        if "enum" in schema:
+            return self.add(name, "( " + " | ".join(self.literal(v) for v in schema["enum"]) + " )")
+        if "anyOf" in schema:
+            alternatives = [self.visit(sub, f"{name}-{i}") for i, sub in enumerate(schema["anyOf"])]
+            return self.add(name, " | ".join(alternatives))
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            return self.add(name, " | ".join(self.visit({"type": t}, f"{name}-{t}") for t in schema_type))
+        if schema_type == "object":
+            return self._object(schema, name)
+        if schema_type == "array":
+            return self._array(schema, name)
+        return schema_type
+
+    def _object(self, schema: Dict[str, Any], name: str) -> str:
+        properties = schema.get("properties", {})
+        required = [key for key in properties if key in schema.get("required", [])]
+        optional = [key for key in properties if key not in required]
+        members = [self._member(properties, key, name) for key in required]
+        extras = [self._member(properties, key, name) for key in optional]
+        body = ' "," ws '.join(members)
+        if members:
+            body += ''.join(f' ( "," ws {extra} )?' for extra in extras)
+        elif extras:
+            # Sous-ensemble ordonné des propriétés optionnelles, séparées par des virgules.
+            alternatives = [extra + ''.join(f' ( "," ws {rest} )?' for rest in extras[i + 1:])
+                            for i, extra in enumerate(extras)]
+            body = '( ' + ' | '.join(alternatives) + ' )?'
+        return self.add(name, ' '.join(part for part in ('"{" ws', body, '"}" ws') if part))
+
+    def _member(self, properties: Dict[str, Any], key: str, name: str) -> str:
+        return f'{self.literal(key)} ":" ws {self.visit(properties[key], f"{name}-{key}")}'
+
+    def _array(self, schema: Dict[str, Any], name: str) -> str:
+        if "prefixItems" in schema:
+            items = [self.visit(sub, f"{name}-{i}") for i, sub in enumerate(schema["prefixItems"])]
+            return self.add(name, '"[" ws ' + ' "," ws '.join(items) + ' "]" ws')
+        item = self.visit(schema.get("items", {"type": "string"}), f"{name}-item")
+        min_items = schema.get("minItems", 0)
+        max_items: Optional[int] = schema.get("maxItems")
+        if max_items is not None:
+            # Éléments obligatoires, puis éléments optionnels imbriqués jusqu'à `maxItems`.
+            optional = ''
+            for index in range(max_items - 1, min_items - 1, -1):
+                separator = '"," ws ' if index else ''
+                optional = f'( {separator}{item}{" " + optional if optional else ""} )?'
+            body = ' '.join(part for part in (' "," ws '.join([item] * min_items), optional) if part)
+            return self.add(name, f'"[" ws {body} "]" ws')
+        repeated = f'( "," ws {item} )*'
+        if min_items:
+            body = ' "," ws '.join([item] * min_items) + f' {repeated}'
+        else:
+            body = f'( {item} {repeated} )?'
+        return self.add(name, f'"[" ws {body} "]" ws')
+
+
+def workflow_gbnf_grammar(registry: NodeRegistry = NODE_REGISTRY) -> str:
+    """Grammaire GBNF équivalente à `workflow_json_schema`"""
+    builder = _GbnfBuilder()
+    root = builder.visit(workflow_json_schema(registry), "workflow")
+    lines = [f"root ::= ws {root}", ""]
+    lines += [f"{name} ::= {body}" for name, body in builder.rules.items()]
+    lines += ["", "# Primitives JSON"]
+    lines += [f"{name} ::= {body}" for name, body in _GBNF_PRIMITIVES.items()]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    print(workflow_gbnf_grammar(), end='')
@@ -0,0 +1,116 @@
+"""
+Cache persistant des résultats de nœuds LLM, adressé par le contenu.
+
+La clé est une empreinte SHA-256 du type de nœud, du modèle résolu, du prompt
+entièrement rendu et des options de génération : tant qu'aucun de ces
+éléments ne change, le résultat stocké est renvoyé sans appeler Ollama.
+Les entrées sont conservées dans une base SQLite, avec éviction par âge
+(`max_age`) puis par taille totale (`max_bytes`, les moins récemment lues
+d'abord).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+NODE_CACHE_ENABLED = True
+NODE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+NODE_CACHE_MAX_AGE = 30 * 24 * 3600
+
+
+class NodeResultCache:
+    """Cache clé -> texte stocké dans SQLite"""
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'node_results.db'),
+                 max_bytes: int = NODE_CACHE_MAX_BYTES, max_age: float = NODE_CACHE_MAX_AGE,
+                 enabled: bool = NODE_CACHE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed_at)")
+            self._conn.commit()
+            self.evict()
+
+    @staticmethod
+    def make_key(node_type: str, model: Optional[str], prompt: str,
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """Empreinte du calcul d'un nœud"""
+        material = json.dumps(
+            {"type": node_type, "model": model, "prompt": prompt, "options": options or {}},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.max_age:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def put(self, key: str, value: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Supprime les entrées expirées puis les moins récemment lues au-delà de `max_bytes`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.max_age,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale_keys = []
+                for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY accessed_at ASC"):
+                    stale_keys.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany("DELETE FROM results WHERE key = ?", stale_keys)
+                print(f"Cache des nœuds : {len(stale_keys)} entrée(s) évincée(s) ({freed} octets).")
+            self._conn.commit()
@@ -0,0 +1,85 @@
+"""
+Mémoire de la dernière exécution de chaque workflow, pour la réexécution incrémentale.
+
+Chaque nœud reçoit une empreinte calculée à partir de son type, de ses
+propriétés, du modèle résolu et des empreintes de ses entrées amont (à la
+manière d'un arbre de Merkle). Quand le même workflow est relancé, un nœud
+dont l'empreinte n'a pas changé reprend ses sorties précédentes : modifier un
+nœud change son empreinte et celles de toute sa descendance, qui sont donc
+les seules à être réexécutées.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+MAX_REMEMBERED_WORKFLOWS = 32
+
+NodeOutputs = Dict[Any, Any]
+
+
+def compute_fingerprints(order: Iterable[str], nodes: Dict[str, dict],
+                         node_inputs_map: Dict[str, Dict[Any, Tuple[str, Any]]],
+                         model_of: Callable[[str], Optional[str]]) -> Dict[str, Optional[str]]:
+    """Empreinte de chaque nœud, `None` si l'une de ses entrées n'a pas pu être calculée"""
+    fingerprints: Dict[str, Optional[str]] = {}
+    for node_id in order:
+        node = nodes[node_id]
+        upstream = []
+        for target_slot, (origin_id, origin_slot) in sorted(node_inputs_map.get(node_id, {}).items(), key=lambda item: str(item[0])):
+            origin_fingerprint = fingerprints.get(origin_id)
+            if origin_fingerprint is None:
+                upstream = None
+                break
+            upstream.append([str(target_slot), origin_fingerprint, str(origin_slot)])
+        if upstream is None:
+            fingerprints[node_id] = None
+            continue
+        material = json.dumps(
+            {"type": node.get('type'), "properties": node.get('properties', {}),
+             "model": model_of(node_id), "inputs": upstream},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        fingerprints[node_id] = hashlib.sha256(material.encode('utf-8')).hexdigest()
+    return fingerprints
+
+
+class WorkflowRunMemory:
+    """Sorties et empreintes des nœuds de la dernière exécution, par workflow"""
+
+    def __init__(self, max_workflows: int = MAX_REMEMBERED_WORKFLOWS):
+        self.max_workflows = max_workflows
+        self._runs: "OrderedDict[str, Dict[str, Tuple[str, NodeOutputs]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprints: Dict[str, Optional[str]]) -> int:
+        """Oublie les nœuds disparus du workflow ; renvoie le nombre de nœuds réutilisables"""
+        with self._lock:
+            previous = self._runs.pop(key, {})
+            kept = {node_id: entry for node_id, entry in previous.items() if node_id in fingerprints}
+            self._runs[key] = kept
+            while len(self._runs) > self.max_workflows:
+                self._runs.popitem(last=False)
+            return sum(1 for node_id, (fingerprint, _) in kept.items()
+                       if fingerprint == fingerprints[node_id])
+
+    def lookup(self, key: str, node_id: str, fingerprint: Optional[str]) -> Optional[NodeOutputs]:
+        if fingerprint is None:
+            return None
+        with self._lock:
+            entry = self._runs.get(key, {}).get(node_id)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            return dict(entry[1])
+
+    def record(self, key: str, node_id: str, fingerprint: Optional[str], outputs: NodeOutputs):
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._runs.setdefault(key, {})[node_id] = (fingerprint, dict(outputs))
+
+    def forget(self, key: str):
+        with self._lock:
+            self._runs.pop(key, None)
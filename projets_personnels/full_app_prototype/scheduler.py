@@ -0,0 +1,210 @@
+"""
+Ordonnanceur parallèle des workflows.
+
+Chaque nœud dont toutes les entrées sont disponibles est immédiatement confié à
+un pool de threads borné : les branches indépendantes d'un plan Maestro
+s'exécutent donc en même temps et la durée totale tend vers celle du chemin
+critique plutôt que vers la somme des latences des agents.
+
+Un sémaphore par modèle limite le nombre d'appels simultanés adressés à un même
+modèle, afin de ne pas dépasser ce que le serveur Ollama peut réellement servir
+(voir la variable d'environnement OLLAMA_NUM_PARALLEL côté serveur).
+
+`AsyncWorkflowScheduler` applique la même stratégie sur la boucle asyncio du
+moteur (`async_engine`) : les nœuds sont des tâches et non des threads.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+MAX_PARALLEL_NODES = int(os.environ.get('MAESTRO_MAX_PARALLEL_NODES', 8))
+DEFAULT_MODEL_CONCURRENCY = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4))
+
+# Limites spécifiques par modèle, prioritaires sur DEFAULT_MODEL_CONCURRENCY.
+# Exemple : {"qwen3:30b": 1, "llama3.2:3b": 4}
+MODEL_CONCURRENCY: Dict[str, int] = {}
+
+NodeOutputs = Dict[str, Dict[int, Any]]
+ExecuteFn = Callable[[str, NodeOutputs], Dict[int, Any]]
+AsyncExecuteFn = Callable[[str, NodeOutputs], Awaitable[Dict[int, Any]]]
+
+
+class WorkflowScheduler:
+    """Exécute un DAG de nœuds en dispatchant les nœuds prêts sur un pool borné"""
+
+    def __init__(self, max_workers: int = MAX_PARALLEL_NODES,
+                 model_concurrency: Optional[Dict[str, int]] = None,
+                 default_model_concurrency: int = DEFAULT_MODEL_CONCURRENCY):
+        self.max_workers = max(1, max_workers)
+        self.model_concurrency = dict(MODEL_CONCURRENCY if model_concurrency is None else model_concurrency)
+        self.default_model_concurrency = max(1, default_model_concurrency)
+        self._model_semaphores: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore_for(self, model: str) -> threading.Semaphore:
+        with self._lock:
+            semaphore = self._model_semaphores.get(model)
+            if semaphore is None:
+                limit = max(1, self.model_concurrency.get(model, self.default_model_concurrency))
+                semaphore = threading.Semaphore(limit)
+                self._model_semaphores[model] = semaphore
+            return semaphore
+
+    def _run_node(self, node_id: str, execute_fn: ExecuteFn, node_outputs: NodeOutputs,
+                  model: Optional[str]) -> Dict[int, Any]:
+        if not model:
+            return execute_fn(node_id, node_outputs)
+        with self._semaphore_for(model):
+            return execute_fn(node_id, node_outputs)
+
+    def run(self, node_ids: List[str], adj: Dict[str, List[str]],
+            execute_fn: ExecuteFn,
+            model_of: Optional[Callable[[str], Optional[str]]] = None) -> NodeOutputs:
+        """
+        Exécute tous les nœuds en respectant les dépendances décrites par `adj`.
+
+        `execute_fn(node_id, node_outputs)` est appelé dans un thread du pool et
+        doit retourner les sorties du nœud ; `node_outputs` contient déjà les
+        sorties de tous ses prédécesseurs et n'est modifié que par le thread
+        appelant, lorsqu'un nœud se termine.
+        `model_of(node_id)` renvoie le modèle utilisé par le nœud (ou None) pour
+        appliquer la limite de concurrence par modèle.
+        La première exception levée par un nœud interrompt le workflow.
+        """
+        in_degree = {node_id: 0 for node_id in node_ids}
+        for source_id in node_ids:
+            for target_id in adj.get(source_id, []):
+                if target_id in in_degree:
+                    in_degree[target_id] += 1
+
+        node_outputs: NodeOutputs = {}
+        pending = set(node_ids)
+        ready = [node_id for node_id in node_ids if in_degree[node_id] == 0]
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='workflow-node') as executor:
+            def dispatch(node_id):
+                pending.discard(node_id)
+                model = model_of(node_id) if model_of else None
+                future = executor.submit(self._run_node, node_id, execute_fn, node_outputs, model)
+                running[future] = node_id
+
+            try:
+                while pending or running:
+                    for node_id in ready:
+                        dispatch(node_id)
+                    ready = []
+
+                    if not running:
+                        # Nœuds encore bloqués par un cycle : on les exécute dans l'ordre d'origine.
+                        blocked = [node_id for node_id in node_ids if node_id in pending]
+                        logging.warning(f"Nœuds bloqués par des dépendances non résolues, exécution forcée : {blocked}")
+                        ready = blocked[:1]
+                        continue
+
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node_id = running.pop(future)
+                        node_outputs[node_id] = future.result()
+                        for target_id in adj.get(node_id, []):
+                            if target_id in in_degree:
+                                in_degree[target_id] -= 1
+                                if in_degree[target_id] == 0 and target_id in pending:
+                                    ready.append(target_id)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+        return node_outputs
+
+
+class AsyncWorkflowScheduler:
+    """Exécute un DAG de nœuds sous forme de tâches asyncio, bornées globalement et par modèle"""
+
+    def __init__(self, max_parallel: int = MAX_PARALLEL_NODES,
+                 model_concurrency: Optional[Dict[str, int]] = None,
+                 default_model_concurrency: int = DEFAULT_MODEL_CONCURRENCY):
+        self.max_parallel = max(1, max_parallel)
+        self.model_concurrency = dict(MODEL_CONCURRENCY if model_concurrency is None else model_concurrency)
+        self.default_model_concurrency = max(1, default_model_concurrency)
+        # Partagés par tous les workflows de la boucle : la limite par modèle vaut pour tout le processus.
+        self._model_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore_for(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._model_semaphores.get(model)
+        if semaphore is None:
+            limit = max(1, self.model_concurrency.get(model, self.default_model_concurrency))
+            semaphore = asyncio.Semaphore(limit)
+            self._model_semaphores[model] = semaphore
+        return semaphore
+
+    async def _run_node(self, node_id: str, execute_fn: AsyncExecuteFn, node_outputs: NodeOutputs,
+                        model: Optional[str], slots: asyncio.Semaphore) -> Dict[int, Any]:
+        async with slots:
+            if not model:
+                return await execute_fn(node_id, node_outputs)
+            async with self._semaphore_for(model):
+                return await execute_fn(node_id, node_outputs)
+
+    async def run(self, node_ids: List[str], adj: Dict[str, List[str]],
+                  execute_fn: AsyncExecuteFn,
+                  model_of: Optional[Callable[[str], Optional[str]]] = None) -> NodeOutputs:
+        """
+        Même contrat que `WorkflowScheduler.run`, avec une coroutine `execute_fn`.
+
+        Si le workflow échoue ou si la tâche appelante est annulée, les nœuds
+        en cours sont annulés (ce qui ferme leurs flux HTTP) avant que
+        l'exception ne soit propagée.
+        """
+        in_degree = {node_id: 0 for node_id in node_ids}
+        for source_id in node_ids:
+            for target_id in adj.get(source_id, []):
+                if target_id in in_degree:
+                    in_degree[target_id] += 1
+
+        node_outputs: NodeOutputs = {}
+        pending = set(node_ids)
+        ready = [node_id for node_id in node_ids if in_degree[node_id] == 0]
+        running: Dict[asyncio.Task, str] = {}
+        slots = asyncio.Semaphore(self.max_parallel)
+
+        def dispatch(node_id):
+            pending.discard(node_id)
+            model = model_of(node_id) if model_of else None
+            task = asyncio.create_task(self._run_node(node_id, execute_fn, node_outputs, model, slots),
+                                       name=f"workflow-node-{node_id}")
+            running[task] = node_id
+
+        try:
+            while pending or running:
+                for node_id in ready:
+                    dispatch(node_id)
+                ready = []
+
+                if not running:
+                    blocked = [node_id for node_id in node_ids if node_id in pending]
+                    logging.warning(f"Nœuds bloqués par des dépendances non résolues, exécution forcée : {blocked}")
+                    ready = blocked[:1]
+                    continue
+
+                done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    node_outputs[node_id] = task.result()
+                    for target_id in adj.get(node_id, []):
+                        if target_id in in_degree:
+                            in_degree[target_id] -= 1
+                            if in_degree[target_id] == 0 and target_id in pending:
+                                ready.append(target_id)
+        except BaseException:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+
+        return node_outputs
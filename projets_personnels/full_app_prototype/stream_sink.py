@@ -0,0 +1,112 @@
+"""
+Regroupement des fragments streamés avant leur envoi à la webview.
+
+Chaque appel à `window.evaluate_js` échappe le texte en JSON puis effectue un
+aller-retour synchrone avec le moteur du navigateur. Envoyer un appel par
+token fait de ce pont le goulot d'étranglement sur les modèles rapides : le
+`StreamSink` accumule les fragments et les transmet par trames, toutes les
+`interval` secondes ou dès que `max_chars` caractères sont en attente.
+
+Les trames sont envoyées par un seul thread par sink, démarré au premier
+fragment et arrêté à la fermeture. `emit` est appelé hors du verrou du
+tampon : un pont lent ne bloque pas le producteur, dont les fragments
+s'accumulent pour la trame suivante.
+"""
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+FLUSH_INTERVAL = 0.04
+FLUSH_MAX_CHARS = 512
+
+
+class StreamSink:
+    """Tampon de fragments transmis par trames à une fonction d'émission"""
+
+    def __init__(self, emit: Callable[[str], None], interval: float = FLUSH_INTERVAL,
+                 max_chars: int = FLUSH_MAX_CHARS):
+        self.emit = emit
+        self.interval = interval
+        self.max_chars = max_chars
+        self.frames_sent = 0
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Sérialise les envois : les trames partent dans l'ordre où elles sont retirées du tampon.
+        self._emit_lock = threading.Lock()
+
+    def write(self, chunk: str):
+        """Ajoute un fragment ; la trame part à la fin de l'intervalle ou dès que la taille est atteinte"""
+        if not chunk:
+            return
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            was_idle = not self._buffer
+            self._buffer.append(chunk)
+            self._buffered_chars += len(chunk)
+            if self._closed:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            elif was_idle or self._buffered_chars >= self.max_chars:
+                self._wakeup.notify()
+
+    def flush(self):
+        """Envoie immédiatement le contenu en attente"""
+        with self._emit_lock:
+            with self._lock:
+                self._last_flush = time.monotonic()
+                if not self._buffer:
+                    return
+                text = "".join(self._buffer)
+                self._buffer = []
+                self._buffered_chars = 0
+                self.frames_sent += 1
+            self.emit(text)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._wakeup.wait()
+                # Un fragment n'attend jamais plus d'un intervalle depuis la trame précédente.
+                while not self._closed and self._buffered_chars < self.max_chars:
+                    remaining = self._last_flush + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # Remontée au producteur par le prochain `write`.
+                with self._lock:
+                    self._error = e
+                return
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self._error is None:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Vidé aussi en cas d'erreur, pour que l'interface affiche le texte déjà reçu.
+        self.close()
+        return False
@@ -0,0 +1,185 @@
+"""
+Plan d'exécution précompilé d'un workflow LiteGraph.
+
+Le JSON brut d'un workflow est analysé une seule fois par version de fichier :
+liens assainis, niveaux topologiques, emplacements d'entrée indexés par des
+entiers et prompts découpés à l'avance autour des marqueurs `{{in_N}}`. Les
+exécuteurs travaillent directement sur le `CompiledWorkflow` obtenu, et le
+`WorkflowPlanCache` ne recompile un fichier que lorsque sa date de
+modification ou sa taille change.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+MAX_TEMPLATE_INPUTS = 4
+DEFAULT_PROMPT = '{{in_1}}'
+
+_PLACEHOLDER_RE = re.compile(r'\{\{in_(\d)\}\}')
+
+
+class PromptTemplate:
+    """Prompt découpé en segments littéraux et en numéros d'entrée"""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.parts: List[Union[str, int]] = []
+        pieces = _PLACEHOLDER_RE.split(template)
+        for index, piece in enumerate(pieces):
+            if index % 2 == 0:
+                if piece:
+                    self.parts.append(piece)
+            else:
+                slot = int(piece) - 1
+                # Les marqueurs hors de in_1..in_4 sont supprimés, comme auparavant.
+                if 0 <= slot < MAX_TEMPLATE_INPUTS:
+                    self.parts.append(slot)
+
+    def render(self, inputs: Dict[int, Any]) -> str:
+        return "".join(part if isinstance(part, str) else str(inputs.get(part, '')) for part in self.parts)
+
+
+class CompiledWorkflow:
+    """Structures d'exécution dérivées une fois pour toutes du JSON d'un workflow"""
+
+    def __init__(self, nodes: Dict[str, dict], links: List[list], adj: Dict[str, List[str]],
+                 levels: List[List[str]], execution_order: List[str],
+                 inputs: Dict[str, Dict[int, Tuple[str, int]]], templates: Dict[str, PromptTemplate]):
+        self.nodes = nodes
+        self.links = links
+        self.adj = adj
+        self.levels = levels
+        self.execution_order = execution_order
+        self.inputs = inputs
+        self.templates = templates
+
+    def nodes_for_input(self, initial_input: Optional[str]) -> Dict[str, dict]:
+        """Nœuds du plan, les entrées texte recevant `initial_input` sans modifier le plan"""
+        if initial_input is None:
+            return self.nodes
+        nodes = dict(self.nodes)
+        for node_id, node in self.nodes.items():
+            if node.get('type') == 'workflow/text_input':
+                nodes[node_id] = dict(node, properties=dict(node.get('properties', {}), value=initial_input))
+        return nodes
+
+    def gather_inputs(self, node_id: str, node_outputs: Dict[str, Dict[Any, Any]]) -> Dict[int, Any]:
+        input_values = {}
+        for target_slot, (origin_id, origin_slot) in self.inputs.get(node_id, {}).items():
+            if origin_id in node_outputs and origin_slot in node_outputs[origin_id]:
+                input_values[target_slot] = node_outputs[origin_id][origin_slot]
+        return input_values
+
+
+def _slot(value: Any) -> Any:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _topological_levels(nodes: Dict[str, dict], links: List[list]):
+    adj = {node_id: [] for node_id in nodes}
+    in_degree = {node_id: 0 for node_id in nodes}
+    for link in links:
+        source_id, target_id = str(link[1]), str(link[3])
+        adj[source_id].append(target_id)
+        in_degree[target_id] += 1
+
+    levels = []
+    current = [node_id for node_id in nodes if in_degree[node_id] == 0]
+    while current:
+        levels.append(current)
+        following = []
+        for u in current:
+            for v in adj[u]:
+                in_degree[v] -= 1
+                if in_degree[v] == 0:
+                    following.append(v)
+        current = following
+    return adj, levels
+
+
+def compile_workflow(workflow_data: dict, repair_cycles: bool = True) -> CompiledWorkflow:
+    nodes = {str(node['id']): node for node in workflow_data['nodes']}
+    links = workflow_data.get('links', [])
+
+    sanitized_links = []
+    for link in links:
+        if len(link) < 5:
+            print(f"Suppression du lien malformé : {link}")
+            continue
+        source_id = str(link[1])
+        target_id = str(link[3])
+        if source_id == target_id and not repair_cycles:
+            # Sans réparation, une boucle sur un nœud est un cycle comme un autre.
+            raise Exception("Le workflow contient un cycle ou des nœuds déconnectés.")
+        if source_id in nodes and target_id in nodes and source_id != target_id:
+            sanitized_links.append(link)
+        else:
+            print(f"Suppression du lien invalide (nœud inexistant ou auto-référencé) : {link}")
+    if len(sanitized_links) < len(links):
+        print(f"{len(links) - len(sanitized_links)} lien(s) invalide(s) ont été supprimés.")
+    links = sanitized_links
+
+    adj, levels = _topological_levels(nodes, links)
+    execution_order = [node_id for level in levels for node_id in level]
+
+    if len(execution_order) != len(nodes):
+        remaining_nodes = set(nodes) - set(execution_order)
+        if not repair_cycles:
+            raise Exception("Le workflow contient un cycle ou des nœuds déconnectés.")
+        print(f"Échec du tri topologique. {len(remaining_nodes)} nœud(s) non traité(s): {remaining_nodes}")
+        print("Cycles détectés dans le workflow. Tentative de réparation automatique...")
+        links = [link for link in links if str(link[3]) not in remaining_nodes]
+        adj, levels = _topological_levels(nodes, links)
+        execution_order = [node_id for level in levels for node_id in level]
+
+        if len(execution_order) != len(nodes):
+            isolated_nodes = [node_id for node_id in nodes if node_id not in set(execution_order)]
+            print(f"Ajout des nœuds isolés à la fin de l'ordre d'exécution: {isolated_nodes}")
+            levels.append(isolated_nodes)
+            execution_order.extend(isolated_nodes)
+
+    inputs = {node_id: {} for node_id in nodes}
+    for link in links:
+        source_id, source_slot, target_id, target_slot = str(link[1]), link[2], str(link[3]), link[4]
+        inputs[target_id][_slot(target_slot)] = (source_id, _slot(source_slot))
+
+    templates = {
+        node_id: PromptTemplate(node.get('properties', {}).get('prompt', DEFAULT_PROMPT))
+        for node_id, node in nodes.items()
+        if node.get('type') == 'workflow/llm_model'
+    }
+
+    return CompiledWorkflow(nodes, links, adj, levels, execution_order, inputs, templates)
+
+
+class WorkflowPlanCache:
+    """Plans compilés par chemin de fichier et mode de réparation, invalidés par date de modification et taille"""
+
+    def __init__(self):
+        self._plans: Dict[Tuple[str, bool], Tuple[Tuple[int, int], CompiledWorkflow]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filepath: str, repair_cycles: bool = True) -> CompiledWorkflow:
+        stat = os.stat(filepath)
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = (filepath, repair_cycles)
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        with open(filepath, 'r', encoding='utf-8') as f:
+            plan = compile_workflow(json.load(f), repair_cycles=repair_cycles)
+        with self._lock:
+            self._plans[key] = (version, plan)
+        return plan
+
+    def invalidate(self, filepath: str):
+        with self._lock:
+            for repair_cycles in (True, False):
+                self._plans.pop((filepath, repair_cycles), None)
@@ -1,13 +1,18 @@
 import webview
-import threading
+import asyncio
 import requests
 import json
 import os
-import time
 import maestro
-import re
-from collections import deque
 from node_registry import NODE_REGISTRY
+from scheduler import AsyncWorkflowScheduler
+from ollama_client import get_client
+from stream_sink import StreamSink
+from result_cache import NodeResultCache
+from run_memory import WorkflowRunMemory, compute_fingerprints
+from workflow_plan import DEFAULT_PROMPT, PromptTemplate, WorkflowPlanCache
+from run_manager import RunCancelled, RunManager
+from async_engine import AsyncOllamaClient, get_ui_bridge
 import logging 
 import sys 
 
@@ -27,6 +32,13 @@ os.makedirs(MAESTRO_DIR, exist_ok=True)
 class Api:
     def __init__(self):
         self.node_registry = NODE_REGISTRY
+        self.scheduler = AsyncWorkflowScheduler()
+        self.ollama = get_client()
+        self.async_ollama = AsyncOllamaClient()
+        self.result_cache = NodeResultCache()
+        self.run_memory = WorkflowRunMemory()
+        self.plan_cache = WorkflowPlanCache()
+        self.runs = RunManager()
     
     def get_node_options(self):
         return self.node_registry.generate_interface_options()
@@ -81,7 +93,57 @@ class Api:
     def get_maestro_node_documentation(self):
         return self.node_registry.generate_maestro_documentation()
 
-    def _execute_node(self, node, inputs, global_model):
+    def _node_model(self, node, global_model):
+        """Modèle effectivement interrogé par un nœud, ou None s'il n'appelle aucun LLM."""
+        node_type = node.get('type')
+        if node_type == 'workflow/llm_model':
+            model_in_node = node.get('properties', {}).get('model')
+            if model_in_node and model_in_node != "{{SELECTED_MODEL}}":
+                return model_in_node
+            return global_model
+        if node_type == 'workflow/iterative_llm':
+            return global_model
+        return None
+
+    def _render_prompt(self, props, inputs, template=None):
+        if template is None:
+            template = PromptTemplate(props.get('prompt', DEFAULT_PROMPT))
+        return template.render(inputs)
+
+    def _cached_llm_call(self, node_type, history, model, run=None):
+        """Appel bloquant à Ollama, servi par le cache de résultats lorsque c'est possible."""
+        cache_key = NodeResultCache.make_key(node_type, model, history[-1]['content'])
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached, True
+        try:
+            result = self.ollama.chat(model, history, cancel_scope=run)
+        except Exception as e:
+            if run is not None and run.cancelled:
+                raise RunCancelled(str(e)) from e
+            logging.error(f"Erreur lors de l'appel bloquant à Ollama : {e}")
+            return f"Erreur (bloquant): {e}", False
+        self.result_cache.put(cache_key, result)
+        return result, False
+
+    async def _cached_llm_call_async(self, node_type, history, model):
+        """Version coroutine de `_cached_llm_call`, pour le moteur asynchrone."""
+        cache_key = NodeResultCache.make_key(node_type, model, history[-1]['content'])
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached, True
+        try:
+            result = await self.async_ollama.chat(model, history)
+        except Exception as e:
+            logging.error(f"Erreur lors de l'appel à Ollama : {e}")
+            return f"Erreur (bloquant): {e}", False
+        self.result_cache.put(cache_key, result)
+        return result, False
+
+    def _has_error_output(self, outputs):
+        return any(str(value).startswith("Erreur (bloquant)") for value in outputs.values())
+
+    def _execute_node(self, node, inputs, global_model, template=None):
         node_type = node['type']
         props = node.get('properties', {})
         outputs = {}
@@ -94,36 +156,23 @@ class Api:
             outputs[0] = props.get('value', '')
         
         elif node_type == 'workflow/llm_model':
-            custom_prompt_template = props.get('prompt', '{{in_1}}')
-            final_prompt = custom_prompt_template
-
-            for i in range(4):
-                placeholder = f"{{{{in_{i+1}}}}}"
-                input_text = str(inputs.get(i, ''))
-                final_prompt = final_prompt.replace(placeholder, input_text)
-            
-            final_prompt = re.sub(r'\{\{in_\d\}\}', '', final_prompt)
-
-            model_in_node = props.get('model')
-            if model_in_node and model_in_node != "{{SELECTED_MODEL}}":
-                model_to_use = model_in_node
-            else:
-                model_to_use = global_model
+            final_prompt = self._render_prompt(props, inputs, template)
+            model_to_use = self._node_model(node, global_model)
 
             history = [{'role': 'user', 'content': final_prompt}]
-            outputs[0] = self._ollama_worker_blocking(history, model_to_use)
+            outputs[0], _ = self._cached_llm_call(node_type, history, model_to_use)
 
         elif node_type == 'workflow/iterative_llm':
             current_text = inputs.get(0, '')
             iterations = int(props.get('iterations', 1))
             for i in range(iterations):
                 history = [{'role': 'user', 'content': current_text}]
-                current_text = self._ollama_worker_blocking(history, global_model)
+                current_text, _ = self._cached_llm_call(node_type, history, global_model)
             outputs[0] = current_text
 
         return outputs
 
-    def _execute_node_stream(self, node, inputs, global_model, window, is_maestro_run):
+    async def _execute_node_async(self, node, inputs, global_model, ui, step_id=None, template=None, run=None):
         node_type = node['type']
         props = node.get('properties', {})
         outputs = {}
@@ -134,182 +183,112 @@ class Api:
         def escape_js(text):
             return json.dumps(str(text))
 
+        step_js = escape_js(step_id if step_id is not None else node.get('id', node_title))
+
         if node_type == 'workflow/text_input':
             outputs[0] = props.get('value', '')
         
         elif node_type == 'workflow/llm_model':
-            window.evaluate_js(f"window.maestro_api.showWorkflowStepResult({escape_js(node_title)}, '')")
-            
-            custom_prompt_template = props.get('prompt', '{{in_1}}')
-            final_prompt = custom_prompt_template
-
-            for i in range(4):
-                placeholder = f"{{{{in_{i+1}}}}}"
-                input_text = str(inputs.get(i, ''))
-                final_prompt = final_prompt.replace(placeholder, input_text)
-            
-            final_prompt = re.sub(r'\{\{in_\d\}\}', '', final_prompt)
+            ui.call(f"window.maestro_api.showWorkflowStepResult({step_js}, {escape_js(node_title)}, '')")
             
-            model_in_node = props.get('model')
-            
-            if model_in_node and model_in_node != "{{SELECTED_MODEL}}":
-                model_to_use = model_in_node
-            else:
-                model_to_use = global_model
+            final_prompt = self._render_prompt(props, inputs, template)
+            model_to_use = self._node_model(node, global_model)
+
+            cache_key = NodeResultCache.make_key(node_type, model_to_use, final_prompt)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logging.info(f"Nœud '{node_title}' servi depuis le cache.")
+                ui.call(f"window.maestro_api.finalizeAgentStep({step_js}, {escape_js(node_title)}, {escape_js(cached)}, 'cache')")
+                outputs[0] = cached
+                return outputs
             
             logging.info(f"Appel LLM pour le nœud '{node_title}' avec le modèle '{model_to_use}'.")
             logging.debug(f"--- PROMPT COMPLET ---\n{final_prompt}\n--------------------")
 
             full_response_text = ""
-            url = "http://localhost:11434/api/chat"
             history = [{'role': 'user', 'content': final_prompt}]
-            payload = {"model": model_to_use, "messages": history, "stream": True}
-
-            with requests.post(url, json=payload, stream=True) as response:
-                response.raise_for_status()
-                for line in response.iter_lines():
-                    if line:
-                        chunk = json.loads(line.decode('utf-8'))
-                        content_part = chunk['message']['content']
-                        full_response_text += content_part
-                        window.evaluate_js(f"window.maestro_api.appendToWorkflowResponse({escape_js(content_part)})")
-            
-            window.evaluate_js(f"window.maestro_api.finalizeAgentStep({escape_js(node_title)}, {escape_js(full_response_text)})")
+
+            def emit(text):
+                ui.call(f"window.maestro_api.appendToWorkflowResponse({escape_js(text)}, {step_js})")
+
+            with StreamSink(emit) as sink:
+                async for content_part in self.async_ollama.stream_chat(model_to_use, history):
+                    full_response_text += content_part
+                    sink.write(content_part)
+
+            self.result_cache.put(cache_key, full_response_text)
+            ui.call(f"window.maestro_api.finalizeAgentStep({step_js}, {escape_js(node_title)}, {escape_js(full_response_text)})")
             outputs[0] = full_response_text
 
         elif node_type == 'workflow/iterative_llm':
-            window.evaluate_js(f"window.maestro_api.showWorkflowStepResult({escape_js(node_title)}, '')")
+            ui.call(f"window.maestro_api.showWorkflowStepResult({step_js}, {escape_js(node_title)}, '')")
             
             current_text = inputs.get(0, '')
             iterations = int(props.get('iterations', 1))
+            all_cached = True
             for i in range(iterations):
+                if run is not None:
+                    await run.acheckpoint()
                 logging.info(f"Nœud '{node_title}', itération {i+1}/{iterations}")
                 history = [{'role': 'user', 'content': current_text}]
-                current_text = self._ollama_worker_blocking(history, global_model)
+                current_text, from_cache = await self._cached_llm_call_async(node_type, history, global_model)
+                all_cached = all_cached and from_cache
                 step_text = f"--- Itération {i+1}/{iterations} ---\n{current_text}"
-                window.evaluate_js(f"window.maestro_api.appendToWorkflowResponse({escape_js(step_text)})")
-                time.sleep(0.5)
+                ui.call(f"window.maestro_api.appendToWorkflowResponse({escape_js(step_text)}, {step_js})")
+                if not from_cache:
+                    await asyncio.sleep(0.5)
             
-            window.evaluate_js(f"window.maestro_api.finalizeAgentStep({escape_js(node_title)}, {escape_js(current_text)})")
+            source = 'cache' if all_cached and iterations > 0 else ''
+            ui.call(f"window.maestro_api.finalizeAgentStep({step_js}, {escape_js(node_title)}, {escape_js(current_text)}, {escape_js(source)})")
             outputs[0] = current_text
 
         return outputs
 
-    def _run_workflow_stream_worker(self, filename, user_prompt, global_model):
-        window = webview.windows[0]
-        
-        is_maestro_run = True
+    async def _run_workflow_async(self, filename, user_prompt, global_model, run=None):
+        ui = get_ui_bridge(webview.windows[0])
         api_target = 'maestro_api'
 
         try:
             logging.info(f"Début de l'exécution du workflow '{filename}' pour le prompt : '{user_prompt[:50]}...'")
-            window.evaluate_js(f"window.{api_target}.startWorkflowMessage()")
-            
-            workflow_data = self.load_workflow(filename)
-            
-            nodes = {str(node['id']): node for node in workflow_data['nodes']}
-            links = workflow_data.get('links', [])
-            
-            valid_node_ids = set(nodes.keys())
-            sanitized_links = []
-            for link in links:
-                if len(link) < 5:
-                    logging.warning(f"Suppression du lien malformé : {link}")
-                    continue
-
-                source_id = str(link[1])
-                target_id = str(link[3])
-
-                if source_id in valid_node_ids and target_id in valid_node_ids and source_id != target_id:
-                    sanitized_links.append(link)
-                else:
-                    logging.warning(f"Suppression du lien invalide (nœud inexistant ou auto-référencé) : {link}")
-            
-            if len(sanitized_links) < len(links):
-                logging.info(f"{len(links) - len(sanitized_links)} lien(s) invalide(s) ont été supprimés.")
-                links = sanitized_links
-
-            adj = {node_id: [] for node_id in nodes}
-            in_degree = {node_id: 0 for node_id in nodes}
+            ui.call(f"window.{api_target}.startWorkflowMessage()")
             
-            for link in links:
-                if len(link) >= 5:
-                    source_id = str(link[1])
-                    target_id = str(link[3])
-                    if source_id in adj and target_id in in_degree:
-                        adj[source_id].append(target_id)
-                        in_degree[target_id] += 1
-
-            queue = deque([node_id for node_id in nodes if in_degree[node_id] == 0])
-            execution_order = []
-            
-            while queue:
-                u = queue.popleft()
-                execution_order.append(u)
-                for v in adj.get(u, []):
-                    in_degree[v] -= 1
-                    if in_degree[v] == 0:
-                        queue.append(v)
-
-            if len(execution_order) != len(nodes):
-                remaining_nodes = set(nodes.keys()) - set(execution_order)
-                logging.warning(f"Échec du tri topologique. {len(remaining_nodes)} nœud(s) non traité(s): {remaining_nodes}")
-                
-                cycles_detected = any(in_degree[node_id] > 0 for node_id in remaining_nodes)
-                
-                if cycles_detected:
-                    logging.error("Cycles détectés dans le workflow. Tentative de réparation automatique...")
-                    for node_id in remaining_nodes:
-                        if in_degree[node_id] > 0:
-                            links = [link for link in links if str(link[3]) != node_id]
-                            in_degree[node_id] = 0
-                            queue.append(node_id)
-                    
-                    adj = {node_id: [] for node_id in nodes}
-                    in_degree = {node_id: 0 for node_id in nodes}
-                    
-                    for link in links:
-                        if len(link) >= 5:
-                            source_id = str(link[1])
-                            target_id = str(link[3])
-                            if source_id in adj and target_id in in_degree:
-                                adj[source_id].append(target_id)
-                                in_degree[target_id] += 1
-                    
-                    queue = deque([node_id for node_id in nodes if in_degree[node_id] == 0])
-                    execution_order = []
-                    
-                    while queue:
-                        u = queue.popleft()
-                        execution_order.append(u)
-                        for v in adj.get(u, []):
-                            in_degree[v] -= 1
-                            if in_degree[v] == 0:
-                                queue.append(v)
-                
-                if len(execution_order) != len(nodes):
-                    isolated_nodes = set(nodes.keys()) - set(execution_order)
-                    logging.warning(f"Ajout des nœuds isolés à la fin de l'ordre d'exécution: {isolated_nodes}")
-                    execution_order.extend(isolated_nodes)
-            
-            logging.info(f"Ordre d'exécution des nœuds déterminé : {execution_order}")
-
-            node_inputs_map = {node_id: {} for node_id in nodes}
-            for link in links:
-                if len(link) >= 5:
-                    source_id, source_slot, target_id, target_slot = str(link[1]), link[2], str(link[3]), link[4]
-                    if target_id in node_inputs_map:
-                        node_inputs_map[target_id][target_slot] = (source_id, source_slot)
-
-            if user_prompt is not None:
-                for node_id, node in nodes.items():
-                    if node['type'] == 'workflow/text_input':
-                        node.setdefault('properties', {})['value'] = user_prompt
-
-            node_outputs = {}
-            for node_id in execution_order:
+            plan = self.load_workflow_plan(filename)
+            nodes = plan.nodes_for_input(user_prompt)
+            execution_order = plan.execution_order
+            node_inputs_map = plan.inputs
+            logging.info(f"Ordre d'exécution des nœuds déterminé : {execution_order} ({len(plan.levels)} niveau(x))")
+            if run is not None:
+                run.set_total(len(execution_order))
+
+            model_of = lambda node_id: self._node_model(nodes[node_id], global_model)
+            fingerprints = compute_fingerprints(execution_order, nodes, node_inputs_map, model_of)
+            reusable_count = self.run_memory.begin(filename, fingerprints)
+            if reusable_count:
+                logging.info(f"{reusable_count} nœud(s) inchangé(s) depuis la dernière exécution de '{filename}'.")
+
+            async def execute(node_id, node_outputs):
                 node = nodes[node_id]
                 node_title = node.get('title', node.get('type'))
+                if run is None:
+                    return await execute_node(node_id, node, node_title, node_outputs)
+                await run.acheckpoint()
+                run.node_started(node_id, node_title)
+                try:
+                    return await execute_node(node_id, node, node_title, node_outputs)
+                finally:
+                    run.node_finished(node_id)
+
+            async def execute_node(node_id, node, node_title, node_outputs):
+                if model_of(node_id) is not None:
+                    previous_outputs = self.run_memory.lookup(filename, node_id, fingerprints[node_id])
+                    if previous_outputs is not None:
+                        logging.info(f"Nœud ID:{node_id} ('{node_title}') inchangé, sorties précédentes réutilisées.")
+                        step_js = json.dumps(node_id)
+                        title_js = json.dumps(node_title)
+                        ui.call(f"window.{api_target}.showWorkflowStepResult({step_js}, {title_js}, '')")
+                        ui.call(f"window.{api_target}.finalizeAgentStep({step_js}, {title_js}, {json.dumps(str(previous_outputs.get(0, '')))}, 'reuse')")
+                        return previous_outputs
+
                 logging.info(f"--- Exécution du nœud ID:{node_id} ('{node_title}') ---")
                 
                 input_values = {}
@@ -321,46 +300,62 @@ class Api:
                 
                 logging.info(f"Entrées pour le nœud {node_id}: { {k: str(v)[:100] + '...' if len(str(v)) > 100 else v for k, v in input_values.items()} }")
 
-                if node['type'] != 'workflow/text_output':
-                    outputs = self._execute_node_stream(node, input_values, global_model, window, is_maestro_run)
-                    node_outputs[node_id] = outputs
-                    logging.info(f"Sorties du nœud {node_id}: { {k: str(v)[:100] + '...' if len(str(v)) > 100 else v for k, v in outputs.items()} }")
+                if node['type'] == 'workflow/text_output':
+                    return {}
+
+                outputs = await self._execute_node_async(node, input_values, global_model, ui, step_id=node_id, template=plan.templates.get(node_id), run=run)
+                logging.info(f"Sorties du nœud {node_id}: { {k: str(v)[:100] + '...' if len(str(v)) > 100 else v for k, v in outputs.items()} }")
+                if not self._has_error_output(outputs):
+                    self.run_memory.record(filename, node_id, fingerprints[node_id], outputs)
+                return outputs
+
+            await self.scheduler.run(execution_order, plan.adj, execute, model_of)
 
             logging.info("Exécution du workflow terminée.")
-            window.evaluate_js(f"window.{api_target}.updateStatus('Composition terminée.')")
-            window.evaluate_js(f"window.{api_target}.enableControls()")
+            ui.call(f"window.{api_target}.updateStatus('Composition terminée.')")
+            ui.call(f"window.{api_target}.enableControls()")
+
+        except (asyncio.CancelledError, RunCancelled):
+            logging.info(f"Exécution du workflow '{filename}' annulée.")
+            ui.call(f"window.{api_target}.displayCancelled()")
+            raise
 
         except Exception as e:
             import traceback
             error_message = f"Erreur lors de l'exécution du workflow '{filename}': {e}"
             logging.error(f"{error_message}\n{traceback.format_exc()}")
             escaped_error = json.dumps(error_message)
-            window.evaluate_js(f"window.{api_target}.displayError({escaped_error})")
+            ui.call(f"window.{api_target}.displayError({escaped_error})")
 
     def invoke_maestro(self, user_prompt, global_model, complexity):
         logging.info(f"Invocation de Maestro avec le modèle '{global_model}' et la complexité '{complexity}'.")
-        thread = threading.Thread(target=maestro.create_and_run_workflow, args=(self, user_prompt, global_model, complexity))
-        thread.start()
+        return self.runs.start_async(maestro.create_and_run_workflow, self, user_prompt, global_model, complexity,
+                                     kind='maestro', label=user_prompt[:60])
+
+    def cancel_run(self, run_id):
+        logging.info(f"Annulation demandée pour l'exécution {run_id}.")
+        return self.runs.cancel(run_id)
+
+    def pause_run(self, run_id):
+        return self.runs.pause(run_id)
+
+    def resume_run(self, run_id):
+        return self.runs.resume(run_id)
+
+    def get_run_status(self, run_id):
+        return self.runs.status(run_id)
 
     def get_installed_models(self):
         try:
-            response = requests.get("http://localhost:11434/api/tags")
-            response.raise_for_status()
-            models_data = response.json()
-            return [model['name'] for model in models_data.get('models', [])]
+            return self.ollama.list_models()
         except requests.exceptions.RequestException:
             return ["OLLAMA_OFFLINE"]
 
-    def _ollama_worker_blocking(self, history, model):
+    async def _ollama_worker_async(self, history, model, options=None, **extra):
         try:
-            url = "http://localhost:11434/api/chat"
-            payload = {"model": model, "messages": history, "stream": False}
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            response_data = response.json()
-            return response_data['message']['content']
+            return await self.async_ollama.chat(model, history, options, **extra)
         except Exception as e:
-            logging.error(f"Erreur lors de l'appel bloquant à Ollama : {e}")
+            logging.error(f"Erreur lors de l'appel à Ollama : {e}")
             return f"Erreur (bloquant): {e}"
 
     def save_workflow(self, filename, data):
@@ -373,6 +368,7 @@ class Api:
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2)
+            self.plan_cache.invalidate(filepath)
             logging.info(f"Workflow sauvegardé avec succès dans '{filepath}'")
             return f"Workflow '{filename}' sauvegardé."
         except Exception as e:
@@ -388,15 +384,21 @@ class Api:
             logging.error(f"Erreur lors du listage des workflows: {e}")
             return []
 
-    def load_workflow(self, filename):
+    def _workflow_path(self, filename):
         standard_path = os.path.join(WORKFLOWS_DIR, filename)
         maestro_path = os.path.join(MAESTRO_DIR, filename)
         
-        filepath = standard_path if os.path.exists(standard_path) else maestro_path
+        return standard_path if os.path.exists(standard_path) else maestro_path
+
+    def load_workflow(self, filename):
+        filepath = self._workflow_path(filename)
         
         with open(filepath, 'r', encoding='utf-8') as f:
             return json.load(f)
 
+    def load_workflow_plan(self, filename):
+        return self.plan_cache.get(self._workflow_path(filename), repair_cycles=True)
+
 if __name__ == '__main__':
     api = Api()
     html_file = os.path.join(BASE_DIR, 'interface.html')
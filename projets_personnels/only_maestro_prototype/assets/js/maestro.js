@@ -7,10 +7,36 @@ function initializeMaestro() {
     const complexitySlider = document.getElementById('maestro-complexity-slider');
     const complexityLabel = document.getElementById('maestro-complexity-label');
 
+    const pauseButton = document.getElementById('maestro-pause-button');
+    const stopButton = document.getElementById('maestro-stop-button');
+
     complexitySlider.addEventListener('input', () => {
         complexityLabel.textContent = complexitySlider.value === '0' ? 'Simple' : 'Complexe';
     });
 
+    pauseButton.addEventListener('click', async () => {
+        const runId = window.maestro_api._runId;
+        if (!runId) return;
+        if (window.maestro_api._runPaused) {
+            if (await window.pywebview.api.resume_run(runId)) {
+                window.maestro_api._runPaused = false;
+                pauseButton.innerHTML = '<i class="fa-solid fa-pause"></i> Pause';
+            }
+        } else if (await window.pywebview.api.pause_run(runId)) {
+            window.maestro_api._runPaused = true;
+            pauseButton.innerHTML = '<i class="fa-solid fa-play"></i> Reprendre';
+        }
+    });
+
+    stopButton.addEventListener('click', () => {
+        const runId = window.maestro_api._runId;
+        if (!runId) return;
+        stopButton.disabled = true;
+        pauseButton.disabled = true;
+        window.maestro_api.updateStatus('<i>Arrêt en cours...</i>');
+        window.pywebview.api.cancel_run(runId);
+    });
+
     runButton.addEventListener('click', () => {
         const prompt = input.value.trim();
         if (!prompt) {
@@ -32,13 +58,60 @@ function initializeMaestro() {
         }
 
         const complexity = complexitySlider.value === '0' ? 'simple' : 'complexe';
-        window.pywebview.api.invoke_maestro(prompt, selectedModel, complexity);
+        window.pywebview.api.invoke_maestro(prompt, selectedModel, complexity)
+            .then(runId => window.maestro_api.trackRun(runId));
     });
 }
 
+const STEP_SOURCE_BADGES = {
+    cache: '<span class="workflow-step-badge" title="Résultat servi par le cache"><i class="fa-solid fa-bolt"></i> cache</span>',
+    reuse: '<span class="workflow-step-badge" title="Nœud inchangé depuis la dernière exécution"><i class="fa-solid fa-recycle"></i> inchangé</span>',
+};
+
+const RUN_STATUS_POLL_INTERVAL = 1000;
+
 window.maestro_api = {
-    _currentStepElement: null,
-    _currentStepDiv: null,
+    _runId: null,
+    _runPaused: false,
+    _runPoller: null,
+
+    trackRun: (runId) => {
+        const controls = document.getElementById('maestro-run-controls');
+        const pauseButton = document.getElementById('maestro-pause-button');
+        const stopButton = document.getElementById('maestro-stop-button');
+        const progress = document.getElementById('maestro-run-progress');
+        // Le run a pu se terminer avant que son identifiant ne revienne.
+        if (!runId || !document.getElementById('maestro-run-button').disabled) return;
+
+        window.maestro_api._runId = runId;
+        window.maestro_api._runPaused = false;
+        pauseButton.disabled = false;
+        stopButton.disabled = false;
+        pauseButton.innerHTML = '<i class="fa-solid fa-pause"></i> Pause';
+        progress.textContent = '';
+        controls.classList.add('active');
+
+        clearInterval(window.maestro_api._runPoller);
+        window.maestro_api._runPoller = setInterval(async () => {
+            const status = await window.pywebview.api.get_run_status(runId);
+            if (!status || window.maestro_api._runId !== runId) return;
+            if (status.total) {
+                const active = status.active.length ? ` — ${status.active.join(', ')}` : '';
+                progress.textContent = `${status.completed}/${status.total} nœud(s)${active}`;
+            }
+        }, RUN_STATUS_POLL_INTERVAL);
+    },
+
+    stopTrackingRun: () => {
+        clearInterval(window.maestro_api._runPoller);
+        window.maestro_api._runPoller = null;
+        window.maestro_api._runId = null;
+        window.maestro_api._runPaused = false;
+        const controls = document.getElementById('maestro-run-controls');
+        if (controls) controls.classList.remove('active');
+    },
+
+    _stepElements: {},
 
     updateStatus: (message) => {
         const statusArea = document.getElementById('maestro-status-area');
@@ -50,14 +123,14 @@ window.maestro_api = {
         resultsArea.innerHTML = '';
         resultsArea.classList.remove('error');
         resultsArea.style.display = 'block';
-        window.maestro_api._currentStepElement = null;
-        window.maestro_api._currentStepDiv = null;
+        window.maestro_api._stepElements = {};
     },
 
-    showWorkflowStepResult: (title, initialContent = '') => {
+    showWorkflowStepResult: (stepId, title, initialContent = '') => {
         const resultsArea = document.getElementById('maestro-results-area');
         const stepDiv = document.createElement('div');
         stepDiv.className = 'workflow-step';
+        stepDiv.dataset.stepId = stepId;
         stepDiv.dataset.agentTitle = title;
 
         const titleEl = document.createElement('div');
@@ -71,34 +144,34 @@ window.maestro_api = {
         stepDiv.appendChild(contentEl);
 
         resultsArea.appendChild(stepDiv);
-        window.maestro_api._currentStepElement = contentEl;
-        window.maestro_api._currentStepDiv = stepDiv;
+        window.maestro_api._stepElements[stepId] = stepDiv;
         resultsArea.scrollTop = resultsArea.scrollHeight;
     },
 
-    appendToWorkflowResponse: (textChunk) => {
-        if (window.maestro_api._currentStepElement) {
-            window.maestro_api._currentStepElement.textContent += textChunk;
+    appendToWorkflowResponse: (textChunk, stepId) => {
+        const stepDiv = window.maestro_api._stepElements[stepId];
+        const contentEl = stepDiv ? stepDiv.querySelector('.workflow-step-content') : null;
+        if (contentEl) {
+            contentEl.textContent += textChunk;
             const resultsArea = document.getElementById('maestro-results-area');
             if (resultsArea) resultsArea.scrollTop = resultsArea.scrollHeight;
         }
     },
     
-    finalizeAgentStep: (title, finalContent) => {
+    finalizeAgentStep: (stepId, title, finalContent, source = '') => {
         const resultsArea = document.getElementById('maestro-results-area');
         
-        const escapedTitle = title.replace(/'/g, "\\'");
+        const stepToFinalize = window.maestro_api._stepElements[stepId];
         
-        const stepToFinalize = resultsArea.querySelector(`.workflow-step[data-agent-title='${escapedTitle}']:not(.finalized)`);
-        
-        if (stepToFinalize) {
+        if (stepToFinalize && !stepToFinalize.classList.contains('finalized')) {
             stepToFinalize.classList.add('finalized');
+            if (source) stepToFinalize.classList.add(`from-${source}`);
 
             const titleEl = stepToFinalize.querySelector('.workflow-step-title');
             const contentEl = stepToFinalize.querySelector('.workflow-step-content');
 
             if (titleEl) {
-                titleEl.innerHTML = `<i class="fa-solid fa-check-circle" style="color: #28a745;"></i> ${title}`;
+                titleEl.innerHTML = `<i class="fa-solid fa-check-circle" style="color: #28a745;"></i> ${title}${STEP_SOURCE_BADGES[source] || ''}`;
             }
             
             if (contentEl) {
@@ -125,10 +198,16 @@ window.maestro_api = {
         window.maestro_api.enableControls();
     },
 
+    displayCancelled: () => {
+        window.maestro_api.updateStatus('Exécution annulée.');
+        window.maestro_api.enableControls();
+    },
+
     enableControls: () => {
         const runButton = document.getElementById('maestro-run-button');
         const input = document.getElementById('maestro-input');
         if (runButton) runButton.disabled = false;
         if (input) input.disabled = false;
+        window.maestro_api.stopTrackingRun();
     }
 };
\ No newline at end of file
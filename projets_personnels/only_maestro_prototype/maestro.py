@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import time
@@ -7,11 +8,21 @@ import re
 import traceback
 import requests
 from node_registry import NODE_REGISTRY
+from plan_schema import workflow_json_schema
+from run_manager import RunCancelled
+from async_engine import get_ui_bridge
 import logging
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MAESTRO_DIR = os.path.join(BASE_DIR, 'workflows', 'maestro_generated')
 
+# Nombre de plans générés en parallèle à chaque tentative ; le premier valide l'emporte.
+PLAN_CANDIDATES = 1
+# Température de chaque candidat (None : réglage par défaut du modèle).
+PLAN_CANDIDATE_TEMPERATURES = (None, 0.3, 0.7, 1.0)
+# Contraint la génération au schéma JSON des workflows (paramètre `format` d'Ollama).
+PLAN_CONSTRAINED_DECODING = True
+
 def load_system_prompt():
     """Charge le system prompt depuis un fichier externe avec documentation dynamique."""
     prompt_file = os.path.join(BASE_DIR, 'maestro_system_prompt.txt')
@@ -282,18 +293,84 @@ def try_parse_json(json_str):
     return None
 
 
-def create_and_run_workflow(api_instance, user_prompt, global_model, complexity):
+async def _generate_plan_candidate(api_instance, history, global_model, temperature=None):
+    """Génère, corrige et valide un plan ; renvoie (workflow ou None, erreurs de validation, réponse brute)"""
+    options = {'temperature': temperature} if temperature is not None else None
+    extra = {'format': workflow_json_schema()} if PLAN_CONSTRAINED_DECODING else {}
+    raw_response = await api_instance._ollama_worker_async(history, global_model, options=options, **extra)
+    try:
+        # Avec le décodage contraint, la réponse est directement un JSON valide.
+        workflow_data = json.loads(raw_response)
+    except json.JSONDecodeError:
+        workflow_data = None
+    if isinstance(workflow_data, dict):
+        return _finalize_plan_candidate(workflow_data, raw_response)
+
+    logging.debug("Réponse hors schéma, extraction du JSON depuis le texte.")
+    json_string = extract_json_from_response(raw_response)
+    if not json_string:
+        return None, None, raw_response
+    try:
+        workflow_data = json.loads(json_string)
+    except json.JSONDecodeError as e:
+        logging.warning(f"Plan candidat illisible (température {temperature}) : {e}")
+        return None, None, raw_response
+    return _finalize_plan_candidate(workflow_data, raw_response)
+
+
+def _finalize_plan_candidate(workflow_data, raw_response):
+    workflow_data = auto_correct_and_ensure_links(workflow_data)
+    workflow_data = enhance_workflow_with_registry_data(workflow_data)
+    return workflow_data, validate_generated_workflow(workflow_data), raw_response
+
+
+async def generate_plan(api_instance, history, global_model, candidates=PLAN_CANDIDATES):
+    """
+    Lance `candidates` générations concurrentes du plan, à des températures différentes.
+    Le premier plan sans erreur de validation l'emporte et les autres générations sont
+    annulées ; à défaut, le premier plan lisible est retenu.
+    """
+    if candidates <= 1:
+        return await _generate_plan_candidate(api_instance, history, global_model)
+
+    temperatures = [PLAN_CANDIDATE_TEMPERATURES[i % len(PLAN_CANDIDATE_TEMPERATURES)] for i in range(candidates)]
+    pending = {
+        asyncio.ensure_future(_generate_plan_candidate(api_instance, history, global_model, temperature))
+        for temperature in temperatures
+    }
+    fallback = (None, None, "")
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                workflow_data, validation_errors, raw_response = task.result()
+                if workflow_data is not None and not validation_errors:
+                    return workflow_data, validation_errors, raw_response
+                if fallback[0] is None:
+                    fallback = (workflow_data, validation_errors, raw_response)
+        return fallback
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def create_and_run_workflow(api_instance, user_prompt, global_model, complexity, run=None,
+                                  candidates=PLAN_CANDIDATES):
     """
     Fonction principale de Maestro : génère, sauvegarde et exécute un workflow.
     Avec gestion améliorée des erreurs et tentatives multiples.
     """
-    window = webview.windows[0]
+    ui = get_ui_bridge(webview.windows[0])
     MAX_RETRIES = 3
     
     for attempt in range(MAX_RETRIES):
         try:
+            if run is not None:
+                await run.acheckpoint()
             logging.info(f"Phase 1: Génération du plan de réponse par Maestro (tentative {attempt + 1}/{MAX_RETRIES}).")
-            window.evaluate_js("window.maestro_api.updateStatus('<i>Analyse de votre demande et création du plan de réponse...</i>')")
+            ui.call("window.maestro_api.updateStatus('<i>Analyse de votre demande et création du plan de réponse...</i>')")
             
             system_prompt = load_system_prompt()
             
@@ -334,21 +411,20 @@ def create_and_run_workflow(api_instance, user_prompt, global_model, complexity)
                 {'role': 'user', 'content': final_user_prompt}
             ]
             
-            logging.info(f"Appel LLM pour générer le workflow avec le modèle '{global_model}'.")
+            logging.info(f"Appel LLM pour générer le workflow avec le modèle '{global_model}' ({candidates} candidat(s)).")
             
-            raw_response = api_instance._ollama_worker_blocking(history, global_model)
+            workflow_data, validation_errors, raw_response = await generate_plan(api_instance, history, global_model, candidates)
             
             logging.info(f"Réponse brute reçue ({len(raw_response)} caractères)")
             logging.debug(f"--- RÉPONSE BRUTE (début) ---\n{raw_response[:500]}\n--------------------")
             
-            window.evaluate_js("window.maestro_api.updateStatus('<i>Validation et optimisation du plan...</i>')")
-            json_string = extract_json_from_response(raw_response)
+            ui.call("window.maestro_api.updateStatus('<i>Validation et optimisation du plan...</i>')")
             
-            if not json_string:
+            if workflow_data is None:
                 if attempt < MAX_RETRIES - 1:
                     logging.warning(f"Échec de l'extraction JSON (tentative {attempt + 1}). Nouvelle tentative...")
-                    window.evaluate_js(f"window.maestro_api.updateStatus('<i>Nouvelle tentative de génération (essai {attempt + 2}/{MAX_RETRIES})...</i>')")
-                    time.sleep(1)
+                    ui.call(f"window.maestro_api.updateStatus('<i>Nouvelle tentative de génération (essai {attempt + 2}/{MAX_RETRIES})...</i>')")
+                    await asyncio.sleep(1)
                     continue
                 else:
                     error_msg = (
@@ -360,16 +436,10 @@ def create_and_run_workflow(api_instance, user_prompt, global_model, complexity)
                         f"Dernière réponse reçue (extrait) :\n{raw_response[:500]}..."
                     )
                     logging.error("Échec de l'extraction du JSON après toutes les tentatives.")
-                    window.evaluate_js(f"window.maestro_api.displayError({escape_js_string(error_msg)})")
+                    ui.call(f"window.maestro_api.displayError({escape_js_string(error_msg)})")
                     return
 
-            workflow_data = json.loads(json_string)
-            
-            logging.info("JSON extrait et parsé avec succès. Application des corrections et améliorations.")
-            workflow_data = auto_correct_and_ensure_links(workflow_data)
-            workflow_data = enhance_workflow_with_registry_data(workflow_data)
-            
-            validation_errors = validate_generated_workflow(workflow_data)
+            logging.info("JSON extrait, parsé et corrigé avec succès.")
             if validation_errors:
                 logging.warning(f"Workflow généré avec des avertissements de validation: {validation_errors}")
 
@@ -382,25 +452,31 @@ def create_and_run_workflow(api_instance, user_prompt, global_model, complexity)
             agent_count = sum(1 for node in workflow_data['nodes'] if node['type'] == 'workflow/llm_model')
             logging.info(f"Plan généré avec succès avec {agent_count} agent(s). Démarrage de l'exécution.")
             
-            window.evaluate_js(f"window.maestro_api.updateStatus('<i>Exécution du plan avec {agent_count} agent(s) spécialisé(s)...</i>')")
-            api_instance._run_workflow_stream_worker(filename, user_prompt, global_model)
-            
+            ui.call(f"window.maestro_api.updateStatus('<i>Exécution du plan avec {agent_count} agent(s) spécialisé(s)...</i>')")
             break
 
         except json.JSONDecodeError as e:
             if attempt < MAX_RETRIES - 1:
                 logging.warning(f"Erreur de parsing JSON (tentative {attempt + 1}): {e}. Nouvelle tentative...")
-                window.evaluate_js(f"window.maestro_api.updateStatus('<i>Nouvelle tentative de génération (essai {attempt + 2}/{MAX_RETRIES})...</i>')")
-                time.sleep(1)
+                ui.call(f"window.maestro_api.updateStatus('<i>Nouvelle tentative de génération (essai {attempt + 2}/{MAX_RETRIES})...</i>')")
+                await asyncio.sleep(1)
                 continue
             else:
                 error_message = f"Erreur de parsing JSON après {MAX_RETRIES} tentatives : {e}"
                 logging.error(f"{error_message}\n{traceback.format_exc()}")
-                window.evaluate_js(f"window.maestro_api.displayError({escape_js_string(error_message)})")
+                ui.call(f"window.maestro_api.displayError({escape_js_string(error_message)})")
                 return
                 
+        except (RunCancelled, asyncio.CancelledError):
+            logging.info("Composition Maestro annulée par l'utilisateur.")
+            ui.call("window.maestro_api.displayCancelled()")
+            raise
+
         except Exception as e:
             error_message = f"Une erreur critique est survenue dans Maestro : {e}"
             logging.error(f"{error_message}\n{traceback.format_exc()}")
-            window.evaluate_js(f"window.maestro_api.displayError({escape_js_string(error_message)})")
-            return
\ No newline at end of file
+            ui.call(f"window.maestro_api.displayError({escape_js_string(error_message)})")
+            return
+
+    # Hors de la boucle de tentatives : l'exécution signale elle-même ses erreurs et son annulation.
+    await api_instance._run_workflow_async(filename, user_prompt, global_model, run=run)
@@ -0,0 +1,234 @@
+"""
+Suivi des exécutions longues (workflows, Maestro) lancées depuis l'interface.
+
+Chaque exécution reçoit un identifiant renvoyé au JavaScript, qui peut
+ensuite l'annuler, la mettre en pause ou en consulter la progression.
+L'annulation ferme immédiatement les réponses HTTP en cours vers Ollama, ce
+qui interrompt la génération côté serveur, et les nœuds qui n'ont pas encore
+démarré sont ignorés. La pause prend effet entre deux nœuds.
+
+Les exécutions lancées avec `start_async` sont des coroutines du moteur
+asynchrone : les annuler annule aussi leur tâche, et donc tous les nœuds et
+flux en cours.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+MAX_FINISHED_RUNS = 20
+
+FINISHED_STATUSES = ('done', 'cancelled', 'error')
+
+
+class RunCancelled(Exception):
+    """Levée aux points de contrôle d'une exécution annulée"""
+
+
+class RunHandle:
+    """État partagé d'une exécution : annulation, pause et progression"""
+
+    def __init__(self, run_id: str, kind: str, label: str = ''):
+        self.run_id = run_id
+        self.kind = kind
+        self.label = label
+        self.status = 'running'
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.total = 0
+        self.completed = 0
+        self.active: Dict[str, str] = {}
+        self._cancel = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._responses = set()
+        self._future = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> bool:
+        with self._lock:
+            if self.status in FINISHED_STATUSES:
+                return False
+            self._cancel.set()
+            self.status = 'cancelling'
+            responses = list(self._responses)
+            future = self._future
+        self._resume.set()
+        if future is not None:
+            future.cancel()
+        for response in responses:
+            try:
+                response.close()
+            except Exception:
+                pass
+        return True
+
+    def pause(self) -> bool:
+        with self._lock:
+            if self.status != 'running':
+                return False
+            self._resume.clear()
+            self.status = 'paused'
+            return True
+
+    def resume(self) -> bool:
+        with self._lock:
+            if self.status != 'paused':
+                return False
+            self.status = 'running'
+        self._resume.set()
+        return True
+
+    def checkpoint(self):
+        """Attend la fin d'une pause, puis lève `RunCancelled` si l'exécution a été annulée"""
+        self._resume.wait()
+        if self._cancel.is_set():
+            raise RunCancelled(f"Exécution {self.run_id} annulée")
+
+    async def acheckpoint(self):
+        """Équivalent de `checkpoint` pour les coroutines : la pause n'occupe pas la boucle"""
+        if not self._resume.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, self._resume.wait)
+        if self._cancel.is_set():
+            raise RunCancelled(f"Exécution {self.run_id} annulée")
+
+    # Interface attendue par `OllamaClient.stream_chat(cancel_scope=...)`.
+    def attach(self, response):
+        with self._lock:
+            if not self._cancel.is_set():
+                self._responses.add(response)
+                return
+        response.close()
+        raise RunCancelled(f"Exécution {self.run_id} annulée")
+
+    def detach(self, response):
+        with self._lock:
+            self._responses.discard(response)
+
+    def set_total(self, total: int):
+        with self._lock:
+            self.total = total
+            self.completed = 0
+
+    def node_started(self, node_id: str, title: str):
+        with self._lock:
+            self.active[node_id] = title
+
+    def node_finished(self, node_id: str):
+        with self._lock:
+            if self.active.pop(node_id, None) is not None:
+                self.completed += 1
+
+    def finish(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self.active.clear()
+        self._resume.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "kind": self.kind,
+                "label": self.label,
+                "status": self.status,
+                "error": self.error,
+                "total": self.total,
+                "completed": self.completed,
+                "active": list(self.active.values()),
+                "elapsed": (self.finished_at or time.time()) - self.started_at,
+            }
+
+
+class RunManager:
+    """Lance les exécutions dans des threads dédiés et les retrouve par identifiant"""
+
+    def __init__(self, max_finished_runs: int = MAX_FINISHED_RUNS):
+        self.max_finished_runs = max_finished_runs
+        self._runs: Dict[str, RunHandle] = {}
+        self._lock = threading.Lock()
+
+    def start(self, target: Callable[..., Any], *args: Any, kind: str = 'workflow', label: str = '') -> str:
+        """Exécute `target(*args, run=handle)` dans un thread et renvoie l'identifiant du run"""
+        handle = RunHandle(uuid.uuid4().hex[:12], kind, label)
+        with self._lock:
+            self._runs[handle.run_id] = handle
+            self._prune_locked()
+        thread = threading.Thread(target=self._run, args=(handle, target, args),
+                                  name=f"run-{kind}-{handle.run_id}", daemon=True)
+        thread.start()
+        return handle.run_id
+
+    def start_async(self, coroutine_fn: Callable[..., Any], *args: Any, kind: str = 'workflow',
+                    label: str = '') -> str:
+        """Planifie `coroutine_fn(*args, run=handle)` sur la boucle du moteur asynchrone"""
+        from async_engine import get_engine
+
+        handle = RunHandle(uuid.uuid4().hex[:12], kind, label)
+        with self._lock:
+            self._runs[handle.run_id] = handle
+            self._prune_locked()
+        handle._future = get_engine().submit(self._run_async(handle, coroutine_fn, args))
+        return handle.run_id
+
+    async def _run_async(self, handle: RunHandle, coroutine_fn: Callable[..., Any], args: tuple):
+        try:
+            await coroutine_fn(*args, run=handle)
+        except (RunCancelled, asyncio.CancelledError):
+            handle.finish('cancelled')
+        except Exception as e:
+            handle.finish('error', str(e))
+            raise
+        else:
+            handle.finish('cancelled' if handle.cancelled else 'done')
+
+    def _run(self, handle: RunHandle, target: Callable[..., Any], args: tuple):
+        try:
+            target(*args, run=handle)
+        except RunCancelled:
+            handle.finish('cancelled')
+        except Exception as e:
+            handle.finish('error', str(e))
+            raise
+        else:
+            handle.finish('cancelled' if handle.cancelled else 'done')
+
+    def _prune_locked(self):
+        finished = [h for h in self._runs.values() if h.status in FINISHED_STATUSES]
+        finished.sort(key=lambda h: h.finished_at or 0)
+        for handle in finished[:max(0, len(finished) - self.max_finished_runs)]:
+            del self._runs[handle.run_id]
+
+    def get(self, run_id: str) -> Optional[RunHandle]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def cancel(self, run_id: str) -> bool:
+        handle = self.get(run_id)
+        return handle.cancel() if handle else False
+
+    def pause(self, run_id: str) -> bool:
+        handle = self.get(run_id)
+        return handle.pause() if handle else False
+
+    def resume(self, run_id: str) -> bool:
+        handle = self.get(run_id)
+        return handle.resume() if handle else False
+
+    def status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        handle = self.get(run_id)
+        return handle.snapshot() if handle else None
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            handles = list(self._runs.values())
+        return [handle.snapshot() for handle in handles]
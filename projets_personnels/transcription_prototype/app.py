@@ -1,7 +1,8 @@
 import webview
-import whisper
 import threading
 import traceback
+import queue
+import numpy as np
 import torch
 import warnings
 from tkinter import Tk
@@ -10,16 +11,37 @@ import requests
 from packaging import version
 import subprocess
 import json
+import math
 import os
 import tempfile
 from pathlib import Path
 import shutil
 import re
+from collections import deque
+
+from cpu_transcription import CpuTranscriptionPool, plan_workers, reconcile_language
+from model_manager import WhisperModelManager
+from ollama_client import get_client
+from vad import SpeechSegmenter
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU")
 
 SEGMENT_DURATION_MINUTES = 2
 MIN_DURATION_FOR_SPLIT = 4 * 60
+SAMPLE_RATE = 16000
+# Segments décodés d'avance au plus : borne la mémoire quand le décodage va plus vite que Whisper.
+SEGMENT_QUEUE_SIZE = 2
+# Blocs de 4 Ko gardés de la fin des messages d'erreur de ffmpeg, pour le rapport d'erreur.
+STDERR_TAIL_CHUNKS = 16
+# Coupe les segments sur les pauses et retire les silences (sinon, coupes fixes toutes les 2 minutes).
+VAD_ENABLED = True
+VAD_READ_SECONDS = 10
+# Sans GPU, répartit les segments d'un long fichier entre plusieurs processus.
+CPU_PARALLEL_TRANSCRIPTION = True
+# Modèle chargé en arrière-plan au démarrage (None pour ne rien précharger).
+PRELOAD_MODEL = "base"
+# Mémoire réservée aux modèles gardés chargés, en Go (None : la moitié de la VRAM, ou de la RAM disponible).
+MODEL_CACHE_BUDGET_GB = None
 
 def check_pytorch_update():
     """Vérifie si une nouvelle version de PyTorch (pour CUDA) est disponible."""
@@ -71,56 +93,60 @@ def get_audio_duration(file_path):
         print(f"Erreur lors de la lecture de la durée : {e}")
         return None
 
-def split_audio(file_path, segment_duration_minutes, temp_dir):
+def _drain_stream(stream, chunks):
+    for chunk in iter(lambda: stream.read(4096), b''):
+        chunks.append(chunk)
+
+def iter_audio_segments(file_path, segment_duration_seconds):
     """
-    Découpe un fichier audio/vidéo en segments de durée définie.
-    Retourne une liste de chemins vers les segments créés.
+    Décode le fichier une seule fois en PCM 16 kHz mono et le rend par
+    segments de `segment_duration_seconds` secondes, sous forme de tableaux
+    NumPy float32 que Whisper transcrit directement, sans fichier temporaire.
     """
-    try:
-        segment_duration_seconds = segment_duration_minutes * 60
-        segments = []
-        
-        total_duration = get_audio_duration(file_path)
-        if total_duration is None:
-            raise Exception("Impossible de déterminer la durée du fichier")
-        
-        print(f"Durée totale du fichier : {total_duration/60:.1f} minutes")
-        
-        num_segments = int(total_duration / segment_duration_seconds) + 1
-        print(f"Découpage en {num_segments} segments de {segment_duration_minutes} minutes")
-        
-        for i in range(num_segments):
-            start_time = i * segment_duration_seconds
-            segment_path = os.path.join(temp_dir, f"segment_{i:03d}.wav")
-            
-            cmd = [
-                'ffmpeg',
-                '-i', file_path,
-                '-ss', str(start_time),
-                '-t', str(segment_duration_seconds),
-                '-acodec', 'pcm_s16le',
-                '-ar', '16000',
-                '-ac', '1',
-                '-y',
-                segment_path
-            ]
-            
-            print(f"Création du segment {i+1}/{num_segments}...")
-            subprocess.run(cmd, capture_output=True, check=True)
-            segments.append(segment_path)
-        
-        return segments
+    cmd = [
+        'ffmpeg',
+        '-nostdin',
+        '-v', 'error',
+        '-i', file_path,
+        '-vn',
+        '-f', 's16le',
+        '-acodec', 'pcm_s16le',
+        '-ar', str(SAMPLE_RATE),
+        '-ac', '1',
+        'pipe:1'
+    ]
+    segment_bytes = int(segment_duration_seconds * SAMPLE_RATE) * 2
     
-    except Exception as e:
-        print(f"Erreur lors du découpage : {e}")
-        raise
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # stderr est vidé en parallèle : un tube d'erreurs plein bloquerait ffmpeg avant la fin de stdout.
+    stderr_tail = deque(maxlen=STDERR_TAIL_CHUNKS)
+    stderr_reader = threading.Thread(target=_drain_stream, args=(process.stderr, stderr_tail))
+    stderr_reader.daemon = True
+    stderr_reader.start()
+    try:
+        while True:
+            data = process.stdout.read(segment_bytes)
+            data = data[:len(data) // 2 * 2]
+            if not data:
+                break
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+        if process.wait() != 0:
+            stderr_reader.join()
+            stderr = b''.join(stderr_tail).decode(errors='replace')
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+    finally:
+        # Consommateur arrêté avant la fin : ffmpeg ne doit pas rester bloqué sur un tube plein.
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        stderr_reader.join()
 
 window = None
 
 class Api:
     def __init__(self):
-        self.current_model = None
-        self.current_model_name = None
+        self.cpu_pool = None
+        self.ollama = get_client()
         
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.use_fp16 = self.device == "cuda"
@@ -137,6 +163,8 @@ class Api:
             torch.backends.cudnn.deterministic = False
         else:
             print("⚠️ Aucun GPU détecté - Utilisation du CPU (sera plus lent)")
+        
+        self.models = WhisperModelManager(self.device, MODEL_CACHE_BUDGET_GB)
 
     def get_gpu_status(self):
         if self.device == "cuda":
@@ -186,7 +214,80 @@ class Api:
         thread.daemon = True
         thread.start()
 
-    def _transcribe_segment(self, segment_path, segment_num, total_segments):
+    def _decode_segments(self, file_path, segment_queue, stop_event):
+        """
+        Thread décodeur : place dans `segment_queue` les segments décodés, puis
+        None à la fin, ou l'exception rencontrée. S'arrête si `stop_event` est levé.
+        """
+        def put(item):
+            while not stop_event.is_set():
+                try:
+                    segment_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        if VAD_ENABLED:
+            blocks = iter_audio_segments(file_path, VAD_READ_SECONDS)
+            segmenter = SpeechSegmenter(SEGMENT_DURATION_MINUTES * 60)
+            segments = segmenter.iter_segments(blocks)
+        else:
+            blocks = segments = iter_audio_segments(file_path, SEGMENT_DURATION_MINUTES * 60)
+        try:
+            for samples in segments:
+                if not put(samples):
+                    return
+            if VAD_ENABLED and segmenter.total_seconds:
+                silence = 1 - segmenter.speech_seconds / segmenter.total_seconds
+                print(f"Détection de la parole : {silence:.0%} de silence ignoré")
+            put(None)
+        except Exception as e:
+            print(f"Erreur lors du décodage : {e}")
+            put(e)
+        finally:
+            segments.close()
+            blocks.close()
+
+    def _segment_options(self):
+        transcribe_options = {
+            "fp16": self.use_fp16,
+            "language": None,
+            "task": "transcribe",
+            "verbose": False,
+        }
+        
+        if self.device == "cuda":
+            transcribe_options.update({
+                "beam_size": 10,
+                "best_of": 10,
+                "temperature": 0,
+                "condition_on_previous_text":True,
+            })
+        return transcribe_options
+
+    def _cpu_pool_plan(self, model_name):
+        """(processus, threads par processus) de la transcription CPU parallèle, ou None si elle n'est pas utilisée."""
+        if self.device != "cpu" or not CPU_PARALLEL_TRANSCRIPTION:
+            return None
+        workers, threads = plan_workers(model_name)
+        return (workers, threads) if workers >= 2 else None
+
+    def _get_cpu_pool(self, model_name):
+        """Processus de transcription CPU pour `model_name`, ou None si un seul processus est possible."""
+        plan = self._cpu_pool_plan(model_name)
+        if plan is None:
+            return None
+        workers, threads = plan
+        pool = self.cpu_pool
+        if pool is None or (pool.model_name, pool.workers, pool.threads_per_worker) != (model_name, workers, threads):
+            if pool is not None:
+                pool.shutdown()
+            print(f"Transcription CPU parallèle : {workers} processus de {threads} threads")
+            self.cpu_pool = CpuTranscriptionPool(model_name, workers, threads)
+        return self.cpu_pool
+
+    def _transcribe_segment(self, model, audio, segment_num, total_segments):
         global window
         
         try:
@@ -195,23 +296,10 @@ class Api:
             progress_data = json.dumps({"percent": progress, "text": status_msg})
             window.evaluate_js(f'updateProgress({progress_data})')
             
-            transcribe_options = {
-                "fp16": self.use_fp16,
-                "language": None,
-                "task": "transcribe",
-                "verbose": False,
-            }
-            
-            if self.device == "cuda":
-                transcribe_options.update({
-                    "beam_size": 10,
-                    "best_of": 10,
-                    "temperature": 0,
-                    "condition_on_previous_text":True,
-                })
+            transcribe_options = self._segment_options()
             
             with torch.cuda.amp.autocast() if self.device == "cuda" else torch.no_grad():
-                result = self.current_model.transcribe(segment_path, **transcribe_options)
+                result = model.transcribe(audio, **transcribe_options)
             
             if self.device == "cuda":
                 torch.cuda.empty_cache()
@@ -224,33 +312,24 @@ class Api:
 
     def _transcribe_thread(self, file_path, model_name):
         global window
-        temp_dir = None
         
         try:
             if not file_path:
                 raise ValueError("Aucun fichier fourni.")
             
-            if self.current_model_name != model_name:
-                print(f"Chargement du modèle Whisper ({model_name}) sur {self.device}...")
+            def on_model_load():
                 device_info = "GPU (CUDA)" if self.device == "cuda" else "CPU"
                 window.evaluate_js(
                     f'updateProgress({{"percent": 0, "text": "Chargement du modèle {model_name} sur {device_info}..."}})'
                 )
-                
-                if self.current_model is not None and self.device == "cuda":
-                    del self.current_model
-                    torch.cuda.empty_cache()
-                
-                self.current_model = whisper.load_model(model_name, device=self.device)
-                self.current_model_name = model_name
-                
-                if self.device == "cuda":
-                    self.current_model = self.current_model.cuda()
-                    self.current_model.eval()
-                    memory_used = torch.cuda.memory_allocated() / 1024**3
-                    print(f"Mémoire GPU utilisée: {memory_used:.2f} GB")
-                
-                print(f"Modèle {model_name} chargé sur {self.device}.")
+                # Les processus CPU d'un autre modèle libèrent leur mémoire avant le chargement.
+                if self.cpu_pool is not None and self.cpu_pool.model_name != model_name:
+                    self.cpu_pool.shutdown()
+                    self.cpu_pool = None
+            
+            def load_model():
+                # Sur le chemin des processus CPU, chacun a son modèle : le processus principal n'en charge pas.
+                return self.models.get(model_name, on_load=on_model_load)
 
             transcribe_options = {
                 "fp16": self.use_fp16,
@@ -266,23 +345,70 @@ class Api:
             if duration is not None and duration > MIN_DURATION_FOR_SPLIT:
                 print(f"Fichier long détecté ({duration/60:.1f} min) - Découpage automatique activé")
                 window.evaluate_js(
-                    f'updateProgress({{"percent": 0, "text": "Fichier long détecté - Découpage en segments..."}})'
+                    f'updateProgress({{"percent": 0, "text": "Fichier long détecté - Transcription par segments..."}})'
                 )
                 
-                temp_dir = tempfile.mkdtemp(prefix="whisper_segments_")
-                print(f"Répertoire temporaire : {temp_dir}")
+                # Le décodage du segment suivant se fait pendant la transcription du segment courant.
+                num_segments = max(1, math.ceil(duration / (SEGMENT_DURATION_MINUTES * 60)))
+                segment_queue = queue.Queue(maxsize=SEGMENT_QUEUE_SIZE)
+                stop_event = threading.Event()
+                decoder = threading.Thread(target=self._decode_segments, args=(file_path, segment_queue, stop_event))
+                decoder.daemon = True
+                decoder.start()
                 
-                segments = split_audio(file_path, SEGMENT_DURATION_MINUTES, temp_dir)
+                cpu_pool = self._get_cpu_pool(model_name) if num_segments > 1 else None
+                results = []
+                # Segments confiés aux processus CPU, dans l'ordre du fichier.
+                pending = deque()
                 
-                transcripts = []
-                detected_language = None
+                def add_result(transcript, lang):
+                    results.append((transcript, lang))
+                    partial_data = json.dumps({"segment": len(results), "total": max(num_segments, len(results)), "text": transcript}, ensure_ascii=False)
+                    window.evaluate_js(f'updatePartialTranscript({partial_data})')
                 
-                for i, segment_path in enumerate(segments, 1):
-                    transcript, lang = self._transcribe_segment(segment_path, i, len(segments))
-                    transcripts.append(transcript)
-                    if detected_language is None and lang != 'unknown':
-                        detected_language = lang
+                def collect_oldest():
+                    add_result(*pending.popleft().result())
+                    progress_data = json.dumps({
+                        "percent": len(results) / max(num_segments, len(results)) * 100,
+                        "text": f"Transcription : {len(results)}/{max(num_segments, len(results))} segments ({cpu_pool.workers} processus)..."
+                    })
+                    window.evaluate_js(f'updateProgress({progress_data})')
                 
+                try:
+                    model = load_model() if cpu_pool is None else None
+                    submitted = 0
+                    while True:
+                        samples = segment_queue.get()
+                        if samples is None:
+                            break
+                        if isinstance(samples, Exception):
+                            raise samples
+                        
+                        submitted += 1
+                        num_segments = max(num_segments, submitted)
+                        if cpu_pool is None:
+                            add_result(*self._transcribe_segment(model, samples, submitted, num_segments))
+                        else:
+                            pending.append(cpu_pool.submit(samples, self._segment_options()))
+                            # Les résultats sont repris dans l'ordre ; les autres processus continuent pendant l'attente.
+                            if len(pending) >= cpu_pool.workers:
+                                collect_oldest()
+                    while pending:
+                        collect_oldest()
+                except Exception:
+                    if cpu_pool is not None:
+                        for future in pending:
+                            future.cancel()
+                        # Un processus a pu mourir (mémoire) : le pool sera recréé à la prochaine transcription.
+                        cpu_pool.shutdown()
+                        self.cpu_pool = None
+                    raise
+                finally:
+                    stop_event.set()
+                    decoder.join()
+                
+                transcripts = [transcript for transcript, _ in results]
+                detected_language = reconcile_language(results)
                 full_transcript = " ".join(transcripts)
                 
             else:
@@ -291,10 +417,11 @@ class Api:
                 else:
                     print("Durée inconnue - Transcription directe")
                 
+                model = load_model()
                 window.evaluate_js(f'updateProgress({{"percent": 0, "text": "Transcription en cours..."}})')
                 
                 with torch.cuda.amp.autocast() if self.device == "cuda" else torch.no_grad():
-                    result = self.current_model.transcribe(file_path, **transcribe_options)
+                    result = model.transcribe(file_path, **transcribe_options)
                 
                 full_transcript = result['text']
                 detected_language = result.get('language', 'unknown')
@@ -324,13 +451,6 @@ class Api:
             print(f"Erreur pendant la transcription : {e}")
             traceback.print_exc()
             response = {"status": "error", "message": str(e)}
-        finally:
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                    print(f"Répertoire temporaire supprimé : {temp_dir}")
-                except Exception as e:
-                    print(f"Erreur lors du nettoyage : {e}")
 
         response_json = json.dumps(response, ensure_ascii=False)
         window.evaluate_js(f'updateTranscriptionResult({response_json})')
@@ -459,8 +579,6 @@ class Api:
             try:
                 print("Envoi de la requête à Ollama...")
                 
-                ollama_url = "http://localhost:11434/api/generate"
-                
                 payload = {
                     "model": "hf.co/unsloth/Qwen3-30B-A3B-Instruct-2507-GGUF:IQ2_M",
                     "prompt": full_prompt,
@@ -472,11 +590,7 @@ class Api:
                     }
                 }
                 
-                response_api = requests.post(
-                    ollama_url,
-                    json=payload,
-                    timeout=900
-                )
+                response_api = self.ollama.post('generate', payload, timeout=900)
                 
                 if response_api.status_code == 200:
                     result_data = response_api.json()
@@ -656,15 +770,26 @@ class Api:
                 "gpu_memory_gb": torch.cuda.get_device_properties(0).total_memory / 1024**3
             })
         
+        info.update(self.models.info())
+        info["cpu_pool"] = self.cpu_pool.info() if self.cpu_pool is not None else None
         return info
 
 if __name__ == '__main__':
-    torch.set_num_threads(1)
+    # Sur CPU, torch garde tous les cœurs pour la transcription directe des fichiers courts.
+    if torch.cuda.is_available():
+        torch.set_num_threads(1)
     
     import multiprocessing
     multiprocessing.freeze_support()
     
     api = Api()
+    # Avec la transcription CPU parallèle, ce sont les processus qui chargent le modèle :
+    # ils sont démarrés dès maintenant au lieu d'une copie dans le processus principal.
+    warm_pool = bool(PRELOAD_MODEL) and api._cpu_pool_plan(PRELOAD_MODEL) is not None
+    if warm_pool:
+        api._get_cpu_pool(PRELOAD_MODEL).warm_up()
+    elif PRELOAD_MODEL:
+        api.models.preload(PRELOAD_MODEL)
 
     print("\n=== Configuration Système ===")
     sys_info = api.get_system_info()
@@ -672,6 +797,12 @@ if __name__ == '__main__':
         print(f"{key}: {value}")
     print(f"Découpage automatique: activé pour les fichiers > {MIN_DURATION_FOR_SPLIT/60:.0f} minutes")
     print(f"Durée des segments: {SEGMENT_DURATION_MINUTES} minutes")
+    if warm_pool:
+        print(f"Préchargement du modèle: {PRELOAD_MODEL} dans {api.cpu_pool.workers} processus CPU")
+    elif PRELOAD_MODEL:
+        print(f"Préchargement du modèle: {PRELOAD_MODEL}")
+    if api.device == "cpu" and CPU_PARALLEL_TRANSCRIPTION:
+        print(f"Transcription CPU parallèle: jusqu'à {plan_workers('base')[0]} processus (selon le modèle)")
     print("============================\n")
 
     if torch.cuda.is_available():
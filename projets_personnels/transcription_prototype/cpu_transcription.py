@@ -0,0 +1,134 @@
+"""
+Transcription parallèle des segments sur CPU.
+
+Sans GPU, les segments d'un long fichier sont répartis entre plusieurs
+processus, chacun avec son propre modèle Whisper et une part des cœurs
+(`torch.set_num_threads`). Le nombre de processus est borné par le nombre
+de cœurs et par la mémoire disponible, selon la taille du modèle.
+"""
+
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+import whisper
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MIN_THREADS_PER_WORKER = 2
+# Part de la mémoire disponible que les modèles des processus peuvent occuper.
+MEMORY_BUDGET_FRACTION = 0.7
+# Mémoire approximative d'un modèle chargé sur CPU (fp32), en Go.
+MODEL_MEMORY_GB = {
+    "tiny": 0.5,
+    "base": 0.7,
+    "small": 1.5,
+    "medium": 4.0,
+    "large": 8.0,
+    "turbo": 5.0,
+}
+DEFAULT_MODEL_MEMORY_GB = 8.0
+
+_worker_model = None
+
+
+def model_memory_gb(model_name):
+    """Mémoire estimée d'un modèle ("medium.en" et "large-v3" comptent comme "medium" et "large")"""
+    family = model_name.split('.')[0].split('-')[0]
+    return MODEL_MEMORY_GB.get(family, DEFAULT_MODEL_MEMORY_GB)
+
+
+def available_memory_gb():
+    if psutil is not None:
+        return psutil.virtual_memory().available / 1024**3
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1024**3
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def plan_workers(model_name, cpu_count=None):
+    """(processus, threads par processus) pour transcrire avec `model_name`"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    workers = max(1, cpu_count // MIN_THREADS_PER_WORKER)
+    memory = available_memory_gb()
+    if memory is not None:
+        workers = min(workers, max(1, int(memory * MEMORY_BUDGET_FRACTION / model_memory_gb(model_name))))
+    return workers, max(1, cpu_count // workers)
+
+
+def _init_worker(model_name, num_threads):
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    _worker_model = whisper.load_model(model_name, device="cpu")
+
+
+def _ready():
+    return os.getpid()
+
+
+def _transcribe(samples, options):
+    with torch.no_grad():
+        result = _worker_model.transcribe(samples, **options)
+    return result['text'], result.get('language', 'unknown')
+
+
+class CpuTranscriptionPool:
+    """Processus de transcription gardés entre deux fichiers tant que le modèle ne change pas"""
+
+    def __init__(self, model_name, workers, threads_per_worker):
+        self.model_name = model_name
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        # `spawn` : un fork hériterait des threads de torch et de l'interface.
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_name, threads_per_worker),
+        )
+        self._warm_up_futures = []
+
+    def submit(self, samples, options):
+        """Future de (texte, langue) pour un segment (tableau NumPy 16 kHz)"""
+        return self._executor.submit(_transcribe, samples, options)
+
+    def warm_up(self):
+        """Démarre tous les processus, et donc le chargement de leur modèle, sans attendre un premier fichier"""
+        # ProcessPoolExecutor ne lance un processus qu'à la soumission d'une tâche : une tâche vide par processus.
+        self._warm_up_futures = [self._executor.submit(_ready) for _ in range(self.workers)]
+
+    def info(self):
+        """Modèle, processus et état du démarrage anticipé, pour `get_system_info`"""
+        futures = self._warm_up_futures
+        if not futures:
+            warm_up = None
+        elif not all(future.done() for future in futures):
+            warm_up = "en cours"
+        else:
+            errors = [future.exception() for future in futures if not future.cancelled() and future.exception() is not None]
+            warm_up = f"échec : {errors[0]}" if errors else "terminé"
+        return {
+            "model": self.model_name,
+            "processes": self.workers,
+            "threads_per_process": self.threads_per_worker,
+            "warm_up": warm_up,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def reconcile_language(results):
+    """Langue majoritaire des segments, chaque vote pondéré par la longueur du texte transcrit"""
+    votes = Counter()
+    for text, language in results:
+        if language and language != 'unknown':
+            votes[language] += len(text.strip()) or 1
+    return votes.most_common(1)[0][0] if votes else None
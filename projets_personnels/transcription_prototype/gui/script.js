@@ -14,6 +14,25 @@ function updateProgress(data) {
     }
 }
 
+function updatePartialTranscript(data) {
+    const resultContainer = document.getElementById('result-container');
+    const transcriptionOutput = document.getElementById('transcription-output');
+    const transcriptionInfo = document.getElementById('transcription-info');
+    const sendToProcessingButton = document.getElementById('send-to-processing-button');
+
+    // Le texte s'affiche segment par segment, avant la fin de la transcription.
+    if (data.segment === 1) {
+        transcriptionOutput.textContent = '';
+        transcriptionInfo.innerHTML = `<span><i class="fa-solid fa-hourglass-half"></i> Transcription partielle : segment <strong>${data.segment}/${data.total}</strong></span>`;
+    } else {
+        transcriptionInfo.querySelector('strong').textContent = `${data.segment}/${data.total}`;
+    }
+    const separator = transcriptionOutput.textContent ? ' ' : '';
+    transcriptionOutput.textContent += separator + data.text.trim();
+    sendToProcessingButton.disabled = true;
+    resultContainer.style.display = 'block';
+}
+
 function updateProcessingStatus(message) {
     const loaderText = document.getElementById('processing-loader-text');
     if (loaderText) {
@@ -0,0 +1,121 @@
+"""
+Modèles Whisper gardés en mémoire entre les transcriptions.
+
+Les modèles chargés restent disponibles tant que leur taille totale
+(poids et buffers) tient dans le budget de mémoire ; au-delà, les moins
+récemment utilisés sont libérés. Sur GPU, la place nécessaire au nouveau
+modèle est libérée avant son chargement. Un modèle peut être préchargé en
+arrière-plan au démarrage.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+import whisper
+
+from cpu_transcription import available_memory_gb, model_memory_gb
+
+# Part de la mémoire (VRAM sur GPU, RAM disponible sur CPU) réservée aux modèles par défaut.
+DEFAULT_BUDGET_FRACTION = 0.5
+DEFAULT_BUDGET_GB = 4.0
+
+
+def default_budget_gb(device):
+    if device == "cuda":
+        return torch.cuda.get_device_properties(0).total_memory / 1024**3 * DEFAULT_BUDGET_FRACTION
+    memory = available_memory_gb()
+    return memory * DEFAULT_BUDGET_FRACTION if memory is not None else DEFAULT_BUDGET_GB
+
+
+def model_size_gb(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) / 1024**3
+
+
+class WhisperModelManager:
+    """Cache LRU des modèles Whisper chargés sur `device`, borné par `budget_gb`"""
+
+    def __init__(self, device, budget_gb=None):
+        self.device = device
+        self.budget_gb = budget_gb if budget_gb is not None else default_budget_gb(device)
+        # Modèles chargés, du moins au plus récemment utilisé.
+        self._models = OrderedDict()
+        self._stats = {}
+        # `_lock` sérialise les chargements ; `_state_lock` protège le cache, lu par `info` pendant un chargement.
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def get(self, model_name, on_load=None):
+        """Modèle `model_name`, chargé s'il n'est pas en mémoire ; `on_load()` est appelé avant un chargement."""
+        with self._lock:
+            model = self._load(model_name, on_load)
+            with self._state_lock:
+                self._stats[model_name]["uses"] += 1
+            return model
+
+    def preload(self, model_name):
+        """Charge `model_name` en arrière-plan"""
+        def run():
+            try:
+                with self._lock:
+                    self._load(model_name)
+            except Exception as e:
+                print(f"Erreur lors du préchargement du modèle {model_name} : {e}")
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _load(self, model_name, on_load=None):
+        with self._state_lock:
+            model = self._models.get(model_name)
+            if model is not None:
+                self._models.move_to_end(model_name)
+                return model
+
+        if on_load:
+            on_load()
+        if self.device == "cuda":
+            # La VRAM ne déborde pas : on libère d'abord la place du modèle (mesurée s'il a déjà été chargé).
+            self._evict(self._stats.get(model_name, {}).get("memory_gb") or model_memory_gb(model_name))
+        print(f"Chargement du modèle Whisper ({model_name}) sur {self.device}...")
+        start = time.perf_counter()
+        model = whisper.load_model(model_name, device=self.device)
+        if self.device == "cuda":
+            model = model.cuda()
+            model.eval()
+            print(f"Mémoire GPU utilisée: {torch.cuda.memory_allocated() / 1024**3:.2f} GB")
+        load_seconds = time.perf_counter() - start
+
+        with self._state_lock:
+            self._models[model_name] = model
+            stats = self._stats.setdefault(model_name, {"loads": 0, "uses": 0})
+            stats.update({"load_seconds": round(load_seconds, 2), "memory_gb": round(model_size_gb(model), 2)})
+            stats["loads"] += 1
+        print(f"Modèle {model_name} chargé sur {self.device} en {load_seconds:.1f} s.")
+        self._evict(0)
+        return model
+
+    def _evict(self, needed_gb):
+        # Le modèle le plus récent reste chargé, même s'il dépasse à lui seul le budget.
+        while self._models and self._loaded_gb() + needed_gb > self.budget_gb and (needed_gb or len(self._models) > 1):
+            with self._state_lock:
+                model_name, _ = self._models.popitem(last=False)
+            if self.device == "cuda":
+                torch.cuda.empty_cache()
+            print(f"Modèle {model_name} libéré de la mémoire.")
+
+    def _loaded_gb(self):
+        return sum(self._stats[name]["memory_gb"] for name in self._models)
+
+    def info(self):
+        """Budget, modèles en mémoire et statistiques de chargement, pour `get_system_info`"""
+        with self._state_lock:
+            return {
+                "model_cache_budget_gb": round(self.budget_gb, 2),
+                "loaded_models": list(self._models),
+                "model_stats": {name: dict(stats) for name, stats in self._stats.items()},
+            }
@@ -0,0 +1,167 @@
+"""
+Client Ollama partagé par les prototypes.
+
+Toutes les requêtes passent par une unique `requests.Session` dont les
+connexions TCP sont conservées et réutilisées (keep-alive HTTP), avec :
+- des timeouts propres à chaque endpoint (connexion, lecture) ;
+- des reprises avec backoff exponentiel sur les erreurs de connexion et les
+  réponses 503 (serveur occupé) ;
+- le paramètre `keep_alive` d'Ollama, pour que les modèles restent chargés en
+  mémoire entre deux agents d'un même plan.
+
+Les appels de chat acceptent un `cancel_scope` optionnel : un objet exposant
+`attach(response)` et `detach(response)`, qui peut fermer la réponse en cours
+depuis un autre thread pour interrompre la génération.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _base_url_from_env() -> str:
+    host = os.environ.get('OLLAMA_HOST', 'localhost:11434').rstrip('/')
+    if not host.startswith(('http://', 'https://')):
+        host = 'http://' + host
+    return host
+
+
+OLLAMA_BASE_URL = _base_url_from_env()
+KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+
+# (timeout de connexion, timeout de lecture) en secondes, par endpoint.
+# En streaming, le timeout de lecture s'applique entre deux fragments reçus.
+TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    'tags': (3.05, 10),
+    'chat': (3.05, 900),
+    'chat_stream': (3.05, 300),
+    'generate': (3.05, 900),
+    'embed': (3.05, 120),
+}
+
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 16
+
+
+class OllamaError(Exception):
+    """Erreur renvoyée par le serveur Ollama dans le corps de la réponse"""
+
+
+class OllamaClient:
+    """Client HTTP poolé vers un serveur Ollama"""
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, keep_alive: Optional[str] = KEEP_ALIVE,
+                 timeouts: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.keep_alive = keep_alive
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        self.session = self._build_session()
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=MAX_RETRIES,
+            connect=MAX_RETRIES,
+            read=0,
+            status=MAX_RETRIES,
+            status_forcelist=(503,),
+            allowed_methods=frozenset({'GET', 'POST'}),
+            backoff_factor=BACKOFF_FACTOR,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=POOL_SIZE)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.keep_alive is not None and 'keep_alive' not in payload:
+            payload = {**payload, 'keep_alive': self.keep_alive}
+        return payload
+
+    def post(self, endpoint: str, payload: Dict[str, Any], stream: bool = False,
+             timeout: Optional[Any] = None) -> requests.Response:
+        """Envoie une requête POST brute sur `/api/<endpoint>`"""
+        timeout_key = f"{endpoint}_stream" if stream and f"{endpoint}_stream" in self.timeouts else endpoint
+        return self.session.post(
+            f"{self.base_url}/api/{endpoint}",
+            json=self._payload(payload),
+            stream=stream,
+            timeout=timeout or self.timeouts.get(timeout_key),
+        )
+
+    def list_models(self) -> List[str]:
+        """Noms des modèles installés localement"""
+        response = self.session.get(f"{self.base_url}/api/tags", timeout=self.timeouts['tags'])
+        response.raise_for_status()
+        return [model['name'] for model in response.json().get('models', [])]
+
+    def chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+             timeout: Optional[Any] = None, cancel_scope: Optional[Any] = None, **extra: Any) -> str:
+        """Appel non streamé de `/api/chat`, retourne le contenu du message"""
+        if cancel_scope is not None:
+            # Une réponse streamée peut être fermée en cours de route, pas une réponse bloquante.
+            return "".join(self.stream_chat(model, messages, options=options, timeout=timeout,
+                                            cancel_scope=cancel_scope, **extra))
+        payload = {"model": model, "messages": messages, "stream": False, **extra}
+        if options:
+            payload["options"] = options
+        response = self.post('chat', payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise OllamaError(data['error'])
+        return data['message']['content']
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                    timeout: Optional[Any] = None, cancel_scope: Optional[Any] = None,
+                    **extra: Any) -> Iterator[str]:
+        """Appel streamé de `/api/chat`, produit les fragments de contenu au fil de l'eau"""
+        payload = {"model": model, "messages": messages, "stream": True, **extra}
+        if options:
+            payload["options"] = options
+        with self.post('chat', payload, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if cancel_scope is not None:
+                cancel_scope.attach(response)
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line.decode('utf-8'))
+                    if 'error' in chunk:
+                        raise OllamaError(chunk['error'])
+                    content_part = chunk.get('message', {}).get('content', '')
+                    if content_part:
+                        yield content_part
+            finally:
+                if cancel_scope is not None:
+                    cancel_scope.detach(response)
+
+    def embed(self, model: str, inputs: List[str], timeout: Optional[Any] = None) -> List[List[float]]:
+        """Appel de `/api/embed` : un vecteur par texte de `inputs`, dans l'ordre"""
+        response = self.post('embed', {"model": model, "input": inputs}, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise OllamaError(data['error'])
+        return data['embeddings']
+
+
+_default_client: Optional[OllamaClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Retourne le client partagé du processus (créé au premier appel)"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
@@ -0,0 +1,146 @@
+"""
+Découpage de l'audio sur les pauses, par détection d'activité vocale.
+
+L'énergie est mesurée par trames de 30 ms. Le bruit de fond est le 10e
+centile des énergies de tout le fichier décodé jusque-là, si bien qu'un
+passage sans parole (bruit de salle) reste du silence. Une trame est de la
+parole si son énergie dépasse ce bruit de fond d'au moins
+`SPEECH_MARGIN_DB`. Quand les trames fortes du passage (90e centile)
+dépassent nettement le bruit de fond, le seuil peut descendre jusqu'à
+`SPEECH_RANGE_DB` sous elles, pour garder la parole douce d'un fichier
+encore sans pause, mais jamais à moins de `MIN_SPEECH_SNR_DB` du bruit de
+fond. Une marge de `SPEECH_PAD_SECONDS` est gardée autour de la parole.
+Chaque segment est coupé au milieu de la plus longue pause trouvée à moins
+de `CUT_SEARCH_SECONDS` de la durée visée ; le silence qu'il contient est
+retiré avant la transcription.
+"""
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 480
+NOISE_PERCENTILE = 10
+SPEECH_MARGIN_DB = 10.0
+SPEECH_RANGE_DB = 20.0
+MIN_SPEECH_SNR_DB = 6.0
+# En dessous, une trame est du silence même si le bruit de fond est plus bas encore.
+MIN_SPEECH_DB = -50.0
+SPEECH_PAD_SECONDS = 0.3
+CUT_SEARCH_SECONDS = 20
+MIN_SPEECH_SECONDS = 0.5
+# Histogramme des énergies du fichier, pour son bruit de fond.
+FLOOR_MIN_DB = -100.0
+FLOOR_MAX_DB = 0.0
+FLOOR_BIN_DB = 0.5
+
+
+def frame_energies(samples):
+    """Énergie de chaque trame complète, en dB par rapport à la pleine échelle"""
+    num_frames = len(samples) // FRAME_SAMPLES
+    frames = samples[:num_frames * FRAME_SAMPLES].reshape(num_frames, FRAME_SAMPLES)
+    return 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+
+
+def speech_mask(energies, noise_floor=None):
+    """
+    Trames de parole, élargies de `SPEECH_PAD_SECONDS` de chaque côté ; sans
+    `noise_floor` (bruit de fond du fichier), celui du passage est utilisé.
+    """
+    if len(energies) == 0:
+        return np.zeros(0, dtype=bool)
+    local_floor, loud_level = np.percentile(energies, [NOISE_PERCENTILE, 90])
+    if noise_floor is None:
+        noise_floor = local_floor
+    threshold = noise_floor + SPEECH_MARGIN_DB
+    if loud_level - noise_floor >= SPEECH_MARGIN_DB:
+        threshold = max(noise_floor + MIN_SPEECH_SNR_DB, min(threshold, loud_level - SPEECH_RANGE_DB))
+    speech = energies > max(MIN_SPEECH_DB, threshold)
+    pad = int(SPEECH_PAD_SECONDS * SAMPLE_RATE / FRAME_SAMPLES)
+    return np.convolve(speech, np.ones(2 * pad + 1), mode='same') > 0
+
+
+def _silence_runs(mask):
+    """(début, fin) des suites de trames de silence"""
+    padded = np.concatenate(([True], mask, [True]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return zip(changes[::2], changes[1::2])
+
+
+class NoiseFloor:
+    """Bas centile des énergies de toutes les trames vues, tenu sur un histogramme"""
+
+    def __init__(self):
+        self._counts = np.zeros(int((FLOOR_MAX_DB - FLOOR_MIN_DB) / FLOOR_BIN_DB) + 1, dtype=np.int64)
+
+    def add(self, energies):
+        bins = np.clip(((energies - FLOOR_MIN_DB) / FLOOR_BIN_DB).astype(np.int64), 0, len(self._counts) - 1)
+        self._counts += np.bincount(bins, minlength=len(self._counts))
+
+    def level(self):
+        total = self._counts.sum()
+        if not total:
+            return None
+        index = int(np.searchsorted(np.cumsum(self._counts), total * NOISE_PERCENTILE / 100))
+        return FLOOR_MIN_DB + index * FLOOR_BIN_DB
+
+
+class SpeechSegmenter:
+    """Segments de parole d'environ `target_seconds` secondes, à partir de blocs PCM 16 kHz successifs"""
+
+    def __init__(self, target_seconds):
+        self.target_seconds = target_seconds
+        self.total_seconds = 0.0
+        self.speech_seconds = 0.0
+        self.noise_floor = NoiseFloor()
+
+    def iter_segments(self, blocks):
+        """Segments coupés sur les pauses, sans leurs silences ; un segment sans parole est ignoré"""
+        target = int(self.target_seconds * SAMPLE_RATE)
+        window = CUT_SEARCH_SECONDS * SAMPLE_RATE
+        buffer = np.zeros(0, dtype=np.float32)
+        for block in blocks:
+            buffer = np.concatenate((buffer, block))
+            self.noise_floor.add(frame_energies(block))
+            while len(buffer) >= target + window:
+                cut = self._find_cut(buffer, target, window)
+                segment = self._keep_speech(buffer[:cut])
+                buffer = buffer[cut:]
+                if segment is not None:
+                    yield segment
+        if len(buffer):
+            segment = self._keep_speech(buffer)
+            if segment is not None:
+                yield segment
+
+    def _find_cut(self, samples, target, window):
+        energies = frame_energies(samples)
+        mask = speech_mask(energies, self.noise_floor.level())
+        first = max(1, (target - window) // FRAME_SAMPLES)
+        last = min(len(mask) - 1, (target + window) // FRAME_SAMPLES)
+        center = target // FRAME_SAMPLES
+        best = None
+        for start, end in _silence_runs(mask[first:last]):
+            middle = first + (start + end) // 2
+            # La plus longue pause, puis la plus proche de la durée visée.
+            key = (end - start, -abs(middle - center))
+            if best is None or key > best[0]:
+                best = (key, middle)
+        if best is None:
+            # Aucune pause : on coupe sur la trame la plus faible.
+            cut_frame = first + int(np.argmin(energies[first:last]))
+        else:
+            cut_frame = best[1]
+        return cut_frame * FRAME_SAMPLES
+
+    def _keep_speech(self, samples):
+        self.total_seconds += len(samples) / SAMPLE_RATE
+        mask = speech_mask(frame_energies(samples), self.noise_floor.level())
+        keep = np.repeat(mask, FRAME_SAMPLES)
+        # Les derniers échantillons, hors trame complète, suivent la dernière trame.
+        tail = len(samples) - len(keep)
+        keep = np.concatenate((keep, np.full(tail, bool(mask[-1]) if len(mask) else False)))
+        speech = samples[keep]
+        if len(speech) < MIN_SPEECH_SECONDS * SAMPLE_RATE:
+            return None
+        self.speech_seconds += len(speech) / SAMPLE_RATE
+        return speech